@@ -4,7 +4,6 @@ from flask import Flask, jsonify
 from flask_pymongo import PyMongo
 from flask_jwt_extended import JWTManager
 from flask_cors import CORS
-from pymongo.errors import ConnectionFailure
 from dotenv import load_dotenv
 from .config import Config  # We'll create this next
 from bson import ObjectId # Import ObjectId
@@ -33,14 +32,17 @@ def create_app():
     app.json_encoder = MongoJSONEncoder # Use the custom encoder
 
     # Initialize extensions
+    from .utils.slow_queries import slow_query_listener
+    from .utils.round_trips import round_trip_counter, init_round_trips
+    slow_query_listener.init_app(app)
+    from .repositories import repos
+    repos.configure(app.config['STORAGE_BACKEND'])
     try:
-        mongo.init_app(app)
+        # Connects lazily; the ping runs in the background readiness check (/readyz)
+        mongo.init_app(app, event_listeners=[slow_query_listener, round_trip_counter])
         print("MongoDB initialized successfully.")
-        # Attempt a simple operation to confirm connection
-        mongo.db.command('ping')
-        print("Successfully pinged MongoDB.")
-    except ConnectionFailure:
-        print("MongoDB server not available.")
+        if repos.backend == 'memory':
+            print("Using the in-memory storage backend; MongoDB is not used.")
     except Exception as e:
         print(f"An error occurred during MongoDB initialization: {e}")
 
@@ -49,7 +51,8 @@ def create_app():
     CORS(app, 
          origins=["http://localhost:5173", "http://127.0.0.1:5173"],
          methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-         allow_headers=["Content-Type", "Authorization"],
+         allow_headers=["Content-Type", "Authorization", "If-None-Match", "X-Profile"],
+         expose_headers=["ETag", "X-Read-Preference", "X-Next-After", "X-DB-Round-Trips"],
          supports_credentials=True) # Enable CORS for all routes
 
     # Create upload folders if they don't exist
@@ -66,6 +69,7 @@ def create_app():
     from .routes.channel_groups import channel_groups_bp
     from .routes.admin_data import admin_data_bp
     from .routes.public_data import public_data_bp
+    from .routes.health import health_bp
 
     app.register_blueprint(auth_bp, url_prefix='/api/auth')
     app.register_blueprint(playlists_bp, url_prefix='/api/playlists')
@@ -74,6 +78,31 @@ def create_app():
     app.register_blueprint(channel_groups_bp, url_prefix='/api/channel_groups')
     app.register_blueprint(admin_data_bp, url_prefix='/api/admin')
     app.register_blueprint(public_data_bp, url_prefix='/api/public_data')
+    app.register_blueprint(health_bp)
+
+    # Sampling profiler for admin-flagged or sampled requests
+    from .utils.profiling import init_profiling
+    init_profiling(app)
+
+    # X-DB-Round-Trips header; routes declare budgets with @round_trip_budget
+    init_round_trips(app)
+
+    # Public catalog reads may go to secondaries, see app/utils/read_routing.py
+    from .utils.read_routing import init_read_routing
+    init_read_routing(app)
+
+    # Cross-worker cache invalidation (change streams, TTL fallback)
+    from .utils.invalidation import invalidation_bus
+    invalidation_bus.init_app(app)
+
+    # Continue-watching progress: reports are buffered and written in batches
+    from .utils.progress import progress_buffer
+    progress_buffer.init_app(app)
+
+    # Background job workers (cascade deletes etc.); worker.py runs them as a separate process
+    if app.config['JOB_WORKER_IN_PROCESS']:
+        from .utils.job_queue import JobWorker
+        app.extensions['job_worker'] = JobWorker(app).start()
 
     # Basic route for testing
     @app.route('/')
@@ -93,4 +122,25 @@ def create_app():
     def expired_token_response(callback): # Corrected parameter name
         return jsonify({"msg": "Token has expired"}), 401
 
+    # Resolve the token's user once per request (cached), exposed as current_user
+    from .utils.principals import load_principal
+
+    @jwt.user_lookup_loader
+    def user_lookup_callback(jwt_header, jwt_data):
+        return load_principal(jwt_data["sub"], jwt_data.get("iat"))
+
+    @jwt.user_lookup_error_loader
+    def user_lookup_error_response(jwt_header, jwt_data):
+        return jsonify({"msg": "User not found"}), 401
+
+    # Liveness/readiness: warm-up and MongoDB checks off the start-up path
+    from .models import build_models
+    from .utils.security import password_pool
+    from .utils.readiness import readiness
+    readiness.add_warmer("models", build_models)
+    readiness.add_warmer("password_pool", password_pool.warm)
+    from .utils.ad_index import ad_index
+    readiness.add_warmer("ad_index", ad_index.load)
+    readiness.init_app(app)
+
     return app
\ No newline at end of file
@@ -8,4 +8,134 @@ class Config:
     UPLOAD_FOLDER_THUMBNAILS = os.environ.get('UPLOAD_FOLDER_THUMBNAILS', 'static/thumbnails')
     UPLOAD_FOLDER_ADS = os.environ.get('UPLOAD_FOLDER_ADS', 'static/ads')
     # Ensure UPLOAD_FOLDER is absolute or relative to app instance path if needed
-    # For simplicity, we're assuming 'static' is at the same level as run.py
\ No newline at end of file
+    # For simplicity, we're assuming 'static' is at the same level as run.py
+
+    # Background job queue (see app/utils/job_queue.py)
+    # Run the worker pool inside the web process; set to false when running worker.py separately
+    JOB_WORKER_IN_PROCESS = os.environ.get('JOB_WORKER_IN_PROCESS', 'true').lower() == 'true'
+    JOB_WORKER_THREADS = int(os.environ.get('JOB_WORKER_THREADS', 2))
+    JOB_POLL_INTERVAL = float(os.environ.get('JOB_POLL_INTERVAL', 1.0)) # seconds between polls when idle
+    JOB_VISIBILITY_TIMEOUT = int(os.environ.get('JOB_VISIBILITY_TIMEOUT', 60)) # seconds before a leased job can be reclaimed
+    JOB_MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS', 5))
+    CASCADE_BATCH_SIZE = int(os.environ.get('CASCADE_BATCH_SIZE', 500)) # videos removed per job run
+
+    # Playlists record engagement (views/likes) in last_engaged_at at most this often, in seconds
+    ENGAGEMENT_TOUCH_INTERVAL = int(os.environ.get('ENGAGEMENT_TOUCH_INTERVAL', 300))
+
+    # Cache invalidation via change streams (see app/utils/invalidation.py)
+    INVALIDATION_BUS_ENABLED = os.environ.get('INVALIDATION_BUS_ENABLED', 'true').lower() == 'true'
+    INVALIDATION_CONSUMER_ID = os.environ.get('INVALIDATION_CONSUMER_ID') # defaults to the hostname
+    INVALIDATION_TOKEN_SAVE_INTERVAL = int(os.environ.get('INVALIDATION_TOKEN_SAVE_INTERVAL', 5)) # seconds
+    INVALIDATION_RETRY_INTERVAL = int(os.environ.get('INVALIDATION_RETRY_INTERVAL', 60)) # seconds between change stream retries
+
+    # Read-preference routing (see app/utils/read_routing.py)
+    READ_ROUTING_ENABLED = os.environ.get('READ_ROUTING_ENABLED', 'true').lower() == 'true'
+    PUBLIC_READ_BLUEPRINTS = ('public_data',) # GET requests on these may read from secondaries
+    PUBLIC_READ_MAX_STALENESS = int(os.environ.get('PUBLIC_READ_MAX_STALENESS', 90)) # seconds, MongoDB minimum is 90
+    READ_PIN_COOKIE = 'read_primary'
+    READ_PIN_SECONDS = int(os.environ.get('READ_PIN_SECONDS', 90)) # keep a client on the primary after it writes
+    # Anonymous engagement writes don't need read-your-writes, so they don't pin the client
+    READ_PIN_EXEMPT_ENDPOINTS = (
+        'videos.increment_view',
+        'videos.increment_like',
+        'channel_groups.increment_channel_group_click',
+        'public_data.public_channel_group_click',
+        'public_data.put_playback_progress', # progress is always read from the primary
+        'auth.login',
+    )
+
+    # Rate limiting for unauthenticated engagement writes (see app/utils/rate_limit.py)
+    RATE_LIMIT_ENABLED = os.environ.get('RATE_LIMIT_ENABLED', 'true').lower() == 'true'
+    RATE_LIMITS = {
+        # name: (burst, tokens refilled per second) per client and endpoint
+        'engagement': (
+            int(os.environ.get('RATE_LIMIT_ENGAGEMENT_BURST', 20)),
+            float(os.environ.get('RATE_LIMIT_ENGAGEMENT_PER_SECOND', 0.5)),
+        ),
+        'login': (
+            int(os.environ.get('RATE_LIMIT_LOGIN_BURST', 10)),
+            float(os.environ.get('RATE_LIMIT_LOGIN_PER_SECOND', 0.2)),
+        ),
+    }
+    RATE_LIMIT_MAX_KEYS = int(os.environ.get('RATE_LIMIT_MAX_KEYS', 65536))
+    RATE_LIMIT_STORAGE = os.environ.get('RATE_LIMIT_STORAGE') # sqlite file shared by local workers; in-memory if unset
+    RATE_LIMIT_TRUST_PROXY = os.environ.get('RATE_LIMIT_TRUST_PROXY', 'false').lower() == 'true' # use X-Forwarded-For
+
+    # Per-request sampling profiler (see app/utils/profiling.py)
+    PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', 'true').lower() == 'true'
+    PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', 0.0)) # fraction of all requests to profile
+    PROFILE_INTERVAL_MS = float(os.environ.get('PROFILE_INTERVAL_MS', 5))
+    PROFILE_DIR = os.environ.get('PROFILE_DIR', 'profiles')
+    PROFILE_RING_SIZE = int(os.environ.get('PROFILE_RING_SIZE', 200)) # newest profiles kept on disk
+
+    # Slow-query log (see app/utils/slow_queries.py)
+    SLOW_QUERY_LOG_ENABLED = os.environ.get('SLOW_QUERY_LOG_ENABLED', 'true').lower() == 'true'
+    SLOW_QUERY_THRESHOLD_MS = float(os.environ.get('SLOW_QUERY_THRESHOLD_MS', 100))
+    SLOW_QUERY_EXPLAIN_SAMPLE_RATE = float(os.environ.get('SLOW_QUERY_EXPLAIN_SAMPLE_RATE', 0.1)) # fraction of slow queries explained
+    SLOW_QUERY_LOG_BYTES = int(os.environ.get('SLOW_QUERY_LOG_BYTES', 16 * 1024 * 1024)) # size of the capped collection
+
+    # Combined admin dashboard caching: served fresh for this long, then stale while one refresh runs
+    DASHBOARD_FRESH_SECONDS = int(os.environ.get('DASHBOARD_FRESH_SECONDS', 30))
+    DASHBOARD_STALE_SECONDS = int(os.environ.get('DASHBOARD_STALE_SECONDS', 300))
+
+    # Admin watched-series listing
+    WATCHED_SERIES_PAGE_SIZE = int(os.environ.get('WATCHED_SERIES_PAGE_SIZE', 100))
+    WATCHED_SERIES_MAX_PAGE_SIZE = int(os.environ.get('WATCHED_SERIES_MAX_PAGE_SIZE', 1000))
+    WATCHED_SERIES_BATCH_SIZE = int(os.environ.get('WATCHED_SERIES_BATCH_SIZE', 500)) # cursor batch size
+
+    # Per-route database round-trip budgets (@round_trip_budget); unset = strict only in debug/testing
+    ROUND_TRIP_BUDGET_STRICT = (os.environ['ROUND_TRIP_BUDGET_STRICT'].lower() == 'true'
+                                if 'ROUND_TRIP_BUDGET_STRICT' in os.environ else None)
+
+    # Where playlists/videos/ads/channel groups are stored: 'mongo' or 'memory' (in-process, for tests and benchmarks)
+    STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND', 'mongo').lower()
+
+    # Bulk NDJSON catalog import/export
+    CATALOG_IMPORT_CHUNK_SIZE = int(os.environ.get('CATALOG_IMPORT_CHUNK_SIZE', 500))
+    CATALOG_IMPORT_MAX_ERRORS = int(os.environ.get('CATALOG_IMPORT_MAX_ERRORS', 1000)) # per-line errors kept in the report
+    CATALOG_EXPORT_BATCH_SIZE = int(os.environ.get('CATALOG_EXPORT_BATCH_SIZE', 1000))
+
+    # List endpoints stream their JSON arrays straight from the cursor
+    STREAM_LIST_RESPONSES = os.environ.get('STREAM_LIST_RESPONSES', 'true').lower() == 'true'
+    STREAM_CHUNK_BYTES = int(os.environ.get('STREAM_CHUNK_BYTES', 16384)) # bytes buffered per written chunk
+    LIST_CURSOR_BATCH_SIZE = int(os.environ.get('LIST_CURSOR_BATCH_SIZE', 500))
+
+    # Cache of authenticated principals (user id, username, role) for JWT-protected routes
+    PRINCIPAL_CACHE_TTL = int(os.environ.get('PRINCIPAL_CACHE_TTL', 60)) # seconds, with change-stream invalidation
+    PRINCIPAL_CACHE_FALLBACK_TTL = int(os.environ.get('PRINCIPAL_CACHE_FALLBACK_TTL', 10)) # seconds, without it
+    PRINCIPAL_CACHE_SIZE = int(os.environ.get('PRINCIPAL_CACHE_SIZE', 4096))
+
+    # Password hashing (bcrypt) runs in a bounded process pool, see app/utils/security.py
+    BCRYPT_ROUNDS = int(os.environ.get('BCRYPT_ROUNDS', 12)) # stored hashes with another cost are rehashed on login
+    PASSWORD_POOL_PROCESSES = int(os.environ.get('PASSWORD_POOL_PROCESSES', 2)) # 0 = hash on the request thread
+    PASSWORD_POOL_MAX_PENDING = int(os.environ.get('PASSWORD_POOL_MAX_PENDING', 16)) # running + queued; beyond -> 503
+    PASSWORD_POOL_TIMEOUT = float(os.environ.get('PASSWORD_POOL_TIMEOUT', 10.0)) # seconds to wait for a result
+
+    # Readiness (/readyz) is checked in the background, see app/utils/readiness.py
+    READINESS_CHECK_INTERVAL = float(os.environ.get('READINESS_CHECK_INTERVAL', 10)) # seconds; 0 = no background thread
+    READINESS_TIMEOUT = float(os.environ.get('READINESS_TIMEOUT', 5)) # seconds per ping + index check
+    READINESS_REQUIRE_INDEXES = os.environ.get('READINESS_REQUIRE_INDEXES', 'true').lower() == 'true'
+
+    # In-process ad placement index (app/utils/ad_index.py)
+    AD_INDEX_FALLBACK_TTL = int(os.environ.get('AD_INDEX_FALLBACK_TTL', 30)) # seconds between rebuilds without change streams
+
+    # Batch reads (/api/videos/batch, /api/playlists/batch)
+    BATCH_GET_MAX_IDS = int(os.environ.get('BATCH_GET_MAX_IDS', 100))
+
+    # Channel-group click analytics (app/utils/click_analytics.py)
+    CLICK_DEDUP_SECONDS = int(os.environ.get('CLICK_DEDUP_SECONDS', 30)) # repeats from one client within this aren't counted
+    CLICK_DEDUP_MAX_KEYS = int(os.environ.get('CLICK_DEDUP_MAX_KEYS', 65536))
+    CLICK_ANALYTICS_MAX_DAYS = int(os.environ.get('CLICK_ANALYTICS_MAX_DAYS', 366))
+
+    # Related series (MinHash/LSH), see app/utils/related.py
+    RELATED_TOP_K = int(os.environ.get('RELATED_TOP_K', 10))
+    RELATED_BANDS = int(os.environ.get('RELATED_BANDS', 32)) # bands x rows = signature length;
+    RELATED_ROWS_PER_BAND = int(os.environ.get('RELATED_ROWS_PER_BAND', 2)) # candidates from ~(1/bands)**(1/rows) similarity up
+    RELATED_MIN_SCORE = float(os.environ.get('RELATED_MIN_SCORE', 0.1))
+
+    # Continue-watching progress (app/utils/progress.py)
+    PROGRESS_FLUSH_INTERVAL = float(os.environ.get('PROGRESS_FLUSH_INTERVAL', 10)) # seconds between writes of buffered positions
+    PROGRESS_BUFFER_MAX_KEYS = int(os.environ.get('PROGRESS_BUFFER_MAX_KEYS', 50000)) # flush early past this many (device, video) pairs
+    PROGRESS_COMPLETE_RATIO = float(os.environ.get('PROGRESS_COMPLETE_RATIO', 0.95)) # position/duration counted as finished
+    CONTINUE_WATCHING_LIMIT = int(os.environ.get('CONTINUE_WATCHING_LIMIT', 20))
+    CONTINUE_WATCHING_MAX_LIMIT = int(os.environ.get('CONTINUE_WATCHING_MAX_LIMIT', 50))
@@ -0,0 +1,303 @@
+# app/memory_store.py
+"""
+In-memory document store behind the "memory" storage backend.
+
+Supports what the repositories need and nothing more: _id lookups (one or $in), equality
+filters on indexed fields (region, playlist_id, ...), the comparison operators
+$gt/$gte/$lt/$lte/$ne on any field, newest-first listing by created_at,
+inclusion projections, counting and single-document upserts. Anything the query
+syntax doesn't cover is passed as a `condition` predicate. Documents live in
+a dict keyed by _id, each indexed field has a value -> ids map, and created_at
+is kept in a sorted list so listings never sort the whole collection.
+
+Each call counts as one database round-trip. A repository method that stands in
+for one MongoDB command but needs several store calls (a join, say) wraps them
+in `with one_round_trip():`.
+"""
+import bisect
+import copy
+import operator
+import threading
+from contextlib import contextmanager
+
+from bson import ObjectId
+from pymongo.errors import DuplicateKeyError
+
+from app.utils.round_trips import record_round_trip
+
+_COMPARISONS = {"$gt": operator.gt, "$gte": operator.ge, "$lt": operator.lt, "$lte": operator.le}
+_nesting = threading.local()
+
+
+@contextmanager
+def one_round_trip():
+    """Counts the store calls made inside as a single round-trip."""
+    depth = getattr(_nesting, "depth", 0)
+    if depth == 0:
+        record_round_trip()
+    _nesting.depth = depth + 1
+    try:
+        yield
+    finally:
+        _nesting.depth = depth
+
+
+def _round_trip():
+    if not getattr(_nesting, "depth", 0):
+        record_round_trip()
+
+
+def _condition_holds(actual, condition):
+    """One field's query condition: a literal (equality) or an {"$op": value} document."""
+    if not isinstance(condition, dict):
+        return actual == condition
+    for op, value in condition.items():
+        if op == "$in":
+            if actual not in value:
+                return False
+        elif op == "$ne":
+            if actual == value:
+                return False
+        elif op in _COMPARISONS:
+            # like MongoDB, a missing field (or one of another type) never compares
+            try:
+                if actual is None or not _COMPARISONS[op](actual, value):
+                    return False
+            except TypeError:
+                return False
+        else:
+            raise ValueError(f"Unsupported query operator {op} in the memory store")
+    return True
+
+
+def project(doc, projection):
+    """Applies an inclusion projection ({"field": 1, ...}); _id is kept unless excluded."""
+    if doc is None:
+        return None
+    if not projection:
+        return copy.deepcopy(doc)
+    shaped = {k: copy.deepcopy(doc[k]) for k, v in projection.items() if v and k in doc}
+    if projection.get("_id", 1) and "_id" in doc:
+        shaped["_id"] = doc["_id"]
+    return shaped
+
+
+class MemoryCollection:
+    def __init__(self, indexed_fields=()):
+        self._docs = {}
+        self._indexes = {field: {} for field in indexed_fields}
+        self._by_created = []  # sorted (created_at, insertion seq, _id)
+        self._created_key = {}  # _id -> its entry in _by_created
+        self._seq = 0
+        self._lock = threading.RLock()
+
+    # --- index maintenance ---
+
+    def _index(self, doc):
+        for field, index in self._indexes.items():
+            index.setdefault(doc.get(field), set()).add(doc["_id"])
+        if doc.get("created_at") is not None:
+            self._seq += 1
+            key = (doc["created_at"], self._seq, doc["_id"])
+            bisect.insort(self._by_created, key)
+            self._created_key[doc["_id"]] = key
+
+    def _unindex(self, doc):
+        for field, index in self._indexes.items():
+            ids = index.get(doc.get(field))
+            if ids is not None:
+                ids.discard(doc["_id"])
+                if not ids:
+                    del index[doc.get(field)]
+        key = self._created_key.pop(doc["_id"], None)
+        if key is not None:
+            del self._by_created[bisect.bisect_left(self._by_created, key)]
+
+    # --- queries ---
+
+    def _candidate_ids(self, query):
+        """Ids that may match `query`, narrowed by the most selective usable index."""
+        best = None
+        for field, value in query.items():
+            if field == "_id":
+                if isinstance(value, dict) and "$in" in value:
+                    return [v for v in value["$in"] if v in self._docs]
+                if not isinstance(value, dict):
+                    return [value] if value in self._docs else []
+                continue
+            index = self._indexes.get(field)
+            if index is None:
+                continue
+            if isinstance(value, dict) and "$in" in value:
+                ids = set().union(*(index.get(v, ()) for v in value["$in"]))
+            elif isinstance(value, dict):
+                continue
+            else:
+                ids = index.get(value, set())
+            if best is None or len(ids) < len(best):
+                best = ids
+        return self._docs.keys() if best is None else best
+
+    @staticmethod
+    def _matches(doc, query):
+        return all(_condition_holds(doc.get(field), value) for field, value in query.items())
+
+    def _select(self, query, condition=None):
+        return [self._docs[i] for i in self._candidate_ids(query)
+                if i in self._docs and self._matches(self._docs[i], query)
+                and (condition is None or condition(self._docs[i]))]
+
+    def _sorted(self, query, sort, limit=0, condition=None):
+        if sort and sort[0] == "created_at":
+            ordered = self._by_created if sort[1] > 0 else reversed(self._by_created)
+            candidates = None if not query else set(self._candidate_ids(query))
+            docs = []
+            for _, _, doc_id in ordered:
+                if candidates is not None and doc_id not in candidates:
+                    continue
+                doc = self._docs[doc_id]
+                if self._matches(doc, query) and (condition is None or condition(doc)):
+                    docs.append(doc)
+                    if limit and len(docs) >= limit:
+                        break
+            return docs
+        docs = self._select(query, condition)
+        if sort:
+            docs.sort(key=lambda d: (d.get(sort[0]) is not None, d.get(sort[0])), reverse=sort[1] < 0)
+        return docs[:limit] if limit else docs
+
+    def find(self, query=None, projection=None, sort=None, limit=0, condition=None):
+        """Matching documents as a list; `sort` is (field, direction)."""
+        _round_trip()
+        with self._lock:
+            return [project(d, projection) for d in self._sorted(query or {}, sort, limit, condition)]
+
+    def find_one(self, doc_id, projection=None):
+        _round_trip()
+        with self._lock:
+            return project(self._docs.get(doc_id), projection)
+
+    def count(self, query=None):
+        _round_trip()
+        with self._lock:
+            return len(self._select(query or {}))
+
+    def group_count(self, field, values):
+        """{value: number of documents with doc[field] == value} for the given values."""
+        _round_trip()
+        with self._lock:
+            index = self._indexes.get(field)
+            if index is not None:
+                return {v: len(index[v]) for v in values if index.get(v)}
+            counts = {}
+            for doc in self._select({field: {"$in": list(values)}}):
+                counts[doc[field]] = counts.get(doc[field], 0) + 1
+            return counts
+
+    # --- writes ---
+
+    def insert(self, doc):
+        _round_trip()
+        with self._lock:
+            doc.setdefault("_id", ObjectId())
+            if doc["_id"] in self._docs:
+                raise DuplicateKeyError(f"E11000 duplicate key error dup key: {{ _id: {doc['_id']!r} }}", 11000)
+            stored = copy.deepcopy(doc)
+            self._docs[stored["_id"]] = stored
+            self._index(stored)
+            return doc
+
+    def update(self, doc_id, set_fields=None, inc_fields=None, projection=None, condition=None):
+        """$set/$inc on one document; returns it after the update, or None if missing (or `condition` fails)."""
+        _round_trip()
+        with self._lock:
+            doc = self._docs.get(doc_id)
+            if doc is None or (condition is not None and not condition(doc)):
+                return None
+            return self._apply(doc, set_fields, inc_fields, projection)
+
+    def _apply(self, doc, set_fields, inc_fields, projection=None):
+        self._unindex(doc)
+        doc.update(copy.deepcopy(set_fields or {}))
+        for field, amount in (inc_fields or {}).items():
+            doc[field] = doc.get(field, 0) + amount
+        self._index(doc)
+        return project(doc, projection)
+
+    def upsert(self, doc_id, set_fields=None, inc_fields=None, set_on_insert=None, condition=None):
+        """
+        update() that creates the document when it doesn't exist (with
+        `set_on_insert` as well). Returns True if it wrote, False if an existing
+        document failed `condition`.
+        """
+        _round_trip()
+        with self._lock:
+            doc = self._docs.get(doc_id)
+            if doc is None:
+                doc = {"_id": doc_id, **copy.deepcopy(set_on_insert or {})}
+                self._docs[doc_id] = doc
+                self._index(doc)
+            elif condition is not None and not condition(doc):
+                return False
+            self._apply(doc, set_fields, inc_fields)
+            return True
+
+    def update_first(self, query=None, sort=None, set_fields=None, inc_fields=None, projection=None, condition=None):
+        """update() on the first matching document in `sort` order; returns it after the update, or None."""
+        _round_trip()
+        with self._lock:
+            docs = self._sorted(query or {}, sort, 1, condition)
+            if not docs:
+                return None
+            return self._apply(docs[0], set_fields, inc_fields, projection)
+
+    def replace(self, doc):
+        """
+        Stores `doc` in place of the document with its _id (inserting it if
+        there is none). Returns the document it replaced, or None.
+        """
+        _round_trip()
+        with self._lock:
+            old = self._docs.get(doc["_id"])
+            if old is not None:
+                self._unindex(old)
+            stored = copy.deepcopy(doc)
+            self._docs[stored["_id"]] = stored
+            self._index(stored)
+            return old
+
+    def update_many(self, query, set_fields=None, inc_fields=None):
+        """$set/$inc on every matching document; returns how many matched."""
+        _round_trip()
+        with self._lock:
+            docs = self._select(query)
+            for doc in docs:
+                self._apply(doc, set_fields, inc_fields)
+            return len(docs)
+
+    def delete(self, doc_id, projection=None):
+        _round_trip()
+        with self._lock:
+            doc = self._docs.pop(doc_id, None)
+            if doc is None:
+                return None
+            self._unindex(doc)
+            return project(doc, projection)
+
+    def delete_many(self, query):
+        """Deletes every matching document; returns how many."""
+        _round_trip()
+        with self._lock:
+            docs = self._select(query)
+            for doc in docs:
+                del self._docs[doc["_id"]]
+                self._unindex(doc)
+            return len(docs)
+
+    def clear(self):
+        with self._lock:
+            self._docs.clear()
+            for index in self._indexes.values():
+                index.clear()
+            self._by_created.clear()
+            self._created_key.clear()
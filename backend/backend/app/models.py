@@ -1,33 +1,48 @@
 # app/models.py
-from pydantic import BaseModel, Field, HttpUrl, EmailStr, validator
-from typing import List, Optional, Any
+from pydantic import BaseModel, ConfigDict, Field, HttpUrl, EmailStr, TypeAdapter, field_validator
+from pydantic_core import core_schema
+from typing import Annotated, List, Optional, Any
 from datetime import datetime
 from bson import ObjectId # Import ObjectId
 from pydantic.json_schema import JsonSchemaValue # Import JsonSchemaValue
 
-# Helper to allow ObjectId in Pydantic models and convert to str for JSON
-class PyObjectId(ObjectId):
-    @classmethod
-    def __get_validators__(cls):
-        yield cls.validate
+def _validate_object_id(v):
+    if isinstance(v, ObjectId):
+        return v
+    if not ObjectId.is_valid(v):
+        raise ValueError("Invalid ObjectId")
+    return ObjectId(v)
 
+class _ObjectIdAnnotation:
+    """Validates to a bson ObjectId (from an ObjectId or its hex string), serializes to str in JSON."""
     @classmethod
-    def validate(cls, v):
-        if not ObjectId.is_valid(v):
-            raise ValueError("Invalid ObjectId")
-        return ObjectId(v)
+    def __get_pydantic_core_schema__(cls, source_type, handler):
+        return core_schema.no_info_plain_validator_function(
+            _validate_object_id,
+            serialization=core_schema.plain_serializer_function_ser_schema(str, when_used='json'),
+        )
 
     @classmethod
-    def __get_pydantic_json_schema__(cls, core_schema, handler) -> JsonSchemaValue:
-        # Get the default JSON schema for the type
-        json_schema = handler(core_schema)
-        # Update the schema to specify type as string
-        json_schema.update(type="string")
-        return json_schema
+    def __get_pydantic_json_schema__(cls, _core_schema, handler) -> JsonSchemaValue:
+        return {"type": "string"}
+
+# ObjectId field type for Pydantic models; dumps as str with mode='json' / model_dump_json
+PyObjectId = Annotated[ObjectId, _ObjectIdAnnotation]
+
+# Shared by the models that are built from MongoDB documents (populated by "_id")
+DB_MODEL_CONFIG = ConfigDict(from_attributes=True, populate_by_name=True)
+
+class Model(BaseModel):
+    """
+    Base for the models below. Validators and serializers are built on first
+    use (or by build_models(), which readiness warm-up calls in the background)
+    instead of at import, which keeps worker start-up short.
+    """
+    model_config = ConfigDict(defer_build=True)
 
 # Rest of your models.py content remains the same
 # --- User Models ---
-class UserBase(BaseModel):
+class UserBase(Model):
     username: str
 
 class UserCreate(UserBase):
@@ -36,22 +51,23 @@ class UserCreate(UserBase):
 class UserLogin(UserCreate):
     pass
 
+class PasswordChange(Model):
+    current_password: str
+    new_password: str
+
 class UserInDB(UserBase):
-    id: Optional[PyObjectId] = Field(alias='_id')
+    model_config = DB_MODEL_CONFIG
+
+    id: Optional[PyObjectId] = Field(default=None, alias='_id')
     hashed_password: str
     role: str = "admin"
 
-    class Config:
-        orm_mode = True
-        allow_population_by_field_name = True
-        json_encoders = {ObjectId: str}
-
-class Token(BaseModel):
+class Token(Model):
     access_token: str
     token_type: str
 
 # --- Video Models ---
-class VideoBase(BaseModel):
+class VideoBase(Model):
     title: str
     description: Optional[str] = ""
     keywords: Optional[str] = "" # Comma-separated string or List[str]
@@ -60,34 +76,32 @@ class VideoBase(BaseModel):
 class VideoCreate(VideoBase):
     pass # No extra fields for creation beyond base initially
 
-class VideoUpdate(BaseModel):
-    title: Optional[str]
-    description: Optional[str]
-    keywords: Optional[str]
-    video_link: Optional[HttpUrl]
+class VideoUpdate(Model):
+    title: Optional[str] = None
+    description: Optional[str] = None
+    keywords: Optional[str] = None
+    video_link: Optional[HttpUrl] = None
 
 class VideoInDB(VideoBase):
+    model_config = DB_MODEL_CONFIG
+
     id: PyObjectId = Field(alias='_id')
+    video_link: str # Validated on the way in; returned as stored
     playlist_id: PyObjectId # Reference to the playlist
     # Add other fields from your React state if needed, e.g., views, likes
     views: int = 0
     likes: int = 0
-    region: Optional[str] # Can be inherited from playlist
+    region: Optional[str] = None # Can be inherited from playlist
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
 
-    class Config:
-        orm_mode = True
-        allow_population_by_field_name = True
-        json_encoders = {ObjectId: str}
-
 # --- Playlist (Series) Models ---
-class PlaylistBase(BaseModel):
+class PlaylistBase(Model):
     title: str
     description: Optional[str] = ""
     keywords: Optional[str] = "" # Comma-separated
     region: str
-    thumbnail_url: Optional[HttpUrl] = None
+    thumbnail_url: Optional[str] = None # Server-relative path, e.g. /static/thumbnails/...
     genre: str # e.g., 'Education', 'Entertainment'
 
     # thumbnail_url will be set after file upload by the server
@@ -95,7 +109,7 @@ class PlaylistBase(BaseModel):
 class PlaylistCreate(PlaylistBase):
     pass
 
-class PlaylistUpdate(BaseModel):
+class PlaylistUpdate(Model):
     # make all update fields optional so partial updates won't fail validation
     title: Optional[str] = None
     description: Optional[str] = None
@@ -106,23 +120,21 @@ class PlaylistUpdate(BaseModel):
     # thumbnail_url might be updated via a separate endpoint or if a new file is uploaded
 
 class PlaylistInDB(PlaylistBase):
+    model_config = DB_MODEL_CONFIG
+
     id: PyObjectId = Field(alias='_id')
-    thumbnail_url: Optional[HttpUrl] = None # URL of the uploaded thumbnail
+    thumbnail_url: Optional[str] = None # URL of the uploaded thumbnail
     videos: List[VideoInDB] = [] # List of embedded/referenced videos
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
 
-    class Config:
-        orm_mode = True
-        allow_population_by_field_name = True
-        json_encoders = {ObjectId: str}
-
 # --- Advertisement Models ---
-class AdBase(BaseModel):
+class AdBase(Model):
     target_video_id: PyObjectId # ID of the video the ad is for
     placement: str # e.g., 'before', 'after'
 
-    @validator('placement')
+    @field_validator('placement')
+    @classmethod
     def placement_must_be_valid(cls, v):
         if v not in ['before', 'after']:
             raise ValueError('Placement must be "before" or "after"')
@@ -133,18 +145,15 @@ class AdCreate(AdBase):
     pass
 
 class AdInDB(AdBase):
+    model_config = DB_MODEL_CONFIG
+
     id: PyObjectId = Field(alias='_id')
     ad_file_name: str
-    ad_file_url: HttpUrl
+    ad_file_url: str # Server-relative path, e.g. /static/ads/general_ads/...
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
-    class Config:
-        orm_mode = True
-        allow_population_by_field_name = True
-        json_encoders = {ObjectId: str}
-
 # --- Channel Group Models ---
-class ChannelGroupBase(BaseModel):
+class ChannelGroupBase(Model):
     region: str
     type: str # e.g., 'Telegram', 'WhatsApp', 'WeChat'
     link: HttpUrl
@@ -152,53 +161,106 @@ class ChannelGroupBase(BaseModel):
 class ChannelGroupCreate(ChannelGroupBase):
     pass
 
-class ChannelGroupUpdate(BaseModel):
-    region: Optional[str]
-    type: Optional[str]
-    link: Optional[HttpUrl]
+class ChannelGroupUpdate(Model):
+    region: Optional[str] = None
+    type: Optional[str] = None
+    link: Optional[HttpUrl] = None
 
 class ChannelGroupInDB(ChannelGroupBase):
+    model_config = DB_MODEL_CONFIG
+
     id: PyObjectId = Field(alias='_id')
+    link: str # Validated on the way in; returned as stored
     clicks: int = 0
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
-    class Config:
-        orm_mode = True
-        allow_population_by_field_name = True
-        json_encoders = {ObjectId: str}
+# --- Playback progress (continue watching) ---
+class ProgressUpdate(Model):
+    position: float = Field(ge=0) # seconds into the video
+    duration: Optional[float] = Field(default=None, gt=0) # seconds, if the player knows it
+    completed: bool = False
+
+# --- Bulk catalog import (one NDJSON line each) ---
+class PlaylistImport(Model):
+    model_config = DB_MODEL_CONFIG
+
+    id: Optional[PyObjectId] = Field(default=None, alias='_id')
+    ref: Optional[str] = None # Import-local name that videos can point at via playlist_ref
+    title: str
+    description: Optional[str] = ""
+    keywords: Optional[str] = ""
+    region: str
+    genre: Optional[str] = None
+    thumbnail_url: Optional[str] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
+class VideoImport(VideoBase):
+    model_config = DB_MODEL_CONFIG
+
+    id: Optional[PyObjectId] = Field(default=None, alias='_id')
+    playlist_id: Optional[PyObjectId] = None
+    playlist_ref: Optional[str] = None
+    video_link: str # Exported catalogs carry links as stored
+    views: int = 0
+    likes: int = 0
+    region: Optional[str] = None # Inherited from the playlist when missing
+    subtitle_url: Optional[str] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
 
 # --- For Admin Data & Public Data ---
 # These will often be compositions of the models above or specific summary structures
 
-class DashboardStats(BaseModel):
+class DashboardStats(Model):
     total_views: int
     total_likes: int
     watch_time_hours: float # Or string like "4.5K"
     total_series: int
 
-class RecentVideoInfo(BaseModel):
+class RecentVideoInfo(Model):
     id: PyObjectId
     title: str
     views: str # Or int
     likes: str # Or int
     region: str
 
-class WatchedSeriesInfo(BaseModel):
+class WatchedSeriesInfo(Model):
     id: PyObjectId
     title: str
     total_watch_time: str # Or float
     total_videos: int # Renamed from totalEpisodes for clarity
     region: str
 
-class RegionalAnalyticsSummary(BaseModel):
+class RegionalAnalyticsSummary(Model):
     region: str
     views: str
     watch_time: str
     # subscribers: str # You had this commented out, can be added
     avg_duration: str
 
-class TopPerformingVideo(BaseModel):
+class TopPerformingVideo(Model):
     title: str
     region: str
     views: str
-    likes: str
\ No newline at end of file
+    likes: str
+
+# --- Module-level adapters for list payloads (schemas are built once, on first use) ---
+VideoListAdapter = TypeAdapter(List[VideoInDB], config=ConfigDict(defer_build=True))
+AdListAdapter = TypeAdapter(List[AdInDB], config=ConfigDict(defer_build=True))
+ChannelGroupListAdapter = TypeAdapter(List[ChannelGroupInDB], config=ConfigDict(defer_build=True))
+
+
+def build_models():
+    """Builds every deferred model and adapter schema now; returns how many were built."""
+    built = 0
+    for obj in list(globals().values()):
+        if isinstance(obj, type) and issubclass(obj, Model) and obj is not Model:
+            if not obj.__pydantic_complete__:
+                obj.model_rebuild()
+                built += 1
+        elif isinstance(obj, TypeAdapter) and not obj.pydantic_complete:
+            obj.rebuild()
+            built += 1
+    return built
+
@@ -0,0 +1,953 @@
+# app/repositories.py
+"""
+Data access for everything the app stores: the catalog (playlists, videos,
+advertisements, channel groups), users, the job queue, related series, click
+buckets, playback progress, dashboard snapshots and the slow-query log.
+
+Each method is one database round-trip: updates and deletes use
+find_one_and_update / find_one_and_delete so the route gets the document back
+without a second read, and inserts return the document that was written.
+Routes use these through `repos` (e.g. repos.playlists.get(p_id)). Reads go
+through read_db(), so public catalog reads may be served by secondaries (see
+app/utils/read_routing.py).
+
+STORAGE_BACKEND selects the implementation: "mongo" (default) or "memory",
+which keeps the same data in process (see app/memory_store.py) so the app can
+be run, exercised and benchmarked without a MongoDB server.
+"""
+import datetime
+
+from pymongo import ASCENDING, DESCENDING, ReplaceOne, ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from app import mongo
+from app.memory_store import MemoryCollection, one_round_trip
+from app.utils.read_routing import read_db
+from app.utils.round_trips import record_get_more
+from app.utils.slow_queries import SLOW_QUERY_COLLECTION
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+
+_DUPLICATE_KEY = 11000
+_VIDEO_SUMMARY = {"title": 1, "views": 1, "likes": 1, "playlist_id": 1}
+_PROGRESS_FIELDS = {"_id": 0, "video_id": 1, "position": 1, "duration": 1, "completed": 1, "updated_at": 1}
+
+
+def _now():
+    return datetime.datetime.utcnow()
+
+
+# --- MongoDB backend ---
+
+# Joins a video to just its playlist's region
+_PLAYLIST_REGION_LOOKUP = {"$lookup": {
+    "from": "playlists", "localField": "playlist_id", "foreignField": "_id",
+    "pipeline": [{"$project": {"region": 1}}], "as": "playlist",
+}}
+
+_TOTALS_PIPELINE = [
+    {"$group": {"_id": None, "total_views": {"$sum": "$views"}, "total_likes": {"$sum": "$likes"}}}
+]
+
+# Per-playlist sums only exist inside the pipeline; the output is one row per region
+_REGIONS_PIPELINE = [
+    {"$group": {"_id": "$playlist_id", "views": {"$sum": "$views"}}},
+    {"$lookup": {
+        "from": "playlists", "localField": "_id", "foreignField": "_id",
+        "pipeline": [{"$project": {"region": 1}}], "as": "playlist",
+    }},
+    {"$unwind": "$playlist"},
+    {"$group": {"_id": "$playlist.region", "views": {"$sum": "$views"}}},
+]
+
+
+def _latest_pipeline(limit):
+    return [
+        {"$sort": {"created_at": -1}},
+        {"$limit": limit},
+        {"$project": _VIDEO_SUMMARY},
+        _PLAYLIST_REGION_LOOKUP,
+    ]
+
+
+def _top_pipeline(limit):
+    # videos of deleted playlists are dropped before the limit, so there are still `limit` rows
+    return [
+        {"$sort": {"views": -1}},
+        {"$project": _VIDEO_SUMMARY},
+        _PLAYLIST_REGION_LOOKUP,
+        {"$match": {"playlist.0": {"$exists": True}}},
+        {"$limit": limit},
+    ]
+
+
+def _with_region(videos):
+    for video in videos:
+        video["region"] = (video.pop("playlist", None) or [{}])[0].get("region")
+    return videos
+
+
+def _totals(row):
+    row = row or {}
+    return {"total_views": row.get("total_views", 0), "total_likes": row.get("total_likes", 0)}
+
+
+def _region_rows(rows):
+    return [{"region": row["_id"], "views": row["views"]} for row in rows]
+
+
+class MongoRepository:
+    collection_name = None
+
+    @property
+    def collection(self):
+        return mongo.db[self.collection_name]
+
+    @property
+    def reader(self):
+        """The collection as the current request should read it (primary or secondaryPreferred)."""
+        return read_db()[self.collection_name]
+
+    def insert(self, doc):
+        """Inserts `doc` and returns it with its new _id."""
+        doc["_id"] = self.collection.insert_one(doc).inserted_id
+        return doc
+
+    def get(self, doc_id, projection=None):
+        return self.reader.find_one({"_id": doc_id}, projection)
+
+    def exists(self, doc_id):
+        return self.reader.find_one({"_id": doc_id}, {"_id": 1}) is not None
+
+    def get_many(self, doc_ids, projection=None):
+        """{_id: document} for the given ids that exist, in one $in query."""
+        return {doc["_id"]: doc for doc in self.reader.find({"_id": {"$in": list(doc_ids)}}, projection)}
+
+    def update(self, doc_id, fields, projection=None):
+        """$set `fields`; returns the updated document, or None if it doesn't exist."""
+        return self.collection.find_one_and_update(
+            {"_id": doc_id}, {"$set": fields},
+            projection=projection, return_document=ReturnDocument.AFTER
+        )
+
+    def delete(self, doc_id, projection=None):
+        """Deletes and returns the document, or None if it doesn't exist."""
+        return self.collection.find_one_and_delete({"_id": doc_id}, projection=projection)
+
+    def write_many(self, docs, ordered=True, replace=False):
+        """
+        Inserts `docs` (or, with replace, upserts them by _id) in one bulk write.
+        Returns (inserted, replaced, errors), errors being the failed writes as
+        [(index in docs, message)]; an ordered write stops at its first failure.
+        """
+        try:
+            if replace:
+                result = self.collection.bulk_write(
+                    [ReplaceOne({"_id": d["_id"]}, d, upsert=True) for d in docs], ordered=ordered)
+                return result.upserted_count, result.modified_count, []
+            result = self.collection.insert_many(docs, ordered=ordered)
+            return len(result.inserted_ids), 0, []
+        except BulkWriteError as e:
+            details = e.details
+            errors = [(err["index"], err.get("errmsg", "write failed")) for err in details.get("writeErrors", [])]
+            if replace:
+                return details.get("nUpserted", 0), details.get("nModified", 0), errors
+            return details.get("nInserted", 0), 0, errors
+
+    def _list(self, query, projection=None, sort=None, limit=0, batch_size=0):
+        cursor = self.reader.find(query, projection)
+        if batch_size:
+            cursor = cursor.batch_size(batch_size)
+        if sort:
+            cursor = cursor.sort(*sort)
+        if limit:
+            cursor = cursor.limit(limit)
+        return cursor
+
+
+class MongoPlaylistRepository(MongoRepository):
+    collection_name = "playlists"
+
+    def list(self, region=None, projection=None, sort=("created_at", -1), batch_size=0):
+        query = {"region": region} if region else {}
+        return self._list(query, projection, sort, batch_size=batch_size)
+
+    def page(self, after=None, limit=100, projection=None):
+        """Up to `limit` playlists in _id order, starting after the `after` _id."""
+        query = {"_id": {"$gt": after}} if after else {}
+        return list(self._list(query, projection, ("_id", ASCENDING), limit))
+
+    def count(self):
+        return self.reader.count_documents({})
+
+    def count_by_region(self):
+        """[{"region", "count"}], one row per region (None for playlists without one)."""
+        rows = self.reader.aggregate([{"$group": {"_id": "$region", "count": {"$sum": 1}}}])
+        return [{"region": row["_id"], "count": row["count"]} for row in rows]
+
+    def content_version(self, region=None):
+        """Count and newest updated_at of the (filtered) playlists, for listing ETags."""
+        query = {"region": region} if region else {}
+        return next(self.reader.aggregate([
+            {"$match": query},
+            {"$group": {"_id": None, "count": {"$sum": 1}, "latest": {"$max": "$updated_at"}}}
+        ]), {})
+
+    def touch(self, playlist_id, projection=None):
+        """Marks the playlist's content as changed; returns it (or None if missing)."""
+        return self.update(playlist_id, {"updated_at": _now()}, projection)
+
+    def touch_many(self, playlist_ids):
+        self.collection.update_many({"_id": {"$in": list(playlist_ids)}}, {"$set": {"updated_at": _now()}})
+
+    def touch_engagement(self, playlist_id, interval_seconds):
+        now = _now()
+        cutoff = now - datetime.timedelta(seconds=interval_seconds)
+        self.collection.update_one(
+            {"_id": playlist_id, "$or": [{"last_engaged_at": {"$lt": cutoff}}, {"last_engaged_at": {"$exists": False}}]},
+            {"$set": {"last_engaged_at": now}}
+        )
+
+
+class MongoVideoRepository(MongoRepository):
+    collection_name = "videos"
+
+    def list(self, playlist_id=None, projection=None, sort=("created_at", -1), batch_size=0, region=None):
+        query = {"playlist_id": playlist_id} if playlist_id else {}
+        if region:
+            query["region"] = region
+        return self._list(query, projection, sort, batch_size=batch_size)
+
+    def list_for_playlist(self, playlist_id, projection=None, limit=0):
+        """Videos of one playlist in storage order (as the playlist pages show them)."""
+        return self._list({"playlist_id": playlist_id}, projection, limit=limit)
+
+    def count_for_playlist(self, playlist_id):
+        return self.reader.count_documents({"playlist_id": playlist_id})
+
+    def count_by_playlist(self, playlist_ids):
+        """{playlist_id: number of videos} for several playlists in one grouped query."""
+        if not playlist_ids:
+            return {}
+        cursor = self.reader.aggregate([
+            {"$match": {"playlist_id": {"$in": list(playlist_ids)}}},
+            {"$group": {"_id": "$playlist_id", "count": {"$sum": 1}}}
+        ])
+        return {c["_id"]: c["count"] for c in cursor}
+
+    def totals_by_playlist(self, playlist_ids, batch_size=0):
+        """{playlist_id: {"total_videos", "total_watch_time"}} for the given playlists."""
+        cursor = self.reader.aggregate([
+            {"$match": {"playlist_id": {"$in": list(playlist_ids)}}},
+            {"$group": {
+                "_id": "$playlist_id",
+                "total_videos": {"$sum": 1},
+                "total_watch_time": {"$sum": "$views"} # Placeholder
+            }}
+        ], allowDiskUse=True, **({"batchSize": batch_size} if batch_size else {}))
+        return {t["_id"]: t for t in cursor}
+
+    def totals(self):
+        """{"total_views", "total_likes"} over every video."""
+        return _totals(next(self.reader.aggregate(_TOTALS_PIPELINE), None))
+
+    def latest(self, limit):
+        """The newest videos (title, views, likes, playlist_id) with their playlist's region."""
+        return _with_region(list(self.reader.aggregate(_latest_pipeline(limit))))
+
+    def top_viewed(self, limit):
+        """The most viewed videos of existing playlists, with the playlist's region."""
+        return _with_region(list(self.reader.aggregate(_top_pipeline(limit))))
+
+    def views_by_region(self):
+        """[{"region", "views"}] summed over the videos of each region's playlists."""
+        return _region_rows(self.reader.aggregate(_REGIONS_PIPELINE, allowDiskUse=True))
+
+    def dashboard(self, limit):
+        """totals(), latest(), top_viewed() and views_by_region() in one $facet pass over the videos."""
+        facets = next(self.reader.aggregate([
+            {"$facet": {
+                "totals": _TOTALS_PIPELINE,
+                "latest": _latest_pipeline(limit),
+                "top": _top_pipeline(limit),
+                "regions": _REGIONS_PIPELINE,
+            }}
+        ], allowDiskUse=True), {})
+        return {
+            "totals": _totals((facets.get("totals") or [None])[0]),
+            "latest": _with_region(facets.get("latest", [])),
+            "top": _with_region(facets.get("top", [])),
+            "regions": _region_rows(facets.get("regions", [])),
+        }
+
+    def manifest(self, video_id):
+        """
+        The video with "playlist" (title, region, thumbnail_url, updated_at; None
+        if missing) and "episodes" (the playlist's videos as {_id, title,
+        video_link}, oldest first by created_at then _id), or None.
+        """
+        video = next(self.reader.aggregate([
+            {"$match": {"_id": video_id}},
+            # Joined documents are trimmed on the server, before they're added to the video
+            {"$lookup": {
+                "from": "playlists", "localField": "playlist_id", "foreignField": "_id",
+                "pipeline": [{"$project": {"title": 1, "region": 1, "thumbnail_url": 1, "updated_at": 1}}],
+                "as": "playlist",
+            }},
+            {"$lookup": {
+                "from": "videos", "localField": "playlist_id", "foreignField": "playlist_id",
+                "pipeline": [
+                    {"$sort": {"created_at": 1, "_id": 1}},
+                    {"$project": {"title": 1, "video_link": 1}},
+                ],
+                "as": "episodes",
+            }},
+        ]), None)
+        if video is not None:
+            video["playlist"] = (video["playlist"] or [None])[0]
+        return video
+
+    def increment(self, video_id, field, projection=None):
+        """$inc a counter (views/likes); returns the video (projected) or None."""
+        return self.collection.find_one_and_update(
+            {"_id": video_id}, {"$inc": {field: 1}}, projection=projection or {"playlist_id": 1}
+        )
+
+    def delete_many(self, video_ids):
+        self.collection.delete_many({"_id": {"$in": list(video_ids)}})
+
+
+class MongoAdRepository(MongoRepository):
+    collection_name = "advertisements"
+
+    def list(self, target_video_id=None, projection=None, sort=("created_at", -1), batch_size=0):
+        query = {"target_video_id": target_video_id} if target_video_id else {}
+        return self._list(query, projection, sort, batch_size=batch_size)
+
+    def list_for_videos(self, video_ids, projection=None):
+        return self._list({"target_video_id": {"$in": list(video_ids)}}, projection)
+
+    def delete_for_videos(self, video_ids):
+        self.collection.delete_many({"target_video_id": {"$in": list(video_ids)}})
+
+
+class MongoChannelGroupRepository(MongoRepository):
+    collection_name = "channel_groups"
+
+    def list(self, region=None, projection=None, sort=("created_at", -1), batch_size=0):
+        query = {"region": region} if region else {}
+        return self._list(query, projection, sort, batch_size=batch_size)
+
+    def increment_clicks(self, group_id):
+        """Bumps the lifetime counter; returns the group's region (as {"_id", "region"}), or None if missing."""
+        return self.collection.find_one_and_update(
+            {"_id": group_id}, {"$inc": {"clicks": 1}}, projection={"region": 1}
+        )
+
+
+class MongoUserRepository(MongoRepository):
+    collection_name = "users"
+
+    def find_by_username(self, username, projection=None):
+        return self.reader.find_one({"username": username}, projection)
+
+    def set_password_hash(self, user_id, hashed_password, previous=None, changed_at=None):
+        """
+        Stores a new password hash; with `previous`, only if the stored hash is
+        still that one. `changed_at` is recorded as password_changed_at. Returns
+        whether the user was updated.
+        """
+        query = {"_id": user_id}
+        if previous is not None:
+            query["hashed_password"] = previous
+        fields = {"hashed_password": hashed_password}
+        if changed_at is not None:
+            fields["password_changed_at"] = changed_at
+        return self.collection.update_one(query, {"$set": fields}).modified_count == 1
+
+
+class MongoJobRepository(MongoRepository):
+    collection_name = "jobs"
+
+    def ensure_indexes(self):
+        self.collection.create_index([("status", ASCENDING), ("run_at", ASCENDING)])
+        self.collection.create_index([("status", ASCENDING), ("lease_expires_at", ASCENDING)])
+
+    def lease(self, job_types, now, fields):
+        """
+        Claims the oldest runnable job of the given types (queued and due, or
+        running with an expired lease): $set `fields`, counts an attempt and
+        returns the job, or None.
+        """
+        return self.collection.find_one_and_update(
+            {
+                "type": {"$in": list(job_types)},
+                "$or": [
+                    {"status": JOB_QUEUED, "run_at": {"$lte": now}},
+                    {"status": JOB_RUNNING, "lease_expires_at": {"$lte": now}},
+                ],
+            },
+            {"$set": fields, "$inc": {"attempts": 1}},
+            sort=[("run_at", ASCENDING)],
+            return_document=ReturnDocument.AFTER,
+        )
+
+    def settle(self, job, fields, inc_fields=None):
+        """Updates a leased job if `job`'s lease is still the current one; returns whether it was."""
+        update = {"$set": fields}
+        if inc_fields:
+            update["$inc"] = inc_fields
+        result = self.collection.update_one({"_id": job["_id"], "lease_id": job["lease_id"]}, update)
+        return result.matched_count == 1
+
+
+class MongoRelatedRepository(MongoRepository):
+    collection_name = "related_playlists"
+
+    def save_many(self, updates):
+        """$set for [(playlist_id, fields, upsert)] in one unordered bulk write."""
+        if updates:
+            self.collection.bulk_write([UpdateOne({"_id": doc_id}, {"$set": fields}, upsert=upsert)
+                                        for doc_id, fields, upsert in updates], ordered=False)
+
+    def neighbours(self, playlist_id, bands, projection=None):
+        """Playlists sharing an LSH band with `bands`, plus the ones whose list has the playlist."""
+        if not bands:
+            return list(self.collection.find({"related._id": playlist_id}, projection))
+        return list(self.collection.find(
+            {"$or": [{"bands": {"$in": bands}}, {"related._id": playlist_id}], "_id": {"$ne": playlist_id}},
+            projection
+        ))
+
+    def remove(self, playlist_id):
+        """Drops a playlist's document and its entries in other playlists' lists."""
+        self.collection.delete_one({"_id": playlist_id})
+        self.collection.update_many({"related._id": playlist_id}, {"$pull": {"related": {"_id": playlist_id}}})
+
+    def delete_older_than(self, moment):
+        self.collection.delete_many({"updated_at": {"$lt": moment}})
+
+    def clear(self):
+        self.collection.delete_many({})
+
+
+class MongoClickBucketRepository(MongoRepository):
+    collection_name = "click_buckets"
+
+    def add_click(self, bucket_id, group_id, day, region):
+        """$inc the day's bucket of a group, creating it on the day's first click."""
+        self.collection.update_one(
+            {"_id": bucket_id},
+            {
+                "$inc": {"clicks": 1},
+                "$setOnInsert": {"group_id": group_id, "day": day},
+                "$set": {"region": region},
+            },
+            upsert=True
+        )
+
+    def in_range(self, start, end, region=None, group_id=None):
+        """Buckets ({"group_id", "region", "day", "clicks"}) of the days start..end."""
+        query = {"day": {"$gte": start, "$lte": end}}
+        if region:
+            query["region"] = region
+        if group_id:
+            query["group_id"] = group_id
+        return self.reader.find(query, {"_id": 0, "group_id": 1, "region": 1, "day": 1, "clicks": 1})
+
+
+class MongoProgressRepository(MongoRepository):
+    collection_name = "playback_progress"
+
+    @property
+    def reader(self):
+        # a device resumes right after its own report, so progress is read from the primary
+        return self.collection
+
+    def in_progress(self, device_id, limit):
+        """The device's `limit` most recently updated unfinished records (newest first)."""
+        return list(self.collection.find(
+            {"device_id": device_id, "completed": False}, _PROGRESS_FIELDS
+        ).sort("updated_at", DESCENDING).limit(limit))
+
+    def write_many(self, records):
+        """
+        Upserts records (each with its _id) in one unordered bulk write. A record
+        only replaces a stored one with an older updated_at.
+        """
+        ops = [UpdateOne(
+            {"_id": record["_id"], "updated_at": {"$lt": record["updated_at"]}},
+            {"$set": {k: v for k, v in record.items() if k != "_id"}},
+            upsert=True
+        ) for record in records]
+        try:
+            self.collection.bulk_write(ops, ordered=False)
+        except BulkWriteError as e:
+            # a duplicate key means the stored record is newer (the filter didn't match); anything else is real
+            if any(err.get("code") != _DUPLICATE_KEY for err in e.details.get("writeErrors", [])):
+                raise
+
+    def delete_for_videos(self, video_ids):
+        self.collection.delete_many({"video_id": {"$in": list(video_ids)}})
+
+
+class MongoSnapshotRepository(MongoRepository):
+    collection_name = "dashboard_snapshots"
+
+    def acquire_refresh(self, snapshot_id, now, lease_seconds):
+        """Takes the refresh lease of a snapshot unless another worker holds it; returns whether it did."""
+        try:
+            self.collection.find_one_and_update(
+                {"_id": snapshot_id, "$or": [{"refreshing_until": {"$lt": now}}, {"refreshing_until": None}]},
+                {"$set": {"refreshing_until": now + datetime.timedelta(seconds=lease_seconds)}},
+                upsert=True
+            )
+            return True
+        except DuplicateKeyError:
+            return False # another worker holds the refresh lease
+
+    def save(self, snapshot_id, data):
+        self.collection.update_one(
+            {"_id": snapshot_id},
+            {"$set": {"data": data, "computed_at": _now(), "refreshing_until": None}},
+            upsert=True
+        )
+
+
+class MongoSlowQueryRepository(MongoRepository):
+    collection_name = SLOW_QUERY_COLLECTION
+
+    def recent(self, query, limit):
+        """Logged slow queries, newest first."""
+        return list(self.collection.find(query).sort("$natural", -1).limit(limit))
+
+    def by_shape(self, query, limit):
+        """Logged slow queries grouped by shape_hash, most frequent first."""
+        return list(self.collection.aggregate([
+            {"$match": query},
+            {"$group": {
+                "_id": "$shape_hash",
+                "command": {"$first": "$command"},
+                "collection": {"$first": "$collection"},
+                "shape": {"$first": "$shape"},
+                "routes": {"$addToSet": "$route"},
+                "count": {"$sum": 1},
+                "avg_ms": {"$avg": "$duration_ms"},
+                "max_ms": {"$max": "$duration_ms"},
+                "last_seen": {"$max": "$at"},
+                "explain": {"$last": "$explain"},
+            }},
+            {"$sort": {"count": -1}},
+            {"$limit": limit}
+        ]))
+
+
+# --- In-memory backend ---
+
+class MemoryRepository:
+    indexed_fields = ()
+
+    def __init__(self):
+        self.store = MemoryCollection(self.indexed_fields)
+
+    def insert(self, doc):
+        return self.store.insert(doc)
+
+    def get(self, doc_id, projection=None):
+        return self.store.find_one(doc_id, projection)
+
+    def exists(self, doc_id):
+        return self.store.find_one(doc_id, {"_id": 1}) is not None
+
+    def get_many(self, doc_ids, projection=None):
+        return {doc["_id"]: doc for doc in self.store.find({"_id": {"$in": list(doc_ids)}}, projection)}
+
+    def update(self, doc_id, fields, projection=None):
+        return self.store.update(doc_id, set_fields=fields, projection=projection)
+
+    def delete(self, doc_id, projection=None):
+        return self.store.delete(doc_id, projection)
+
+    def write_many(self, docs, ordered=True, replace=False):
+        inserted = replaced = 0
+        errors = []
+        with one_round_trip():
+            for index, doc in enumerate(docs):
+                try:
+                    if not replace:
+                        self.store.insert(doc)
+                        inserted += 1
+                        continue
+                    old = self.store.replace(doc)
+                    if old is None:
+                        inserted += 1
+                    elif old != doc:
+                        replaced += 1  # like modified_count, an identical replacement isn't counted
+                except DuplicateKeyError as e:
+                    errors.append((index, str(e)))
+                    if ordered:
+                        break
+        return inserted, replaced, errors
+
+    def _list(self, query, projection=None, sort=None, limit=0, batch_size=0):
+        docs = self.store.find(query, projection, sort, limit)
+        if batch_size and len(docs) > batch_size:
+            return _in_batches(docs, batch_size)
+        return docs
+
+
+def _in_batches(docs, batch_size):
+    # hands documents out the way a cursor does, counting a getMore per further batch
+    for i, doc in enumerate(docs):
+        if i and i % batch_size == 0:
+            record_get_more()
+        yield doc
+
+
+class MemoryPlaylistRepository(MemoryRepository):
+    indexed_fields = ("region",)
+
+    def list(self, region=None, projection=None, sort=("created_at", -1), batch_size=0):
+        query = {"region": region} if region else {}
+        return self._list(query, projection, sort, batch_size=batch_size)
+
+    def page(self, after=None, limit=100, projection=None):
+        query = {"_id": {"$gt": after}} if after else {}
+        return self.store.find(query, projection, ("_id", 1), limit)
+
+    def count(self):
+        return self.store.count()
+
+    def count_by_region(self):
+        counts = {}
+        for doc in self.store.find({}, {"region": 1}):
+            counts[doc.get("region")] = counts.get(doc.get("region"), 0) + 1
+        return [{"region": region, "count": count} for region, count in counts.items()]
+
+    def content_version(self, region=None):
+        query = {"region": region} if region else {}
+        docs = self.store.find(query, {"updated_at": 1})
+        if not docs:
+            return {}
+        stamps = [d["updated_at"] for d in docs if d.get("updated_at") is not None]
+        return {"count": len(docs), "latest": max(stamps) if stamps else None}
+
+    def touch(self, playlist_id, projection=None):
+        return self.update(playlist_id, {"updated_at": _now()}, projection)
+
+    def touch_many(self, playlist_ids):
+        self.store.update_many({"_id": {"$in": list(playlist_ids)}}, set_fields={"updated_at": _now()})
+
+    def touch_engagement(self, playlist_id, interval_seconds):
+        now = _now()
+        cutoff = now - datetime.timedelta(seconds=interval_seconds)
+        self.store.update(
+            playlist_id, set_fields={"last_engaged_at": now},
+            condition=lambda doc: doc.get("last_engaged_at") is None or doc["last_engaged_at"] < cutoff
+        )
+
+
+class MemoryVideoRepository(MemoryRepository):
+    indexed_fields = ("playlist_id",)
+
+    def __init__(self, playlists):
+        super().__init__()
+        self.playlists = playlists  # for the joins MongoDB does with $lookup
+
+    def list(self, playlist_id=None, projection=None, sort=("created_at", -1), batch_size=0, region=None):
+        query = {"playlist_id": playlist_id} if playlist_id else {}
+        if region:
+            query["region"] = region
+        return self._list(query, projection, sort, batch_size=batch_size)
+
+    def list_for_playlist(self, playlist_id, projection=None, limit=0):
+        return self._list({"playlist_id": playlist_id}, projection, limit=limit)
+
+    def count_for_playlist(self, playlist_id):
+        return self.store.count({"playlist_id": playlist_id})
+
+    def count_by_playlist(self, playlist_ids):
+        if not playlist_ids:
+            return {}
+        return self.store.group_count("playlist_id", playlist_ids)
+
+    def totals_by_playlist(self, playlist_ids, batch_size=0):
+        totals = {}
+        for doc in self.store.find({"playlist_id": {"$in": list(playlist_ids)}}, {"playlist_id": 1, "views": 1}):
+            row = totals.setdefault(doc["playlist_id"], {"_id": doc["playlist_id"], "total_videos": 0, "total_watch_time": 0})
+            row["total_videos"] += 1
+            row["total_watch_time"] += doc.get("views") or 0
+        return totals
+
+    def _regions(self, videos):
+        # {playlist_id: region} of the videos' playlists that exist
+        ids = {v.get("playlist_id") for v in videos}
+        return {p["_id"]: p.get("region") for p in self.playlists.store.find({"_id": {"$in": list(ids)}}, {"region": 1})}
+
+    def totals(self):
+        docs = self.store.find({}, {"views": 1, "likes": 1})
+        return {"total_views": sum(d.get("views") or 0 for d in docs),
+                "total_likes": sum(d.get("likes") or 0 for d in docs)}
+
+    def latest(self, limit):
+        with one_round_trip():
+            videos = self.store.find({}, _VIDEO_SUMMARY, ("created_at", -1), limit)
+            regions = self._regions(videos)
+        for video in videos:
+            video["region"] = regions.get(video.get("playlist_id"))
+        return videos
+
+    def top_viewed(self, limit):
+        with one_round_trip():
+            videos = self.store.find({}, _VIDEO_SUMMARY, ("views", -1))
+            regions = self._regions(videos)
+        top = [v for v in videos if v.get("playlist_id") in regions][:limit]
+        for video in top:
+            video["region"] = regions[video["playlist_id"]]
+        return top
+
+    def views_by_region(self):
+        with one_round_trip():
+            videos = self.store.find({}, {"playlist_id": 1, "views": 1})
+            regions = self._regions(videos)
+        views = {}
+        for video in videos:
+            if video.get("playlist_id") in regions:
+                region = regions[video["playlist_id"]]
+                views[region] = views.get(region, 0) + (video.get("views") or 0)
+        return [{"region": region, "views": total} for region, total in views.items()]
+
+    def dashboard(self, limit):
+        with one_round_trip():
+            return {
+                "totals": self.totals(),
+                "latest": self.latest(limit),
+                "top": self.top_viewed(limit),
+                "regions": self.views_by_region(),
+            }
+
+    def manifest(self, video_id):
+        with one_round_trip():
+            video = self.store.find_one(video_id)
+            if video is None:
+                return None
+            playlist_id = video.get("playlist_id")
+            video["playlist"] = self.playlists.store.find_one(
+                playlist_id, {"title": 1, "region": 1, "thumbnail_url": 1, "updated_at": 1})
+            episodes = self.store.find({"playlist_id": playlist_id}, {"title": 1, "video_link": 1, "created_at": 1})
+        episodes.sort(key=lambda e: (e.get("created_at") is not None, e.get("created_at") or 0, e["_id"]))
+        video["episodes"] = [{k: v for k, v in e.items() if k != "created_at"} for e in episodes]
+        return video
+
+    def increment(self, video_id, field, projection=None):
+        return self.store.update(video_id, inc_fields={field: 1}, projection=projection or {"playlist_id": 1})
+
+    def delete_many(self, video_ids):
+        self.store.delete_many({"_id": {"$in": list(video_ids)}})
+
+
+class MemoryAdRepository(MemoryRepository):
+    indexed_fields = ("target_video_id",)
+
+    def list(self, target_video_id=None, projection=None, sort=("created_at", -1), batch_size=0):
+        query = {"target_video_id": target_video_id} if target_video_id else {}
+        return self._list(query, projection, sort, batch_size=batch_size)
+
+    def list_for_videos(self, video_ids, projection=None):
+        return self._list({"target_video_id": {"$in": list(video_ids)}}, projection)
+
+    def delete_for_videos(self, video_ids):
+        self.store.delete_many({"target_video_id": {"$in": list(video_ids)}})
+
+
+class MemoryChannelGroupRepository(MemoryRepository):
+    indexed_fields = ("region",)
+
+    def list(self, region=None, projection=None, sort=("created_at", -1), batch_size=0):
+        query = {"region": region} if region else {}
+        return self._list(query, projection, sort, batch_size=batch_size)
+
+    def increment_clicks(self, group_id):
+        return self.store.update(group_id, inc_fields={"clicks": 1}, projection={"region": 1})
+
+
+class MemoryUserRepository(MemoryRepository):
+    indexed_fields = ("username",)
+
+    def find_by_username(self, username, projection=None):
+        users = self.store.find({"username": username}, projection, limit=1)
+        return users[0] if users else None
+
+    def set_password_hash(self, user_id, hashed_password, previous=None, changed_at=None):
+        fields = {"hashed_password": hashed_password}
+        if changed_at is not None:
+            fields["password_changed_at"] = changed_at
+        return self.store.update(
+            user_id, set_fields=fields,
+            condition=None if previous is None else lambda doc: doc.get("hashed_password") == previous
+        ) is not None
+
+
+class MemoryJobRepository(MemoryRepository):
+    indexed_fields = ("status",)
+
+    def ensure_indexes(self):
+        pass
+
+    def lease(self, job_types, now, fields):
+        def runnable(job):
+            if job["status"] == JOB_QUEUED:
+                return job["run_at"] <= now
+            return job["status"] == JOB_RUNNING and job.get("lease_expires_at") is not None \
+                and job["lease_expires_at"] <= now
+        return self.store.update_first(
+            {"type": {"$in": list(job_types)}}, ("run_at", 1),
+            set_fields=fields, inc_fields={"attempts": 1}, condition=runnable
+        )
+
+    def settle(self, job, fields, inc_fields=None):
+        return self.store.update(
+            job["_id"], set_fields=fields, inc_fields=inc_fields,
+            condition=lambda doc: doc.get("lease_id") == job["lease_id"]
+        ) is not None
+
+
+def _lists(playlist_id):
+    return lambda doc: any(entry["_id"] == playlist_id for entry in doc.get("related", ()))
+
+
+class MemoryRelatedRepository(MemoryRepository):
+    def save_many(self, updates):
+        with one_round_trip():
+            for doc_id, fields, upsert in updates:
+                if upsert:
+                    self.store.upsert(doc_id, set_fields=fields)
+                else:
+                    self.store.update(doc_id, set_fields=fields)
+
+    def neighbours(self, playlist_id, bands, projection=None):
+        # no multikey index here: a scan of the related documents
+        shared = set(bands)
+        lists_it = _lists(playlist_id)
+        return self.store.find({"_id": {"$ne": playlist_id}}, projection, condition=lambda doc: (
+            lists_it(doc) or not shared.isdisjoint(doc.get("bands", ()))))
+
+    def remove(self, playlist_id):
+        self.store.delete(playlist_id)
+        with one_round_trip():
+            for doc in self.store.find({}, {"related": 1}, condition=_lists(playlist_id)):
+                related = [entry for entry in doc["related"] if entry["_id"] != playlist_id]
+                self.store.update(doc["_id"], set_fields={"related": related})
+
+    def delete_older_than(self, moment):
+        self.store.delete_many({"updated_at": {"$lt": moment}})
+
+    def clear(self):
+        self.store.delete_many({})
+
+
+class MemoryClickBucketRepository(MemoryRepository):
+    indexed_fields = ("group_id",)
+
+    def add_click(self, bucket_id, group_id, day, region):
+        self.store.upsert(bucket_id, set_fields={"region": region}, inc_fields={"clicks": 1},
+                          set_on_insert={"group_id": group_id, "day": day})
+
+    def in_range(self, start, end, region=None, group_id=None):
+        query = {"day": {"$gte": start, "$lte": end}}
+        if region:
+            query["region"] = region
+        if group_id:
+            query["group_id"] = group_id
+        return self.store.find(query, {"_id": 0, "group_id": 1, "region": 1, "day": 1, "clicks": 1})
+
+
+class MemoryProgressRepository(MemoryRepository):
+    indexed_fields = ("device_id", "video_id")
+
+    def in_progress(self, device_id, limit):
+        return self.store.find({"device_id": device_id, "completed": False}, _PROGRESS_FIELDS,
+                               ("updated_at", -1), limit)
+
+    def write_many(self, records):
+        with one_round_trip():
+            for record in records:
+                updated_at = record["updated_at"]
+                self.store.upsert(
+                    record["_id"], set_fields={k: v for k, v in record.items() if k != "_id"},
+                    condition=lambda doc: doc.get("updated_at") is not None and doc["updated_at"] < updated_at
+                )
+
+    def delete_for_videos(self, video_ids):
+        self.store.delete_many({"video_id": {"$in": list(video_ids)}})
+
+
+class MemorySnapshotRepository(MemoryRepository):
+    def acquire_refresh(self, snapshot_id, now, lease_seconds):
+        return self.store.upsert(
+            snapshot_id, set_fields={"refreshing_until": now + datetime.timedelta(seconds=lease_seconds)},
+            condition=lambda doc: doc.get("refreshing_until") is None or doc["refreshing_until"] < now
+        )
+
+    def save(self, snapshot_id, data):
+        self.store.upsert(snapshot_id, set_fields={"data": data, "computed_at": _now(), "refreshing_until": None})
+
+
+class MemorySlowQueryRepository:
+    # the slow-query log records MongoDB commands; the memory backend issues none
+    def recent(self, query, limit):
+        return []
+
+    def by_shape(self, query, limit):
+        return []
+
+
+STORAGE_BACKENDS = ("mongo", "memory")
+
+
+class Repositories:
+    def __init__(self):
+        self.backend = None
+        self.use_mongo()
+
+    def configure(self, backend):
+        if backend not in STORAGE_BACKENDS:
+            raise ValueError(f"Unknown STORAGE_BACKEND {backend!r}, expected one of {STORAGE_BACKENDS}")
+        if backend == "memory":
+            self.use_memory()
+        else:
+            self.use_mongo()
+
+    def use_mongo(self):
+        self.backend = "mongo"
+        self.playlists = MongoPlaylistRepository()
+        self.videos = MongoVideoRepository()
+        self.advertisements = MongoAdRepository()
+        self.channel_groups = MongoChannelGroupRepository()
+        self.users = MongoUserRepository()
+        self.jobs = MongoJobRepository()
+        self.related = MongoRelatedRepository()
+        self.click_buckets = MongoClickBucketRepository()
+        self.progress = MongoProgressRepository()
+        self.dashboard_snapshots = MongoSnapshotRepository()
+        self.slow_queries = MongoSlowQueryRepository()
+
+    def use_memory(self):
+        """Switches to fresh, empty in-memory repositories."""
+        self.backend = "memory"
+        self.playlists = MemoryPlaylistRepository()
+        self.videos = MemoryVideoRepository(self.playlists)
+        self.advertisements = MemoryAdRepository()
+        self.channel_groups = MemoryChannelGroupRepository()
+        self.users = MemoryUserRepository()
+        self.jobs = MemoryJobRepository()
+        self.related = MemoryRelatedRepository()
+        self.click_buckets = MemoryClickBucketRepository()
+        self.progress = MemoryProgressRepository()
+        self.dashboard_snapshots = MemorySnapshotRepository()
+        self.slow_queries = MemorySlowQueryRepository()
+
+
+repos = Repositories()
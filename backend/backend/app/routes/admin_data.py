@@ -1,26 +1,30 @@
-from flask import Blueprint, request, jsonify, current_app
-from app import mongo
+from flask import Blueprint, request, jsonify, current_app, stream_with_context
+from app.repositories import repos
 from app.models import DashboardStats, RecentVideoInfo, WatchedSeriesInfo, RegionalAnalyticsSummary, TopPerformingVideo
 from pymongo.errors import PyMongoError
 from pydantic import ValidationError
 from bson import ObjectId
+import datetime
+from app.utils.invalidation import invalidation_bus
+from app.utils.read_routing import read_routing_stats
+from app.utils.profiling import load_profiles, aggregate_stacks
+from app.utils.cache import StaleWhileRevalidateCache
+from app.utils.catalog_io import export_catalog, import_catalog, CATALOG_COLLECTIONS
+from app.utils.job_queue import enqueue_job
+from app.utils.related import RELATED_REBUILD
+from app.config import Config
+from app.utils.principals import admin_required
 
 admin_data_bp = Blueprint('admin', __name__)
 
 @admin_data_bp.route('/dashboard-stats', methods=['GET'])
 def get_dashboard_stats():
     try:
-        total_views_result = mongo.db.videos.aggregate([
-            {"$group": {"_id": None, "total_views": {"$sum": "$views"}}}
-        ])
-        total_views = next(total_views_result, {"total_views": 0})["total_views"]
+        totals = repos.videos.totals()
+        total_views = totals["total_views"]
+        total_likes = totals["total_likes"]
 
-        total_likes_result = mongo.db.videos.aggregate([
-            {"$group": {"_id": None, "total_likes": {"$sum": "$likes"}}}
-        ])
-        total_likes = next(total_likes_result, {"total_likes": 0})["total_likes"]
-
-        total_series = mongo.db.playlists.count_documents({})
+        total_series = repos.playlists.count()
 
         watch_time_hours = 0.0 # Placeholder
 
@@ -37,148 +41,311 @@ def get_dashboard_stats():
 @admin_data_bp.route('/recent-videos', methods=['GET'])
 def get_recent_videos():
     try:
-        recent_videos_cursor = mongo.db.videos.find().sort("created_at", -1).limit(10)
-        recent_videos = []
-        for video_doc in recent_videos_cursor:
-            playlist_doc = mongo.db.playlists.find_one({"_id": video_doc["playlist_id"]})
-            region = playlist_doc["region"] if playlist_doc else "N/A"
-
-            video_info = {
-                "id": str(video_doc["_id"]),
-                "title": video_doc["title"],
-                "views": str(video_doc.get("views", 0)),
-                "likes": str(video_doc.get("likes", 0)),
-                "region": region
-            }
-            recent_videos.append(video_info)
-
-        return jsonify(recent_videos), 200
+        # each video comes with its playlist's region (one aggregation, no per-video lookup)
+        return jsonify(_recent_video_rows(repos.videos.latest(10))), 200
     except Exception as e:
         return jsonify({"message": f"Error: {str(e)}"}), 500
 
+def _recent_video_rows(videos):
+    return [{
+        "id": str(v["_id"]),
+        "title": v.get("title"),
+        "views": str(v.get("views", 0)),
+        "likes": str(v.get("likes", 0)),
+        "region": v.get("region") or "N/A",
+    } for v in videos]
+
+def _top_video_rows(videos):
+    return [TopPerformingVideo(
+        title=v.get("title"),
+        region=v.get("region") or "",
+        views=str(v.get("views", 0)),
+        likes=str(v.get("likes", 0)),
+    ).model_dump() for v in videos]
+
+def _regional_rows(rows):
+    # "duration_in_seconds" not implemented, using dummy values
+    return [RegionalAnalyticsSummary(
+        region=row["region"], views=str(row["views"]), watch_time="N/A", avg_duration="N/A"
+    ).model_dump() for row in rows]
+
+def _watched_series_page(after=None, limit=100):
+    """
+    One page of per-series totals, in playlist _id order. Videos are grouped by
+    playlist_id for just this page's playlists, so no document ever embeds a
+    series' videos (the old $lookup could hit the 16 MB limit on long series).
+    Returns (rows, next_after).
+    """
+    playlists = repos.playlists.page(after, limit, {"title": 1, "region": 1})
+    if not playlists:
+        return [], None
+
+    totals = repos.videos.totals_by_playlist(
+        [p["_id"] for p in playlists], batch_size=current_app.config['WATCHED_SERIES_BATCH_SIZE'])
+
+    rows = []
+    for p in playlists:
+        t = totals.get(p["_id"], {})
+        rows.append({
+            "_id": str(p["_id"]),
+            "title": p.get("title"),
+            "region": p.get("region"),
+            "total_videos": t.get("total_videos", 0),
+            "total_watch_time": t.get("total_watch_time", 0),
+        })
+    next_after = playlists[-1]["_id"] if len(playlists) == limit else None
+    return rows, next_after
+
 @admin_data_bp.route('/watched-series', methods=['GET'])
 def get_watched_series_info():
+    """
+    Paginated: ?limit= (default WATCHED_SERIES_PAGE_SIZE) and ?after=<playlist id>.
+    The cursor for the next page is in the X-Next-After header (absent on the last page).
+    """
+    after = request.args.get('after')
+    if after and not ObjectId.is_valid(after):
+        return jsonify({"message": "Invalid 'after' cursor"}), 400
     try:
-        # Just sum views as total_watch_time placeholder
-        series_info_cursor = mongo.db.playlists.aggregate([
-            {
-                "$lookup": {
-                    "from": "videos",
-                    "localField": "_id",
-                    "foreignField": "playlist_id",
-                    "as": "videos"
-                }
-            },
-            {
-                "$project": {
-                    "_id": 1,
-                    "title": 1,
-                    "region": 1,
-                    "total_videos": {"$size": "$videos"},
-                    "total_watch_time": {"$sum": "$videos.views"} # Placeholder
-                }
-            }
-        ])
-        series_info = list(series_info_cursor)
-
-        for doc in series_info:
-            doc["_id"] = str(doc["_id"])
-        # series_info = []
-        # for doc in series_info_cursor:
-        #     print("Arsooo")
-        #     series_info.append(WatchedSeriesInfo(
-        #         id=doc["_id"],
-        #         title=doc["title"],
-        #         total_watch_time=str(doc.get("total_watch_time", 0)),
-        #         total_videos=doc.get("total_videos", 0),
-        #         region=doc.get("region", "")
-        #     ).model_dump(by_alias=True))
-        return jsonify(series_info), 200
+        limit = int(request.args.get('limit', current_app.config['WATCHED_SERIES_PAGE_SIZE']))
+    except ValueError:
+        return jsonify({"message": "limit must be an integer"}), 400
+    limit = max(1, min(limit, current_app.config['WATCHED_SERIES_MAX_PAGE_SIZE']))
+
+    try:
+        series_info, next_after = _watched_series_page(ObjectId(after) if after else None, limit)
+        response = jsonify(series_info)
+        if next_after:
+            response.headers['X-Next-After'] = str(next_after)
+        return response, 200
     except Exception as e:
         return jsonify({"message": f"Error: {str(e)}"}), 500
 
 @admin_data_bp.route('/regional_analytics_summary', methods=['GET'])
 def get_regional_analytics_summary():
-    # "duration_in_seconds" not implemented, using dummy value
     try:
-        regional_summary_cursor = mongo.db.videos.aggregate([
-            {
-                "$lookup": {
-                    "from": "playlists",
-                    "localField": "playlist_id",
-                    "foreignField": "_id",
-                    "as": "playlist_info"
-                }
-            },
-            {"$unwind": "$playlist_info"},
-            {
-                "$group": {
-                    "_id": "$playlist_info.region",
-                    "views": {"$sum": "$views"},
-                    # "watch_time": {"$sum": "$duration_in_seconds"}
-                    # "avg_duration": {"$avg": "$duration_in_seconds"}
-                }
-            },
-            {
-                "$project": {
-                    "region": "$_id",
-                    "views": {"$toString": "$views"},
-                    "watch_time": {"$literal": "N/A"},
-                    "avg_duration": {"$literal": "N/A"}
-                }
-            }
-        ])
-        regional_analytics = []
-        # print(list(regional_summary_cursor))
-        for doc in regional_summary_cursor:
-            regional_analytics.append(RegionalAnalyticsSummary(**doc).model_dump())
-        return jsonify(regional_analytics), 200
+        return jsonify(_regional_rows(repos.videos.views_by_region())), 200
     except Exception as e:
         return jsonify({"message": f"Error: {str(e)}"}), 500
 
 @admin_data_bp.route('/top_performing_videos', methods=['GET'])
 def get_top_performing_videos():
     try:
-        top_videos_cursor = mongo.db.videos.aggregate([
-            {
-                "$lookup": {
-                    "from": "playlists",
-                    "localField": "playlist_id",
-                    "foreignField": "_id",
-                    "as": "playlist_info"
-                }
-            },
-            {"$unwind": "$playlist_info"},
-            {"$sort": {"views": -1}},
-            {"$limit": 10},
-            {
-                "$project": {
-                    "_id": 0,
-                    "title": "$title",
-                    "region": "$playlist_info.region",
-                    "views": {"$toString": "$views"},
-                    "likes": {"$toString": "$likes"}
-                }
-            }
-        ])
-        top_videos = []
-        for doc in top_videos_cursor:
-            top_videos.append(TopPerformingVideo(**doc).model_dump())
-        return jsonify(top_videos), 200
+        # videos of deleted playlists are left out
+        return jsonify(_top_video_rows(repos.videos.top_viewed(10))), 200
     except Exception as e:
         return jsonify({"message": f"Error: {str(e)}"}), 500
 
 @admin_data_bp.route('/admin/analytics/regions', methods=['GET'])
 def regional_analytics():
     try:
-        # Example: return counts per region from playlists or videos collection
-        pipeline = [
-            {"$group": {"_id": "$region", "count": {"$sum": 1}}}
-        ]
-        res = list(mongo.db.playlists.aggregate(pipeline))
-        # normalize
-        out = [{"region": r.get("_id") or "unknown", "count": r.get("count", 0)} for r in res]
+        # Playlist counts per region
+        out = [{"region": r["region"] or "unknown", "count": r["count"]} for r in repos.playlists.count_by_region()]
         return jsonify({"regions": out}), 200
     except Exception as e:
         current_app.logger.exception("Failed to compute regional analytics")
-        return jsonify({"msg": "Internal server error", "error": str(e)}), 500
\ No newline at end of file
+        return jsonify({"msg": "Internal server error", "error": str(e)}), 500
+
+# --- Combined dashboard ---
+# The five panels above in four round-trips: one $facet pass over videos (every
+# facet's output is bounded: totals, ten recent, ten top, one row per region),
+# a playlist count and the first page of watched series (_watched_series_page;
+# the rest is paged through /watched-series). Engagement counters change on
+# every view, so the result is cached by time (stale-while-revalidate) rather
+# than invalidated.
+_dashboard_cache = StaleWhileRevalidateCache(
+    "admin-dashboard",
+    fresh_for=Config.DASHBOARD_FRESH_SECONDS,
+    stale_for=Config.DASHBOARD_STALE_SECONDS,
+)
+
+def _compute_dashboard():
+    panels = repos.videos.dashboard(limit=10)
+    stats = DashboardStats(
+        total_views=panels["totals"]["total_views"],
+        total_likes=panels["totals"]["total_likes"],
+        watch_time_hours=0.0, # Placeholder
+        total_series=repos.playlists.count()
+    ).model_dump()
+
+    watched_series, next_after = _watched_series_page(limit=current_app.config['WATCHED_SERIES_PAGE_SIZE'])
+
+    return {
+        "stats": stats,
+        "recent_videos": _recent_video_rows(panels["latest"]),
+        "watched_series": watched_series,
+        "watched_series_next_after": str(next_after) if next_after else None, # continue with /watched-series?after=
+        "regional_analytics": _regional_rows(panels["regions"]),
+        "top_performing_videos": _top_video_rows(panels["top"]),
+        "generated_at": datetime.datetime.utcnow(),
+    }
+
+def _load_dashboard():
+    """
+    Shares one computed dashboard between worker processes through the
+    dashboard_snapshots collection; a refresh lease makes sure only one worker
+    runs the aggregations when the snapshot goes stale.
+    """
+    now = datetime.datetime.utcnow()
+    snapshot = repos.dashboard_snapshots.get("admin")
+    if snapshot and snapshot.get("data") and \
+            (now - snapshot["computed_at"]).total_seconds() < Config.DASHBOARD_FRESH_SECONDS:
+        return snapshot["data"]
+
+    acquired = repos.dashboard_snapshots.acquire_refresh("admin", now, lease_seconds=60)
+    if not acquired and snapshot and snapshot.get("data"):
+        return snapshot["data"]
+
+    data = _compute_dashboard()
+    repos.dashboard_snapshots.save("admin", data)
+    return data
+
+@admin_data_bp.route('/dashboard', methods=['GET'])
+def get_dashboard():
+    """ All dashboard panels in one response """
+    try:
+        data, stale = _dashboard_cache.get("admin", _load_dashboard)
+        return jsonify({**data, "stale": stale}), 200
+    except Exception as e:
+        current_app.logger.exception("Failed to compute dashboard")
+        return jsonify({"message": f"Error: {str(e)}"}), 500
+
+
+@admin_data_bp.route('/jobs/<string:job_id>', methods=['GET'])
+@admin_required()
+def get_job_status(job_id):
+    if not ObjectId.is_valid(job_id):
+        return jsonify({"msg": "Invalid job ID format"}), 400
+
+    job = repos.jobs.get(
+        ObjectId(job_id),
+        {"type": 1, "status": 1, "attempts": 1, "max_attempts": 1, "last_error": 1, "created_at": 1, "updated_at": 1}
+    )
+    if not job:
+        return jsonify({"msg": "Job not found"}), 404
+    job["id"] = str(job.pop("_id"))
+    return jsonify(job), 200
+
+
+@admin_data_bp.route('/caches', methods=['GET'])
+@admin_required()
+def get_cache_stats():
+    return jsonify(invalidation_bus.stats()), 200
+
+
+@admin_data_bp.route('/read-routing', methods=['GET'])
+@admin_required()
+def get_read_routing_stats():
+    return jsonify(read_routing_stats()), 200
+
+
+@admin_data_bp.route('/profiles', methods=['GET'])
+@admin_required()
+def get_profiles():
+    """ Summary of stored request profiles, grouped by route """
+    routes = {}
+    for profile in load_profiles():
+        summary = routes.setdefault(profile.get("route"), {"route": profile.get("route"), "count": 0, "durations_ms": []})
+        summary["count"] += 1
+        if isinstance(profile.get("duration_ms"), (int, float)):  # skip profiles without a usable duration
+            summary["durations_ms"].append(profile["duration_ms"])
+    for summary in routes.values():
+        durations = sorted(summary.pop("durations_ms"))
+        summary["median_ms"] = durations[len(durations) // 2] if durations else None
+        summary["max_ms"] = durations[-1] if durations else None
+    return jsonify(sorted(routes.values(), key=lambda r: r["count"], reverse=True)), 200
+
+@admin_data_bp.route('/profiles/flamegraph', methods=['GET'])
+@admin_required()
+def get_profile_flamegraph():
+    """
+    Aggregated collapsed stacks for one route (?route=<endpoint>), or all routes.
+    ?format=collapsed returns "stack count" lines for flamegraph.pl / speedscope.
+    """
+    profiles = load_profiles(request.args.get('route'))
+    stacks = aggregate_stacks(profiles)
+    if request.args.get('format') == 'collapsed':
+        body = "\n".join(f"{stack} {count}" for stack, count in sorted(stacks.items()))
+        return current_app.response_class(body, mimetype='text/plain')
+    return jsonify({
+        "route": request.args.get('route'),
+        "profiles": len(profiles),
+        "samples": sum(stacks.values()),
+        "stacks": stacks,
+    }), 200
+
+
+@admin_data_bp.route('/slow-queries', methods=['GET'])
+@admin_required()
+def get_slow_queries():
+    """
+    Recent slow queries, newest first. Filters: ?route=, ?collection=, ?limit=
+    ?group=shape collapses them per query shape to spot the ones worth an index.
+    """
+    query = {}
+    if request.args.get('route'):
+        query['route'] = request.args.get('route')
+    if request.args.get('collection'):
+        query['collection'] = request.args.get('collection')
+    try:
+        limit = int(request.args.get('limit', 100))
+    except ValueError:
+        return jsonify({"msg": "limit must be an integer"}), 400
+    limit = max(1, min(limit, 1000))
+
+    if request.args.get('group') == 'shape':
+        groups = repos.slow_queries.by_shape(query, limit)
+        shapes = []
+        for group in groups:
+            group["shape_hash"] = group.pop("_id")
+            shapes.append(group)
+        return jsonify(shapes), 200
+
+    records = repos.slow_queries.recent(query, limit)
+    return jsonify([{**r, "_id": str(r["_id"])} for r in records]), 200
+
+
+@admin_data_bp.route('/catalog/export', methods=['GET'])
+@admin_required()
+def export_catalog_ndjson():
+    """
+    Streams the catalog as NDJSON (playlists, then videos).
+    Filters: ?region=, ?types=playlist,video
+    """
+    types = tuple(t for t in request.args.get('types', 'playlist,video').split(',') if t)
+    unknown = [t for t in types if t not in CATALOG_COLLECTIONS]
+    if unknown:
+        return jsonify({"msg": f"Unknown types: {', '.join(unknown)}"}), 400
+    lines = export_catalog(
+        region=request.args.get('region'),
+        types=types,
+        batch_size=current_app.config['CATALOG_EXPORT_BATCH_SIZE'],
+    )
+    response = current_app.response_class(stream_with_context(lines), mimetype='application/x-ndjson')
+    response.headers['Content-Disposition'] = 'attachment; filename=catalog.ndjson'
+    return response
+
+
+@admin_data_bp.route('/catalog/import', methods=['POST'])
+@admin_required()
+def import_catalog_ndjson():
+    """
+    Imports an NDJSON body (see app/utils/catalog_io.py for the line format).
+    Options: ?ordered=true stops at the first failing line, ?upsert=true replaces
+    documents with the same _id, ?chunk_size= lines per batch.
+    """
+    try:
+        chunk_size = int(request.args.get('chunk_size', current_app.config['CATALOG_IMPORT_CHUNK_SIZE']))
+    except ValueError:
+        return jsonify({"msg": "chunk_size must be an integer"}), 400
+    # Read the body line by line rather than loading it whole
+    lines = iter(request.stream.readline, b"")
+    report = import_catalog(
+        lines,
+        chunk_size=max(1, min(chunk_size, 10000)),
+        ordered=request.args.get('ordered', 'false').lower() == 'true',
+        upsert=request.args.get('upsert', 'false').lower() == 'true',
+        max_errors=current_app.config['CATALOG_IMPORT_MAX_ERRORS'],
+    )
+    if report["inserted"]["playlists"] or report["replaced"]["playlists"]:
+        enqueue_job(RELATED_REBUILD, {})
+    return jsonify(report), 200
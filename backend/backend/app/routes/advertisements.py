@@ -1,10 +1,14 @@
 # app/routes/advertisements.py
 from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import jwt_required
-from app import mongo
-from app.models import AdCreate, AdInDB, PyObjectId # Pydantic models
+from app.models import AdCreate, AdInDB # Pydantic models
 from app.utils.file_helpers import save_file
-from pydantic import ValidationError, parse_obj_as
+from app.utils.fields import requested_fields, mongo_projection, shape_doc, AD_FIELDS
+from app.utils.round_trips import round_trip_budget
+from app.repositories import repos
+from app.utils.responses import model_response, json_array_response, encode_model
+from app.utils.ad_index import ad_index
+from pydantic import ValidationError
 from bson import ObjectId
 import datetime
 import os
@@ -13,6 +17,7 @@ advertisements_bp = Blueprint('advertisements', __name__)
 
 @advertisements_bp.route('/', methods=['POST'])
 @jwt_required()
+@round_trip_budget(2)
 def create_advertisement():
     if 'ad_file' not in request.files:
         return jsonify({"msg": "Missing ad_file part"}), 400
@@ -27,15 +32,15 @@ def create_advertisement():
         if not ad_data_json:
             return jsonify({"msg": "Missing advertisement data"}), 400
         
-        form_data = AdCreate.parse_raw(ad_data_json)
+        form_data = AdCreate.model_validate_json(ad_data_json)
         
         # Validate target_video_id exists
-        target_video_id_obj = ObjectId(form_data.target_video_id) # Already PyObjectId, convert for find_one
-        if not mongo.db.videos.find_one({"_id": target_video_id_obj}):
+        target_video_id_obj = form_data.target_video_id # Validated to an ObjectId
+        if not repos.videos.exists(target_video_id_obj):
             return jsonify({"msg": "Target video not found"}), 404
 
     except ValidationError as e:
-        return jsonify(e.errors()), 400
+        return jsonify(e.errors(include_context=False)), 400
     except Exception as e: # Catch ObjectId conversion errors or other parsing issues
         return jsonify({"msg": "Invalid advertisement data format or target_video_id", "details": str(e)}), 400
 
@@ -45,19 +50,15 @@ def create_advertisement():
     if error:
         return jsonify({"msg": "Failed to save ad file", "details": error}), 500
 
-    ad_doc = form_data.dict()
+    ad_doc = form_data.model_dump()
     ad_doc['target_video_id'] = target_video_id_obj # Store as ObjectId
     ad_doc['ad_file_name'] = file.filename # Or secure_filename(file.filename)
     ad_doc['ad_file_url'] = ad_file_url
     ad_doc['created_at'] = datetime.datetime.utcnow()
 
-    result = mongo.db.advertisements.insert_one(ad_doc)
-    created_ad = mongo.db.advertisements.find_one({"_id": result.inserted_id})
-    
-    if created_ad:
-        return jsonify(AdInDB.parse_obj(created_ad).dict(by_alias=True)), 201
-    else:
-        return jsonify({"msg": "Failed to create advertisement"}), 500
+    created_ad = repos.advertisements.insert(ad_doc)
+    ad_index.add(created_ad) # other workers pick it up from the invalidation bus
+    return model_response(AdInDB.model_validate(created_ad), 201)
 
 @advertisements_bp.route('/', methods=['GET'])
 @jwt_required() # Or public if ads info is needed non-authenticated
@@ -67,29 +68,39 @@ def get_advertisements():
     Supports filtering by target_video_id.
     Example: /api/advertisements?target_video_id=<video_id>
     """
+    fields, error = requested_fields(AD_FIELDS)
+    if error:
+        return error
+
     target_video_id_filter = request.args.get('target_video_id')
-    query = {}
+    target_video_id = None
     if target_video_id_filter:
         try:
-            query['target_video_id'] = ObjectId(target_video_id_filter)
+            target_video_id = ObjectId(target_video_id_filter)
         except Exception:
             return jsonify({"msg": "Invalid target_video_id format for filter"}), 400
     
-    ads_cursor = mongo.db.advertisements.find(query).sort("created_at", -1)
-    ads_list = [AdInDB.parse_obj(ad).dict(by_alias=True) for ad in ads_cursor]
-    return jsonify(ads_list), 200
+    batch_size = current_app.config['LIST_CURSOR_BATCH_SIZE']
+    if fields:
+        ads_cursor = repos.advertisements.list(target_video_id, mongo_projection(fields), batch_size=batch_size)
+        return json_array_response(shape_doc(ad, fields) for ad in ads_cursor)
+
+    ads_cursor = repos.advertisements.list(target_video_id, batch_size=batch_size)
+    return json_array_response((AdInDB.model_validate(ad) for ad in ads_cursor), encode=encode_model)
 
 @advertisements_bp.route('/<string:ad_id>', methods=['DELETE'])
 @jwt_required()
+@round_trip_budget(1)
 def delete_advertisement(ad_id):
     try:
         ad_oid = ObjectId(ad_id)
     except Exception:
         return jsonify({"msg": "Invalid advertisement ID format"}), 400
 
-    ad_to_delete = mongo.db.advertisements.find_one({"_id": ad_oid})
+    ad_to_delete = repos.advertisements.delete(ad_oid, projection={"ad_file_url": 1})
     if not ad_to_delete:
         return jsonify({"msg": "Advertisement not found"}), 404
+    ad_index.remove(ad_oid)
 
     # Optional: Delete associated ad file from filesystem
     ad_file_url = ad_to_delete.get('ad_file_url')
@@ -105,9 +116,4 @@ def delete_advertisement(ad_id):
         except Exception as e:
             print(f"Error deleting ad file {ad_file_url}: {e}") # Log error
 
-
-    result = mongo.db.advertisements.delete_one({"_id": ad_oid})
-    if result.deleted_count == 1:
-        return jsonify({"msg": "Advertisement deleted successfully"}), 200
-    else:
-        return jsonify({"msg": "Failed to delete advertisement"}), 500
\ No newline at end of file
+    return jsonify({"msg": "Advertisement deleted successfully"}), 200
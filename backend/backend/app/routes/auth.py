@@ -1,22 +1,34 @@
 # app/routes/auth.py
 from flask import Blueprint, request, jsonify, current_app
-from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
-from app import mongo
-from app.utils.security import hash_password, verify_password
-from app.models import UserLogin, UserCreate, UserInDB, Token # Pydantic models
+from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity, current_user
+from app.repositories import repos
+from app.utils.security import hash_password, verify_password, needs_rehash, PasswordPoolBusy
+from app.utils.principals import invalidate_principal
+from app.utils.rate_limit import rate_limit
+from app.models import UserLogin, UserCreate, UserInDB, Token, PasswordChange # Pydantic models
 from pydantic import ValidationError
+from bson import ObjectId
 import datetime
 
 auth_bp = Blueprint('auth', __name__)
 
+@auth_bp.errorhandler(PasswordPoolBusy)
+def password_pool_busy(e):
+    # Every password-hashing slot is taken: fail fast rather than queue up web workers
+    response = jsonify({"msg": "Too many sign-in attempts in progress, try again shortly"})
+    response.status_code = 503
+    response.headers['Retry-After'] = '1'
+    return response
+
 @auth_bp.route('/register', methods=['POST']) # Optional: For creating admin users initially
+@rate_limit('login')
 def register():
     try:
         user_data = UserCreate(**request.json)
     except ValidationError as e:
         return jsonify(e.errors()), 400
 
-    existing_user = mongo.db.users.find_one({"username": user_data.username})
+    existing_user = repos.users.find_by_username(user_data.username, {"_id": 1})
     if existing_user:
         return jsonify({"msg": "Username already exists"}), 409
 
@@ -27,10 +39,10 @@ def register():
         "role": "admin", # Default role
         "created_at": datetime.datetime.utcnow()
     }
-    user_id = mongo.db.users.insert_one(user_to_save).inserted_id
+    user_id = repos.users.insert(user_to_save)["_id"]
     
     # Retrieve the created user to confirm and return (excluding password)
-    created_user = mongo.db.users.find_one({"_id": user_id})
+    created_user = repos.users.get(user_id)
     if created_user:
         # Use Pydantic model for response shaping if desired
         # For now, just basic info
@@ -43,15 +55,26 @@ def register():
 
 
 @auth_bp.route('/login', methods=['POST'])
+@rate_limit('login')
 def login():
     try:
         login_data = UserLogin(**request.json)
     except ValidationError as e:
         return jsonify(e.errors()), 400
 
-    user_from_db = mongo.db.users.find_one({"username": login_data.username})
+    user_from_db = repos.users.find_by_username(login_data.username)
 
     if user_from_db and verify_password(login_data.password, user_from_db["hashed_password"]):
+        # Transparently upgrade hashes made with an older BCRYPT_ROUNDS
+        if needs_rehash(user_from_db["hashed_password"]):
+            try:
+                if repos.users.set_password_hash(user_from_db["_id"], hash_password(login_data.password),
+                                                 previous=user_from_db["hashed_password"]):
+                    # Same password, so existing tokens stay valid (no password_changed_at)
+                    invalidate_principal(user_from_db["_id"])
+            except PasswordPoolBusy:
+                pass  # the login itself succeeded; upgrade on a later one
+
         # Ensure user_from_db has an '_id' before creating token
         user_id = str(user_from_db["_id"])
         access_token = create_access_token(identity=user_id) # Use user's DB ID as identity
@@ -66,17 +89,35 @@ def login():
     
     return jsonify({"msg": "Invalid username or password"}), 401
 
+@auth_bp.route('/password', methods=['POST'])
+@jwt_required()
+@rate_limit('login')
+def change_password():
+    """
+    Changes the signed-in user's password. Tokens issued before the change stop
+    working (see app/utils/principals.py); the response carries a new one.
+    """
+    try:
+        change = PasswordChange(**request.json)
+    except ValidationError as e:
+        return jsonify(e.errors()), 400
+
+    user_id = ObjectId(current_user["id"])
+    user_from_db = repos.users.get(user_id, {"hashed_password": 1})
+    if not user_from_db or not verify_password(change.current_password, user_from_db["hashed_password"]):
+        return jsonify({"msg": "Invalid password"}), 401
+
+    # Whole seconds, like a token's iat: the token issued below must not predate the change
+    changed_at = datetime.datetime.utcnow().replace(microsecond=0)
+    repos.users.set_password_hash(user_id, hash_password(change.new_password), changed_at=changed_at)
+    invalidate_principal(user_id)
+    return jsonify(access_token=create_access_token(identity=current_user["id"])), 200
+
 @auth_bp.route('/me', methods=['GET'])
 @jwt_required()
 def me():
-    current_user_id = get_jwt_identity()
-    user = mongo.db.users.find_one({"_id": mongo.db.ObjectId(current_user_id)}, {"_id": 1, "username": 1, "role": 1})
-    if not user:
-        return jsonify({"msg": "User not found"}), 404
-    
-    # Convert ObjectId to string for JSON serialization
-    user['_id'] = str(user['_id'])
-    return jsonify(user), 200
+    # Loaded (and cached) by the JWT user_lookup_loader, see app/utils/principals.py
+    return jsonify({"_id": current_user["id"], "username": current_user["username"], "role": current_user["role"]}), 200
 
 # You might want a logout endpoint if you are using token blocklists
 # For simplicity, frontend can just discard the token
\ No newline at end of file
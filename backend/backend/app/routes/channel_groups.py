@@ -1,9 +1,14 @@
 # app/routes/channel_groups.py
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import jwt_required
-from app import mongo
-from app.models import ChannelGroupCreate, ChannelGroupUpdate, ChannelGroupInDB, PyObjectId
-from pydantic import ValidationError, parse_obj_as
+from app.utils.rate_limit import rate_limit, client_key
+from app.utils.click_analytics import record_click, click_series
+from app.utils.fields import requested_fields, mongo_projection, shape_doc, CHANNEL_GROUP_FIELDS
+from app.utils.round_trips import round_trip_budget
+from app.repositories import repos
+from app.utils.responses import model_response, json_array_response, encode_model
+from app.models import ChannelGroupCreate, ChannelGroupUpdate, ChannelGroupInDB
+from pydantic import ValidationError
 from bson import ObjectId
 import datetime
 
@@ -11,23 +16,19 @@ channel_groups_bp = Blueprint('channel_groups', __name__)
 
 @channel_groups_bp.route('/', methods=['POST'])
 @jwt_required()
+@round_trip_budget(1)
 def create_channel_group():
     try:
-        data = ChannelGroupCreate(**request.json)
+        data = ChannelGroupCreate.model_validate(request.json)
     except ValidationError as e:
-        return jsonify(e.errors()), 400
+        return jsonify(e.errors(include_context=False)), 400
 
-    group_doc = data.dict()
+    group_doc = data.model_dump(mode='json') # link stored as a plain string
     group_doc['clicks'] = 0 # Initialize clicks
     group_doc['created_at'] = datetime.datetime.utcnow()
 
-    result = mongo.db.channel_groups.insert_one(group_doc)
-    created_group = mongo.db.channel_groups.find_one({"_id": result.inserted_id})
-
-    if created_group:
-        return jsonify(ChannelGroupInDB.parse_obj(created_group).dict(by_alias=True)), 201
-    else:
-        return jsonify({"msg": "Failed to create channel group"}), 500
+    created_group = repos.channel_groups.insert(group_doc)
+    return model_response(ChannelGroupInDB.model_validate(created_group), 201)
 
 @channel_groups_bp.route('/', methods=['GET'])
 @jwt_required() # Or public if this info is needed without login
@@ -37,65 +38,104 @@ def get_channel_groups():
     Supports filtering by region.
     Example: /api/channel_groups?region=English
     """
+    fields, error = requested_fields(CHANNEL_GROUP_FIELDS)
+    if error:
+        return error
+
     region_filter = request.args.get('region')
-    query = {}
+    region = None
     if region_filter and region_filter.lower() != 'all': # Assuming 'all' means no filter
-        query['region'] = region_filter
+        region = region_filter
     
     # Add more filters if needed (e.g., type)
 
-    groups_cursor = mongo.db.channel_groups.find(query).sort("created_at", -1)
-    groups_list = [ChannelGroupInDB.parse_obj(g).dict(by_alias=True) for g in groups_cursor]
-    return jsonify(groups_list), 200
+    batch_size = current_app.config['LIST_CURSOR_BATCH_SIZE']
+    if fields:
+        groups_cursor = repos.channel_groups.list(region, mongo_projection(fields), batch_size=batch_size)
+        return json_array_response(shape_doc(g, fields) for g in groups_cursor)
+
+    groups_cursor = repos.channel_groups.list(region, batch_size=batch_size)
+    return json_array_response((ChannelGroupInDB.model_validate(g) for g in groups_cursor), encode=encode_model)
 
 @channel_groups_bp.route('/<string:group_id>', methods=['PUT'])
 @jwt_required()
+@round_trip_budget(1)
 def update_channel_group(group_id):
     try:
         g_oid = ObjectId(group_id)
-        update_data = ChannelGroupUpdate(**request.json) # Pydantic validation
+        update_data = ChannelGroupUpdate.model_validate(request.json) # Pydantic validation
     except ValidationError as e:
-        return jsonify(e.errors()), 400
+        return jsonify(e.errors(include_context=False)), 400
     except Exception: # Catches invalid ObjectId
         return jsonify({"msg": "Invalid group ID format or data"}), 400
 
-    if not mongo.db.channel_groups.find_one({"_id": g_oid}):
-        return jsonify({"msg": "Channel group not found"}), 404
-
-    update_fields = update_data.dict(exclude_unset=True) # Only include fields that were provided
+    update_fields = update_data.model_dump(mode='json', exclude_unset=True) # Only include fields that were provided
     if not update_fields:
         return jsonify({"msg": "No fields to update"}), 400
     
     # Add updated_at if you track it for channel groups
     # update_fields['updated_at'] = datetime.datetime.utcnow()
 
-    mongo.db.channel_groups.update_one({"_id": g_oid}, {"$set": update_fields})
-    updated_group = mongo.db.channel_groups.find_one({"_id": g_oid})
-    return jsonify(ChannelGroupInDB.parse_obj(updated_group).dict(by_alias=True)), 200
+    updated_group = repos.channel_groups.update(g_oid, update_fields)
+    if not updated_group:
+        return jsonify({"msg": "Channel group not found"}), 404
+    return model_response(ChannelGroupInDB.model_validate(updated_group))
 
 @channel_groups_bp.route('/<string:group_id>', methods=['DELETE'])
 @jwt_required()
+@round_trip_budget(1)
 def delete_channel_group(group_id):
     try:
         g_oid = ObjectId(group_id)
     except Exception:
         return jsonify({"msg": "Invalid group ID format"}), 400
 
-    result = mongo.db.channel_groups.delete_one({"_id": g_oid})
-    if result.deleted_count == 1:
+    if repos.channel_groups.delete(g_oid, projection={"_id": 1}):
         return jsonify({"msg": "Channel group deleted successfully"}), 200
     else:
         return jsonify({"msg": "Channel group not found or failed to delete"}), 404 # Or 500
 
 @channel_groups_bp.route('/<string:group_id>/click', methods=['POST'])
-# This could be public or require some form of light authentication/rate limiting in production
+@rate_limit('engagement')
+@round_trip_budget(2)
 def increment_channel_group_click(group_id):
     try:
         g_oid = ObjectId(group_id)
     except Exception:
         return jsonify({"msg": "Invalid group ID format"}), 400
 
-    result = mongo.db.channel_groups.update_one({"_id": g_oid}, {"$inc": {"clicks": 1}})
-    if result.matched_count:
-        return jsonify({"msg": "Click count incremented"}), 200
-    return jsonify({"msg": "Channel group not found"}), 404
\ No newline at end of file
+    found, counted = record_click(g_oid, client_key())
+    if found:
+        return jsonify({"msg": "Click count incremented", "counted": counted}), 200
+    return jsonify({"msg": "Channel group not found"}), 404
+
+@channel_groups_bp.route('/clicks', methods=['GET'])
+@jwt_required()
+@round_trip_budget(1)
+def get_channel_group_clicks():
+    """
+    Clicks per day and per group from the daily buckets.
+    Example: /api/channel_groups/clicks?from=2025-01-01&to=2025-01-31&region=English[&group_id=<id>]
+    from/to are UTC dates, inclusive; default is the last 30 days.
+    """
+    try:
+        today = datetime.datetime.utcnow()
+        end = datetime.datetime.strptime(request.args['to'], "%Y-%m-%d") if request.args.get('to') else today
+        start = (datetime.datetime.strptime(request.args['from'], "%Y-%m-%d") if request.args.get('from')
+                 else end - datetime.timedelta(days=29))
+    except ValueError:
+        return jsonify({"msg": "from/to must be dates like 2025-01-31"}), 400
+    if start > end:
+        return jsonify({"msg": "from must not be after to"}), 400
+    if (end - start).days >= current_app.config['CLICK_ANALYTICS_MAX_DAYS']:
+        return jsonify({"msg": f"At most {current_app.config['CLICK_ANALYTICS_MAX_DAYS']} days per query"}), 400
+
+    group_id = request.args.get('group_id')
+    if group_id and not ObjectId.is_valid(group_id):
+        return jsonify({"msg": "Invalid group ID format"}), 400
+    region = request.args.get('region')
+    if region and region.lower() == 'all':
+        region = None
+
+    series = click_series(start, end, region=region, group_id=ObjectId(group_id) if group_id else None)
+    return jsonify({"from": f"{start:%Y-%m-%d}", "to": f"{end:%Y-%m-%d}", **series}), 200
\ No newline at end of file
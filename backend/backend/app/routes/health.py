@@ -0,0 +1,19 @@
+# app/routes/health.py
+from flask import Blueprint, jsonify, current_app
+from app.utils.readiness import readiness
+
+health_bp = Blueprint('health', __name__)
+
+@health_bp.route('/healthz', methods=['GET'])
+def healthz():
+    # Liveness: the process serves requests; says nothing about MongoDB
+    return jsonify({"status": "ok"}), 200
+
+@health_bp.route('/readyz', methods=['GET'])
+def readyz():
+    # Readiness: last background check (MongoDB reachable, indexes present, warm-up done)
+    if current_app.config['READINESS_CHECK_INTERVAL'] <= 0:
+        state = readiness.check()
+    else:
+        state = readiness.snapshot()
+    return jsonify({"status": "ready" if state["ready"] else "not_ready", **state}), 200 if state["ready"] else 503
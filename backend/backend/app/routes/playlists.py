@@ -1,11 +1,22 @@
 from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import jwt_required
-from app import mongo
 from app.models import PlaylistCreate, PlaylistUpdate, PlaylistInDB, VideoInDB
 from app.utils.file_helpers import save_file
+from app.utils.fields import (
+    requested_fields, requested_ids, batch_payload, mongo_projection, shape_doc,
+    PLAYLIST_FIELDS, PLAYLIST_COMPUTED, PLAYLIST_SUMMARY_FIELDS,
+)
+from app.utils.http_cache import make_etag, not_modified_response, etag_response
+from app.utils.job_queue import enqueue_job
+from app.utils.related import enqueue_related_update, RELATED_FIELDS
+from app.utils.cascade import CASCADE_DELETE_PLAYLIST, remove_thumbnail_file
+from app.utils.round_trips import round_trip_budget
+from app.utils.responses import json_array_response
+from app.repositories import repos
 from pydantic import ValidationError
 from bson import ObjectId
 import datetime
+import itertools
 import os
 from flask import send_from_directory, make_response
 
@@ -63,6 +74,7 @@ def serialize_doc(doc):
         return doc
 
 @playlists_bp.route('', methods=['POST'])
+@round_trip_budget(2) # the insert and the related-update job
 def create_playlist():
     # Handle multipart form data
     if 'thumbnail' not in request.files:
@@ -89,62 +101,121 @@ def create_playlist():
     playlist_doc['created_at'] = datetime.datetime.utcnow()
     playlist_doc['updated_at'] = datetime.datetime.utcnow()
 
-    result = mongo.db.playlists.insert_one(playlist_doc)
-    created_playlist = mongo.db.playlists.find_one({"_id": result.inserted_id})
-
+    # The inserted document is what we return; no need to read it back
+    created_playlist = repos.playlists.insert(playlist_doc)
+    enqueue_related_update(created_playlist['_id'])
     created_playlist['_id'] = str(created_playlist['_id'])
     created_playlist['id'] = created_playlist['_id']
-
-    if created_playlist:
-        return jsonify(created_playlist), 201
-    else:
-        return jsonify({"msg": "Failed to create playlist"}), 500
+    return jsonify(created_playlist), 201
 
 
 @playlists_bp.route('', methods=['GET'])
+@round_trip_budget(3, per_batch=1)
 def get_playlists():
+    fields, error = requested_fields(PLAYLIST_FIELDS, default=PLAYLIST_SUMMARY_FIELDS)
+    if error:
+        return error
+
     region_filter = request.args.get('region')
-    query = {}
+    region = None
     if region_filter and region_filter.lower() != 'all':
-        query['region'] = region_filter
-
-    playlists_cursor = mongo.db.playlists.find(query).sort("created_at", -1)
-    playlists_list = []
-    for p_data in playlists_cursor:
-        p_data['_id'] = str(p_data['_id'])
-        p_data['videos_count'] = mongo.db.videos.count_documents({"playlist_id": ObjectId(p_data['_id'])})
-        playlist_summary = {
-            "id": p_data['_id'],
-            "title": p_data.get("title"),
-            "description": p_data.get("description"),
-            "keywords": p_data.get("keywords"),
-            "region": p_data.get("region"),
-            "thumbnail_url": p_data.get("thumbnail_url"),
-            "videos_count": p_data['videos_count'],
-            "created_at": p_data.get("created_at"),
-            "updated_at": p_data.get("updated_at")
-        }
-        playlists_list.append(playlist_summary)
-    return jsonify(playlists_list), 200
+        region = region_filter
+
+    # Content version of the listing: edits bump updated_at, creates/deletes change the count.
+    # Engagement only touches last_engaged_at, so views don't invalidate this.
+    version = repos.playlists.content_version(region)
+    etag = make_etag("playlists", region or 'all', version.get("count", 0), version.get("latest"), fields)
+    cached = not_modified_response(etag)
+    if cached:
+        return cached
+
+    projection = mongo_projection(fields, computed=PLAYLIST_COMPUTED)
+    batch_size = current_app.config['LIST_CURSOR_BATCH_SIZE']
+    playlist_docs = repos.playlists.list(region, projection, batch_size=batch_size)
+    if "videos_count" in fields:
+        return json_array_response(_with_videos_counts(playlist_docs, fields, batch_size), etag=etag)
+    return json_array_response((shape_doc(p_data, fields) for p_data in playlist_docs), etag=etag)
+
+
+def _with_videos_counts(playlist_docs, fields, batch_size):
+    """
+    Shapes playlists with their videos_count as they stream out of the cursor:
+    one grouped count per batch instead of a count_documents per playlist.
+    """
+    docs = iter(playlist_docs)
+    while True:
+        batch = list(itertools.islice(docs, batch_size))
+        if not batch:
+            return
+        videos_counts = repos.videos.count_by_playlist([p["_id"] for p in batch])
+        for p_data in batch:
+            yield shape_doc(p_data, fields, extra={"videos_count": videos_counts.get(p_data["_id"], 0)})
+
+
+@playlists_bp.route('/batch', methods=['GET'])
+@round_trip_budget(2)
+def get_playlists_batch():
+    """
+    Playlists by id in one $in query (plus one grouped count for videos_count):
+    /api/playlists/batch?ids=<id>,<id>[&fields=...]
+    Returns {"items": [...], "missing": [...]}, items in request order; fields as for GET /api/playlists.
+    """
+    ids, error = requested_ids()
+    if error:
+        return error
+    fields, error = requested_fields(PLAYLIST_FIELDS, default=PLAYLIST_SUMMARY_FIELDS)
+    if error:
+        return error
+
+    playlists = repos.playlists.get_many(ids, mongo_projection(fields, computed=PLAYLIST_COMPUTED))
+    extra = {}
+    if "videos_count" in fields:
+        videos_counts = repos.videos.count_by_playlist(list(playlists))
+        extra = {p_id: {"videos_count": videos_counts.get(p_id, 0)} for p_id in playlists}
+    return jsonify(batch_payload(ids, playlists, lambda p: shape_doc(p, fields, extra=extra.get(p["_id"])))), 200
 
 
 @playlists_bp.route('/<string:playlist_id>', methods=['GET'])
+@round_trip_budget(2)
 def get_playlist(playlist_id):
     try:
         p_id = ObjectId(playlist_id)
     except Exception:
         return jsonify({"msg": "Invalid playlist ID format"}), 400
-    
-    playlist_data = mongo.db.playlists.find_one({"_id": p_id})
-    
+
+    fields, error = requested_fields(PLAYLIST_FIELDS + ("videos",))
+    if error:
+        return error
+
+    projection = None
+    if fields:
+        # updated_at/last_engaged_at are always needed for the ETag
+        projection = mongo_projection(fields, computed=PLAYLIST_COMPUTED + ("videos",))
+        projection.update({"updated_at": 1, "last_engaged_at": 1})
+    playlist_data = repos.playlists.get(p_id, projection)
+
     if not playlist_data:
         return jsonify({"msg": "Playlist not found"}), 404
+
+    # The embedded videos carry view/like counts, so include the coarse engagement
+    # timestamp; counters refresh at most once per ENGAGEMENT_TOUCH_INTERVAL.
+    etag = make_etag("playlist", p_id, playlist_data.get("updated_at"), playlist_data.get("last_engaged_at"), fields)
+    cached = not_modified_response(etag)
+    if cached:
+        return cached
+
+    if fields:
+        extra = {}
+        if "videos" in fields:
+            extra["videos"] = [serialize_doc(v) for v in repos.videos.list_for_playlist(p_id)]
+        if "videos_count" in fields:
+            # Reuse the fetched videos rather than counting them again
+            extra["videos_count"] = (len(extra["videos"]) if "videos" in extra
+                                     else repos.videos.count_for_playlist(p_id))
+        return etag_response(shape_doc(playlist_data, fields, extra=extra), etag)
     
-    # Fetch associated videos for this playlist
-    videos_cursor = mongo.db.videos.find({"playlist_id": p_id})
-    
-    # Convert the cursor to a list once
-    videos_list = list(videos_cursor)
+    # Fetch associated videos for this playlist, converting the cursor to a list once
+    videos_list = list(repos.videos.list_for_playlist(p_id))
     
     # Apply serialization to the playlist data and then add videos
     # We apply it to playlist_data first, so any other ObjectIds are converted
@@ -157,10 +228,11 @@ def get_playlist(playlist_id):
 
     final_playlist_data['id'] = final_playlist_data['_id']
     
-    return jsonify(final_playlist_data), 200
+    return etag_response(final_playlist_data, etag)
 
 
 @playlists_bp.route('/<string:playlist_id>', methods=['PUT'])
+@round_trip_budget(3) # the update, the related-update job and the videos
 def update_playlist(playlist_id):
     try:
         try:
@@ -168,12 +240,6 @@ def update_playlist(playlist_id):
         except Exception:
             return jsonify({"msg": "Invalid playlist ID format"}), 400
 
-        # load existing playlist (was missing -> caused NameError)
-        existing_playlist = mongo.db.playlists.find_one({"_id": p_id})
-        if not existing_playlist:
-            current_app.logger.debug("UpdatePlaylist: playlist not found %s", playlist_id)
-            return jsonify({"msg": "Playlist not found"}), 404
-
         # Debug: log incoming request info to backend console
         current_app.logger.debug("UpdatePlaylist: method=%s, content-type=%s, headers=%s",
                                  request.method, request.headers.get("Content-Type"), dict(request.headers))
@@ -217,12 +283,6 @@ def update_playlist(playlist_id):
         if "keywords" in update_data_dict and isinstance(update_data_dict["keywords"], list):
             update_data_dict["keywords"] = ",".join(str(k) for k in update_data_dict["keywords"])
 
-        # If 'genre' is required by the model but not provided, reuse existing value from DB
-        if "genre" not in update_data_dict or update_data_dict.get("genre") in (None, ""):
-            existing_genre = existing_playlist.get("genre")
-            if existing_genre is not None:
-                update_data_dict["genre"] = existing_genre
-
         # Thumbnail handling
         thumbnail_file = files.get("thumbnail") or request.files.get("thumbnail")
         if thumbnail_file and getattr(thumbnail_file, "filename", "") != "":
@@ -243,11 +303,17 @@ def update_playlist(playlist_id):
             current_app.logger.debug("PlaylistUpdate validation errors: %s", e.errors())
             return jsonify({"msg": "Validation failed", "errors": e.errors()}), 400
 
+        # Existence check, update and read-back in one round-trip
         update_data_dict["updated_at"] = datetime.datetime.utcnow()
-        mongo.db.playlists.update_one({"_id": p_id}, {"$set": update_data_dict})
+        updated_playlist = repos.playlists.update(p_id, update_data_dict)
+        if not updated_playlist:
+            current_app.logger.debug("UpdatePlaylist: playlist not found %s", playlist_id)
+            remove_thumbnail_file(update_data_dict.get("thumbnail_url"))
+            return jsonify({"msg": "Playlist not found"}), 404
+        if any(field in update_data_dict for field in RELATED_FIELDS):
+            enqueue_related_update(p_id)
 
-        updated_playlist = mongo.db.playlists.find_one({"_id": p_id})
-        videos_cursor = mongo.db.videos.find({"playlist_id": p_id})
+        videos_cursor = repos.videos.list_for_playlist(p_id)
         videos_list = []
         try:
             # Prefer simple serialization to avoid pydantic parsing errors on partial docs
@@ -271,37 +337,27 @@ def update_playlist(playlist_id):
 
 
 @playlists_bp.route('/<string:playlist_id>', methods=['DELETE'])
+@round_trip_budget(2)
 def delete_playlist(playlist_id):
     try:
         p_id = ObjectId(playlist_id)
     except Exception:
         return jsonify({"msg": "Invalid playlist ID format"}), 400
 
-    playlist_to_delete = mongo.db.playlists.find_one({"_id": p_id})
+    playlist_to_delete = repos.playlists.delete(p_id, projection={"thumbnail_url": 1})
     if not playlist_to_delete:
         return jsonify({"msg": "Playlist not found"}), 404
 
-    # Optional: Delete associated thumbnail from filesystem
-    thumbnail_url = playlist_to_delete.get('thumbnail_url')
-    if thumbnail_url:
-        try:
-            filename = os.path.basename(thumbnail_url)
-            subfolder = "playlists"
-            file_path = os.path.join(current_app.config['UPLOAD_FOLDER_THUMBNAILS'], subfolder, filename)
-            if os.path.exists(file_path):
-                os.remove(file_path)
-        except Exception as e:
-            print(f"Error deleting thumbnail file {thumbnail_url}: {e}")
-
-    mongo.db.videos.delete_many({"playlist_id": p_id})
-    result = mongo.db.playlists.delete_one({"_id": p_id})
-    if result.deleted_count == 1:
-        return jsonify({"msg": "Playlist and associated videos deleted successfully"}), 200
-    else:
-        return jsonify({"msg": "Failed to delete playlist"}), 500
+    # Videos, their ads/subtitles and the thumbnail are removed by a background job
+    job_id = enqueue_job(CASCADE_DELETE_PLAYLIST, {
+        "playlist_id": str(p_id),
+        "thumbnail_url": playlist_to_delete.get('thumbnail_url'),
+    })
+    return jsonify({"msg": "Playlist deleted, associated videos are being cleaned up", "job_id": str(job_id)}), 202
 
 
 @playlists_bp.route('/<string:playlist_id>/thumbnail', methods=['POST'])
+@round_trip_budget(2) # the update and the related-update job
 def upload_playlist_thumbnail(playlist_id):
     try:
         try:
@@ -309,10 +365,6 @@ def upload_playlist_thumbnail(playlist_id):
         except Exception:
             return jsonify({"msg": "Invalid playlist ID format"}), 400
 
-        playlist = mongo.db.playlists.find_one({"_id": p_id})
-        if not playlist:
-            return jsonify({"msg": "Playlist not found"}), 404
-
         if 'thumbnail' not in request.files:
             return jsonify({"msg": "Missing thumbnail file"}), 400
 
@@ -326,12 +378,14 @@ def upload_playlist_thumbnail(playlist_id):
             current_app.logger.exception("Failed to save playlist thumbnail: %s", error)
             return jsonify({"msg": "Failed to save thumbnail", "details": error}), 500
 
-        mongo.db.playlists.update_one(
-            {"_id": p_id},
-            {"$set": {"thumbnail_url": new_thumbnail_url, "updated_at": datetime.datetime.utcnow()}}
+        updated = repos.playlists.update(
+            p_id, {"thumbnail_url": new_thumbnail_url, "updated_at": datetime.datetime.utcnow()}
         )
+        if not updated:
+            remove_thumbnail_file(new_thumbnail_url)
+            return jsonify({"msg": "Playlist not found"}), 404
+        enqueue_related_update(p_id) # related entries carry the thumbnail
 
-        updated = mongo.db.playlists.find_one({"_id": p_id})
         # minimal safe serialization
         updated['id'] = str(updated.get('_id'))
         if '_id' in updated:
@@ -1,6 +1,17 @@
-from flask import Blueprint, request, jsonify
-from app import mongo
-from app.models import PlaylistInDB, VideoInDB, ChannelGroupInDB, PyObjectId
+from flask import Blueprint, request, jsonify, current_app
+from app.utils.rate_limit import rate_limit, client_key
+from app.utils.click_analytics import record_click
+from app.utils.fields import (
+    requested_fields, mongo_projection, shape_doc,
+    PUBLIC_PLAYLIST_FIELDS, PUBLIC_VIDEO_FIELDS, PUBLIC_CHANNEL_GROUP_FIELDS,
+)
+from app.models import PlaylistInDB, VideoInDB, ChannelGroupInDB, VideoListAdapter, ProgressUpdate
+from app.utils.responses import model_response, models_response, json_array_response, json_body_response
+from app.utils.ad_index import ad_index, PLACEMENTS
+from app.utils.http_cache import make_etag, not_modified_response, with_etag
+from app.utils.round_trips import round_trip_budget
+from app.utils.progress import progress_buffer, progress_payload, valid_device_id
+from app.repositories import repos
 from pymongo.errors import PyMongoError
 from pydantic import ValidationError
 from bson import ObjectId
@@ -10,25 +21,33 @@ public_data_bp = Blueprint('public_data', __name__)
 @public_data_bp.route('/playlists', methods=['GET'])
 def get_public_playlists():
     """ Publicly accessible basic list of playlists """
-    playlists = []
-    cursor = mongo.db.playlists.find(
-        {},
-        {"_id": 1, "title": 1, "description": 1, "thumbnail_url": 1, "region": 1}
+    fields, error = requested_fields(PUBLIC_PLAYLIST_FIELDS)
+    if error:
+        return error
+    batch_size = current_app.config['LIST_CURSOR_BATCH_SIZE']
+    if fields:
+        cursor = repos.playlists.list(projection=mongo_projection(fields), sort=None, batch_size=batch_size)
+        return json_array_response(shape_doc(p, fields) for p in cursor)
+
+    cursor = repos.playlists.list(
+        projection={"_id": 1, "title": 1, "description": 1, "thumbnail_url": 1, "region": 1},
+        sort=None, batch_size=batch_size
     )
+    return json_array_response(_public_playlist_summaries(cursor))
+
+def _public_playlist_summaries(cursor):
     for playlist_doc in cursor:
         try:
             # Serialize just the few public fields
-            doc = {
+            yield {
                 "id": str(playlist_doc["_id"]),
                 "title": playlist_doc.get("title", ""),
                 "description": playlist_doc.get("description", ""),
                 "thumbnail_url": playlist_doc.get("thumbnail_url", ""),
                 "region": playlist_doc.get("region", ""),
             }
-            playlists.append(doc)
         except Exception as e:
             print(f"Error validating public playlist {playlist_doc.get('_id')}: {e}")
-    return jsonify(playlists), 200
 
 @public_data_bp.route('/playlists/<string:playlist_id>/videos', methods=['GET'])
 def get_public_playlist_videos(playlist_id):
@@ -37,51 +56,227 @@ def get_public_playlist_videos(playlist_id):
 
     playlist_obj_id = ObjectId(playlist_id)
 
+    fields, error = requested_fields(PUBLIC_VIDEO_FIELDS)
+    if error:
+        return error
+
     # Query videos collection by playlist_id (not embedded)
-    video_cursor = mongo.db.videos.find({"playlist_id": playlist_obj_id})
+    video_cursor = repos.videos.list_for_playlist(playlist_obj_id, mongo_projection(fields) if fields else None)
     videos = []
     for video_doc in video_cursor:
+        if fields:
+            videos.append(shape_doc(video_doc, fields))
+            continue
         try:
-            video_dict = VideoInDB.parse_obj(video_doc).dict(by_alias=True)
-            # Optionally exclude fields for public
-            video_dict.pop('playlist_id', None)
-            videos.append(video_dict)
+            videos.append(VideoInDB.model_validate(video_doc))
         except ValidationError as e:
             print(f"Error validating public video {video_doc.get('_id')}: {e}")
     if not videos:
         # Check if playlist even exists, else send accurate error
-        playlist = mongo.db.playlists.find_one({"_id": playlist_obj_id})
-        if not playlist:
+        if not repos.playlists.exists(playlist_obj_id):
             return jsonify({"message": "Playlist not found"}), 404
         return jsonify({"message": "Playlist has no videos"}), 404
 
-    return jsonify(videos), 200
+    if fields:
+        return jsonify(videos), 200
+    # playlist_id is left out of the public payload
+    return models_response(VideoListAdapter, videos, exclude={'playlist_id'})
+
+@public_data_bp.route('/playlists/<string:playlist_id>/related', methods=['GET'])
+@round_trip_budget(1)
+def get_public_related_playlists(playlist_id):
+    """
+    Related series, precomputed by app/utils/related.py: one read by _id.
+    A playlist whose list isn't built yet (new, or the job is pending) gets [].
+    """
+    if not ObjectId.is_valid(playlist_id):
+        return jsonify({"message": "Invalid Playlist ID"}), 400
+
+    doc = repos.related.get(ObjectId(playlist_id), {"related": 1})
+    return jsonify([{
+        "id": str(r["_id"]),
+        "title": r.get("title", ""),
+        "thumbnail_url": r.get("thumbnail_url", ""),
+        "region": r.get("region", ""),
+        "score": r.get("score", 0),
+    } for r in (doc or {}).get("related", [])]), 200
 
 @public_data_bp.route('/videos/<string:video_id>', methods=['GET'])
 def get_public_video(video_id):
     if not ObjectId.is_valid(video_id):
         return jsonify({"message": "Invalid Video ID"}), 400
 
-    video_doc = mongo.db.videos.find_one({"_id": ObjectId(video_id)})
+    fields, error = requested_fields(PUBLIC_VIDEO_FIELDS)
+    if error:
+        return error
+
+    video_doc = repos.videos.get(ObjectId(video_id), mongo_projection(fields) if fields else None)
     if not video_doc:
         return jsonify({"message": "Video not found"}), 404
 
     try:
         # Increment views on access
-        mongo.db.videos.update_one({"_id": ObjectId(video_id)}, {"$inc": {"views": 1}})
-        video_dict = VideoInDB.parse_obj(video_doc).dict(by_alias=True)
-        video_dict.pop("playlist_id", None)
-        return jsonify(video_dict), 200
+        repos.videos.increment(ObjectId(video_id), "views", {"_id": 1})
+        if fields:
+            return jsonify(shape_doc(video_doc, fields)), 200
+        return model_response(VideoInDB.model_validate(video_doc), exclude={'playlist_id'})
     except ValidationError as e:
-        return jsonify({"message": "Validation Error", "details": e.errors()}), 500
+        return jsonify({"message": "Validation Error", "details": e.errors(include_context=False)}), 500
     except PyMongoError as e:
         return jsonify({"message": f"Database error: {str(e)}"}), 500
 
+@public_data_bp.route('/videos/<string:video_id>/ads', methods=['GET'])
+def get_public_video_ads(video_id):
+    """
+    Pre-roll/post-roll ads for a video, answered from the in-process ad index
+    (no database read): {"before": [{"id", "ad_file_url"}, ...], "after": [...]}.
+    ?placement=before|after returns just that list.
+    """
+    if not ObjectId.is_valid(video_id):
+        return jsonify({"message": "Invalid Video ID"}), 400
+
+    placement = request.args.get('placement')
+    if placement is None:
+        return json_body_response(ad_index.payload(video_id))
+    if placement not in PLACEMENTS:
+        return jsonify({"message": 'placement must be "before" or "after"'}), 400
+    return jsonify(ad_index.select(video_id, placement)), 200
+
+@public_data_bp.route('/videos/<string:video_id>/manifest', methods=['GET'])
+@round_trip_budget(2) # the aggregation, plus the ad index's occasional reload
+def get_public_video_manifest(video_id):
+    """
+    Everything the player needs to start a video, in one request and one
+    aggregation: the video, its subtitles, its playlist with the episode list
+    (oldest first, by created_at then _id) and the next episode. The
+    ads come from the in-process ad index. Read-only, so views are still
+    counted with POST /api/videos/<id>/view. ETag'd, so a revalidation with
+    If-None-Match gets a 304.
+    """
+    if not ObjectId.is_valid(video_id):
+        return jsonify({"message": "Invalid Video ID"}), 400
+
+    video_doc = repos.videos.manifest(ObjectId(video_id))
+    if not video_doc:
+        return jsonify({"message": "Video not found"}), 404
+
+    playlist_doc = video_doc.pop("playlist")
+    episode_docs = video_doc.pop("episodes")
+    ads = {placement: ad_index.select(video_id, placement) for placement in PLACEMENTS}
+
+    etag = make_etag(
+        video_id, video_doc.get("updated_at"), video_doc.get("views"), video_doc.get("likes"),
+        playlist_doc and playlist_doc.get("updated_at"), len(episode_docs), ads,
+    )
+    cached = not_modified_response(etag)
+    if cached:
+        return cached
+
+    try:
+        video = VideoInDB.model_validate(video_doc)
+    except ValidationError as e:
+        return jsonify({"message": "Validation Error", "details": e.errors(include_context=False)}), 500
+
+    episodes = [{"id": str(e["_id"]), "title": e.get("title", ""), "video_link": e.get("video_link", "")}
+                for e in episode_docs]
+    position = next((i for i, e in enumerate(episodes) if e["id"] == video_id), None)
+    next_episode = episodes[position + 1] if position is not None and position + 1 < len(episodes) else None
+
+    manifest = {
+        "video": video.model_dump(mode='json', by_alias=True, exclude={'playlist_id'}),
+        "subtitles": {"subtitle_url": video_doc["subtitle_url"]} if video_doc.get("subtitle_url") else None,
+        "ads": ads,
+        "playlist": {
+            "id": str(playlist_doc["_id"]),
+            "title": playlist_doc.get("title", ""),
+            "region": playlist_doc.get("region", ""),
+            "thumbnail_url": playlist_doc.get("thumbnail_url", ""),
+        } if playlist_doc else None,
+        "episodes": episodes,
+        "next_episode": next_episode,
+    }
+    return with_etag(jsonify(manifest), etag)
+
+@public_data_bp.route('/progress/<string:device_id>/videos/<string:video_id>', methods=['PUT'])
+@rate_limit('engagement')
+@round_trip_budget(1) # only when the report finishes the episode (or the buffer is full)
+def put_playback_progress(device_id, video_id):
+    """
+    Reports the player's position: {"position": seconds, "duration"?: seconds, "completed"?: bool}.
+    Rate limited like the other engagement writes, so players should report
+    every few seconds rather than on every timeupdate. Positions are buffered
+    and written in batches, see app/utils/progress.py.
+    """
+    if not valid_device_id(device_id):
+        return jsonify({"message": "Invalid Device ID"}), 400
+    if not ObjectId.is_valid(video_id):
+        return jsonify({"message": "Invalid Video ID"}), 400
+    try:
+        update = ProgressUpdate.model_validate(request.get_json(silent=True) or {})
+    except ValidationError as e:
+        return jsonify(e.errors(include_context=False)), 400
+
+    try:
+        record = progress_buffer.record(device_id, ObjectId(video_id), update)
+    except PyMongoError as e:
+        return jsonify({"message": f"Database error: {str(e)}"}), 500
+    return jsonify(progress_payload(record)), 200
+
+@public_data_bp.route('/progress/<string:device_id>/videos/<string:video_id>', methods=['GET'])
+@round_trip_budget(1)
+def get_playback_progress(device_id, video_id):
+    """Where to resume a video on this device (404 if it was never started)."""
+    if not valid_device_id(device_id):
+        return jsonify({"message": "Invalid Device ID"}), 400
+    if not ObjectId.is_valid(video_id):
+        return jsonify({"message": "Invalid Video ID"}), 400
+
+    record = progress_buffer.get(device_id, ObjectId(video_id))
+    if record is None:
+        return jsonify({"message": "No progress for this video"}), 404
+    return jsonify(progress_payload(record)), 200
+
+@public_data_bp.route('/progress/<string:device_id>/continue-watching', methods=['GET'])
+@round_trip_budget(2)
+def get_continue_watching(device_id):
+    """
+    The device's most recently watched unfinished videos, newest first
+    (?limit=, default CONTINUE_WATCHING_LIMIT). Videos deleted since are left out.
+    """
+    if not valid_device_id(device_id):
+        return jsonify({"message": "Invalid Device ID"}), 400
+    config = current_app.config
+    try:
+        limit = int(request.args.get('limit', config['CONTINUE_WATCHING_LIMIT']))
+    except ValueError:
+        return jsonify({"message": "limit must be an integer"}), 400
+    limit = max(1, min(limit, config['CONTINUE_WATCHING_MAX_LIMIT']))
+
+    records = progress_buffer.continue_watching(device_id, limit)
+    videos = repos.videos.get_many([r["video_id"] for r in records], {"title": 1, "playlist_id": 1}) if records else {}
+    items = []
+    for record in records:
+        video = videos.get(record["video_id"])
+        if video is None:
+            continue
+        item = progress_payload(record)
+        item["title"] = video.get("title", "")
+        item["playlist_id"] = str(video["playlist_id"]) if video.get("playlist_id") else None
+        items.append(item)
+    return jsonify(items), 200
+
 @public_data_bp.route('/channel_groups', methods=['GET'])
 def get_public_channel_groups():
     """ Publicly accessible channel groups (links) """
+    fields, error = requested_fields(PUBLIC_CHANNEL_GROUP_FIELDS)
+    if error:
+        return error
+    if fields:
+        cg_cursor = repos.channel_groups.list(projection=mongo_projection(fields), sort=None)
+        return jsonify([shape_doc(cg, fields) for cg in cg_cursor]), 200
+
     channel_groups = []
-    cg_cursor = mongo.db.channel_groups.find({}, {"_id": 1, "region": 1, "type": 1, "link": 1})
+    cg_cursor = repos.channel_groups.list(projection={"_id": 1, "region": 1, "type": 1, "link": 1}, sort=None)
     for cg_doc in cg_cursor:
         try:
             cg_data = {
@@ -96,18 +291,16 @@ def get_public_channel_groups():
     return jsonify(channel_groups), 200
 
 @public_data_bp.route('/channel_groups/<string:cg_id>/click', methods=['POST'])
+@rate_limit('engagement')
 def public_channel_group_click(cg_id):
     # This endpoint is to track clicks on public channel group links
     if not ObjectId.is_valid(cg_id):
         return jsonify({"message": "Invalid Channel Group ID"}), 400
 
     try:
-        result = mongo.db.channel_groups.update_one(
-            {"_id": ObjectId(cg_id)},
-            {"$inc": {"clicks": 1}}
-        )
-        if result.modified_count == 0:
+        found, counted = record_click(ObjectId(cg_id), client_key())
+        if not found:
             return jsonify({"message": "Channel Group not found"}), 404
-        return jsonify({"message": "Click tracked"}), 200
+        return jsonify({"message": "Click tracked", "counted": counted}), 200
     except PyMongoError as e:
         return jsonify({"message": f"Database error: {str(e)}"}), 500
\ No newline at end of file
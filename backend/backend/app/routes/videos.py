@@ -1,34 +1,46 @@
 # app/routes/videos.py
 from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import jwt_required
-from app import mongo
 from app.models import VideoCreate, VideoUpdate, VideoInDB, PyObjectId
-from pydantic import ValidationError, parse_obj_as
+from app.utils.job_queue import enqueue_job
+from app.utils.cascade import CASCADE_DELETE_VIDEO
+from app.utils.rate_limit import rate_limit
+from app.utils.fields import (
+    requested_fields, requested_ids, batch_payload, mongo_projection, shape_doc, VIDEO_FIELDS, VIDEO_SUMMARY_FIELDS,
+)
+from app.utils.round_trips import round_trip_budget
+from app.repositories import repos
+from app.utils.responses import model_response, json_array_response
+from pydantic import ValidationError
 from bson import ObjectId
 import datetime
 import os
-try:
-    import pysubs2  # pip install pysubs2
-    _HAS_PYSUBS2 = True
-except Exception:
-    import re
-    _HAS_PYSUBS2 = False
-
-    def _convert_srt_to_vtt(srt_path, vtt_path):
-        with open(srt_path, "r", encoding="utf-8", errors="ignore") as f:
-            s = f.read().replace("\r\n", "\n")
-        # convert timestamps 00:00:00,000 -> 00:00:00.000
-        s = re.sub(r"(\d+:\d+:\d+),(\d+)", r"\1.\2", s)
-        # prepend WEBVTT header
-        vtt = "WEBVTT\n\n" + s.strip() + "\n"
-        with open(vtt_path, "w", encoding="utf-8") as f:
-            f.write(vtt)
-
+import re
 from werkzeug.utils import secure_filename
 
+
+def _convert_srt_to_vtt(srt_path, vtt_path):
+    """Converts with pysubs2 when it is installed (imported on first use), else with a regex."""
+    try:
+        import pysubs2  # pip install pysubs2
+    except ImportError:
+        pysubs2 = None
+    if pysubs2 is not None:
+        pysubs2.load(srt_path).save(vtt_path, format_="vtt")
+        return
+    with open(srt_path, "r", encoding="utf-8", errors="ignore") as f:
+        s = f.read().replace("\r\n", "\n")
+    # convert timestamps 00:00:00,000 -> 00:00:00.000
+    s = re.sub(r"(\d+:\d+:\d+),(\d+)", r"\1.\2", s)
+    # prepend WEBVTT header
+    vtt = "WEBVTT\n\n" + s.strip() + "\n"
+    with open(vtt_path, "w", encoding="utf-8") as f:
+        f.write(vtt)
+
 videos_bp = Blueprint('videos', __name__)
 
 @videos_bp.route('', methods=['POST'])
+@round_trip_budget(2)
 def add_video_to_playlist():
     try:
         data = request.get_json()
@@ -39,15 +51,13 @@ def add_video_to_playlist():
         
         playlist_oid = ObjectId(playlist_id_str)
 
-        # Check if playlist exists
-        playlist = mongo.db.playlists.find_one({"_id": playlist_oid})
+        # Check the playlist exists and bump its updated_at in the same round-trip
+        playlist = repos.playlists.touch(playlist_oid, projection={"region": 1})
         if not playlist:
             return jsonify({"msg": "Playlist not found"}), 404
 
         video_data = data # Pydantic validation
 
-        print(type(video_data))
-    
     except ValidationError as e:
         return jsonify(e.errors()), 400
     except Exception as e: # Catches invalid ObjectId format too
@@ -61,48 +71,44 @@ def add_video_to_playlist():
     video_doc['created_at'] = datetime.datetime.utcnow()
     video_doc['updated_at'] = datetime.datetime.utcnow()
 
-    result = mongo.db.videos.insert_one(video_doc)
-    created_video = mongo.db.videos.find_one({"_id": result.inserted_id})
-
-    if created_video:
-        created_video['_id'] = str(created_video['_id'])
-        created_video['playlist_id'] = str(created_video['playlist_id'])
-        # Also update the playlist's updated_at timestamp
-        mongo.db.playlists.update_one(
-            {"_id": playlist_oid},
-            {"$set": {"updated_at": datetime.datetime.utcnow()}}
-        )
-        return jsonify(created_video), 201
-    else:
-        return jsonify({"msg": "Failed to add video"}), 500
+    created_video = repos.videos.insert(video_doc)
+    created_video['_id'] = str(created_video['_id'])
+    created_video['playlist_id'] = str(created_video['playlist_id'])
+    return jsonify(created_video), 201
 
 
 @videos_bp.route('', methods=['GET'])
 def get_videos():
+    fields, error = requested_fields(VIDEO_FIELDS, default=VIDEO_SUMMARY_FIELDS)
+    if error:
+        return error
+
     playlist_id = request.args.get('playlist_id')
-    query = {}
-    if playlist_id:
-        query['playlist_id'] = ObjectId(playlist_id)
 
-    videos_cursor = mongo.db.videos.find(query).sort("created_at", -1)
-    videos_list = []
-    for v_data in videos_cursor:
-        v_data['_id'] = str(v_data['_id'])
-        video_summary = {
-            "id": v_data['_id'],
-            "title": v_data.get("title"),
-            "description": v_data.get("description"),
-            "thumbnail_url": v_data.get("thumbnail_url"),
-            # include playable link(s)
-            "video_link": v_data.get("video_link"),
-            "embed_url": v_data.get("embed_url"),
-            "playlist_id": str(v_data.get("playlist_id")),
-            "rating": v_data.get("rating"),
-        }
-        videos_list.append(video_summary)
+    videos_cursor = repos.videos.list(
+        ObjectId(playlist_id) if playlist_id else None,
+        mongo_projection(fields),
+        batch_size=current_app.config['LIST_CURSOR_BATCH_SIZE'],
+    )
+    return json_array_response(shape_doc(v_data, fields) for v_data in videos_cursor)
+
 
-    return jsonify(videos_list), 200
+@videos_bp.route('/batch', methods=['GET'])
+@round_trip_budget(1)
+def get_videos_batch():
+    """
+    Videos by id in one $in query: /api/videos/batch?ids=<id>,<id>[&fields=...]
+    Returns {"items": [...], "missing": [...]}, items in request order; fields as for GET /api/videos.
+    """
+    ids, error = requested_ids()
+    if error:
+        return error
+    fields, error = requested_fields(VIDEO_FIELDS, default=VIDEO_SUMMARY_FIELDS)
+    if error:
+        return error
 
+    videos = repos.videos.get_many(ids, mongo_projection(fields))
+    return jsonify(batch_payload(ids, videos, lambda v: shape_doc(v, fields))), 200
 
 
 @videos_bp.route('/<string:video_id>', methods=['GET'])
@@ -112,95 +118,103 @@ def get_video(video_id):
     except Exception:
         return jsonify({"msg": "Invalid video ID format"}), 400
 
-    video = mongo.db.videos.find_one({"_id": v_id})
+    fields, error = requested_fields(VIDEO_FIELDS)
+    if error:
+        return error
+
+    video = repos.videos.get(v_id, mongo_projection(fields) if fields else None)
     if not video:
         return jsonify({"msg": "Video not found"}), 404
-    return jsonify(VideoInDB.parse_obj(video).dict(by_alias=True)), 200
+    if fields:
+        return jsonify(shape_doc(video, fields)), 200
+    return model_response(VideoInDB.model_validate(video))
 
 
 @videos_bp.route('/<string:video_id>', methods=['PUT'])
+@round_trip_budget(2)
 def update_video(video_id):
     try:
         v_id = ObjectId(video_id)
-        video_data = VideoUpdate(**request.json) # Pydantic validation
+        video_data = VideoUpdate.model_validate(request.json) # Pydantic validation
     except ValidationError as e:
-        return jsonify(e.errors()), 400
+        return jsonify(e.errors(include_context=False)), 400
     except Exception:
         return jsonify({"msg": "Invalid video ID format or data"}), 400
 
-    if not mongo.db.videos.find_one({"_id": v_id}):
-        return jsonify({"msg": "Video not found"}), 404
-
-    update_fields = video_data.dict(exclude_unset=True)
+    # mode='json' stores URLs as plain strings
+    update_fields = video_data.model_dump(mode='json', exclude_unset=True)
     if not update_fields:
         return jsonify({"msg": "No fields to update"}), 400
     
     update_fields['updated_at'] = datetime.datetime.utcnow()
 
-    mongo.db.videos.update_one({"_id": v_id}, {"$set": update_fields})
-    
-    updated_video = mongo.db.videos.find_one({"_id": v_id})
+    updated_video = repos.videos.update(v_id, update_fields)
+    if not updated_video:
+        return jsonify({"msg": "Video not found"}), 404
 
     # If playlist_id is part of update_fields and it changed, update old/new playlist's updated_at
     # This logic can be complex if videos can move between playlists.
     # For now, assuming playlist_id is not changed via this endpoint or handled carefully.
     
     # Update the associated playlist's updated_at timestamp
-    if updated_video and updated_video.get('playlist_id'):
-        mongo.db.playlists.update_one(
-            {"_id": ObjectId(updated_video['playlist_id'])},
-            {"$set": {"updated_at": datetime.datetime.utcnow()}}
-        )
+    if updated_video.get('playlist_id'):
+        repos.playlists.touch(ObjectId(updated_video['playlist_id']), projection={"_id": 1})
 
-    return jsonify(VideoInDB.parse_obj(updated_video).dict(by_alias=True)), 200
+    return model_response(VideoInDB.model_validate(updated_video))
 
 
 @videos_bp.route('/<string:video_id>', methods=['DELETE'])
+@round_trip_budget(3)
 def delete_video(video_id):
     try:
         v_id = ObjectId(video_id)
     except Exception:
         return jsonify({"msg": "Invalid video ID format"}), 400
 
-    video_to_delete = mongo.db.videos.find_one({"_id": v_id})
+    video_to_delete = repos.videos.delete(v_id, projection={"playlist_id": 1, "subtitle_url": 1})
     if not video_to_delete:
         return jsonify({"msg": "Video not found"}), 404
 
+    # The video's ads and subtitle file are removed by a background job
+    enqueue_job(CASCADE_DELETE_VIDEO, {
+        "video_id": str(v_id),
+        "subtitle_url": video_to_delete.get('subtitle_url'),
+    })
+    # Update the associated playlist's updated_at timestamp
     playlist_id = video_to_delete.get('playlist_id')
-
-    result = mongo.db.videos.delete_one({"_id": v_id})
-    if result.deleted_count == 1:
-        # Update the associated playlist's updated_at timestamp
-        if playlist_id:
-            mongo.db.playlists.update_one(
-                {"_id": ObjectId(playlist_id)},
-                {"$set": {"updated_at": datetime.datetime.utcnow()}}
-            )
-        return jsonify({"msg": "Video deleted successfully"}), 200
-    else:
-        return jsonify({"msg": "Failed to delete video"}), 500
+    if playlist_id:
+        repos.playlists.touch(ObjectId(playlist_id), projection={"_id": 1})
+    return jsonify({"msg": "Video deleted successfully"}), 200
 
 # --- Simple View and Like Incrementors ---
+def _touch_playlist_engagement(playlist_id):
+    """
+    Records engagement on the playlist in `last_engaged_at`, at most once per
+    ENGAGEMENT_TOUCH_INTERVAL. `updated_at` is left alone so it only changes on
+    content edits and stays usable for caching/ETags.
+    """
+    if not playlist_id:
+        return
+    repos.playlists.touch_engagement(ObjectId(playlist_id), current_app.config['ENGAGEMENT_TOUCH_INTERVAL'])
+
 @videos_bp.route('/<string:video_id>/view', methods=['POST'])
+@rate_limit('engagement')
+@round_trip_budget(2)
 def increment_view(video_id):
     try:
         v_id = ObjectId(video_id)
     except Exception:
         return jsonify({"msg": "Invalid video ID format"}), 400
 
-    result = mongo.db.videos.update_one({"_id": v_id}, {"$inc": {"views": 1}})
-    if result.matched_count:
-        # Update the associated playlist's updated_at as engagement metric changed
-        video = mongo.db.videos.find_one({"_id": v_id})
-        if video and video.get('playlist_id'):
-            mongo.db.playlists.update_one(
-                {"_id": ObjectId(video['playlist_id'])},
-                {"$set": {"updated_at": datetime.datetime.utcnow()}} # Or a specific engagement_updated_at
-            )
+    video = repos.videos.increment(v_id, "views")
+    if video:
+        _touch_playlist_engagement(video.get('playlist_id'))
         return jsonify({"msg": "View count incremented"}), 200
     return jsonify({"msg": "Video not found"}), 404
 
 @videos_bp.route('/<string:video_id>/like', methods=['POST'])
+@rate_limit('engagement')
+@round_trip_budget(2)
 # @jwt_required() # Optional: if only logged-in users can like
 def increment_like(video_id):
     try:
@@ -208,20 +222,15 @@ def increment_like(video_id):
     except Exception:
         return jsonify({"msg": "Invalid video ID format"}), 400
 
-    result = mongo.db.videos.update_one({"_id": v_id}, {"$inc": {"likes": 1}})
-    if result.matched_count:
-        # Update the associated playlist's updated_at
-        video = mongo.db.videos.find_one({"_id": v_id})
-        if video and video.get('playlist_id'):
-            mongo.db.playlists.update_one(
-                {"_id": ObjectId(video['playlist_id'])},
-                {"$set": {"updated_at": datetime.datetime.utcnow()}}
-            )
+    video = repos.videos.increment(v_id, "likes")
+    if video:
+        _touch_playlist_engagement(video.get('playlist_id'))
         return jsonify({"msg": "Like count incremented"}), 200
     return jsonify({"msg": "Video not found"}), 404
 
 
 @videos_bp.route("/<video_id>/subtitles", methods=["POST"])
+@round_trip_budget(2)
 def upload_subtitles(video_id):
     try:
         if "subtitle" not in request.files:
@@ -238,19 +247,11 @@ def upload_subtitles(video_id):
             # save temp, convert to .vtt
             tmp_path = os.path.join(upload_dir, filename)
             f.save(tmp_path)
-            if _HAS_PYSUBS2:
-                subs = pysubs2.load(tmp_path)
-                vtt_name = os.path.splitext(filename)[0] + ".vtt"
-                vtt_path = os.path.join(upload_dir, vtt_name)
-                subs.save(vtt_path, format_="vtt")
-                os.remove(tmp_path)
-                saved_name = vtt_name
-            else:
-                vtt_name = os.path.splitext(filename)[0] + ".vtt"
-                vtt_path = os.path.join(upload_dir, vtt_name)
-                _convert_srt_to_vtt(tmp_path, vtt_path)
-                os.remove(tmp_path)
-                saved_name = vtt_name
+            vtt_name = os.path.splitext(filename)[0] + ".vtt"
+            vtt_path = os.path.join(upload_dir, vtt_name)
+            _convert_srt_to_vtt(tmp_path, vtt_path)
+            os.remove(tmp_path)
+            saved_name = vtt_name
         elif ext == ".vtt":
             saved_name = secure_filename(filename)
             f.save(os.path.join(upload_dir, saved_name))
@@ -260,7 +261,13 @@ def upload_subtitles(video_id):
         subtitle_url = f"/static/subtitles/{saved_name}"
 
         # update video document with subtitle_url (adjust collection/field names)
-        mongo.db.videos.update_one({"_id": ObjectId(video_id)}, {"$set": {"subtitle_url": subtitle_url}})
+        now = datetime.datetime.utcnow()
+        video = repos.videos.update(
+            ObjectId(video_id), {"subtitle_url": subtitle_url, "updated_at": now}, projection={"playlist_id": 1}
+        )
+        # Subtitles are part of the playlist's content, so bump its version too
+        if video and video.get('playlist_id'):
+            repos.playlists.touch(ObjectId(video['playlist_id']), projection={"_id": 1})
 
         return jsonify({"subtitle_url": subtitle_url}), 200
 
@@ -275,7 +282,7 @@ def get_subtitles(video_id):
     except Exception:
         return jsonify({"msg": "Invalid video ID format"}), 400
 
-    video = mongo.db.videos.find_one({"_id": v_id})
+    video = repos.videos.get(v_id)
     if not video:
         return jsonify({"msg": "Video not found"}), 404
 
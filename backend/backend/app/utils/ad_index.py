@@ -0,0 +1,153 @@
+# app/utils/ad_index.py
+"""
+In-process index of ad placements, for picking pre-/post-roll ads at playback.
+
+Maps video_id -> {"before": (...), "after": (...)} of compact ad records
+({"id", "ad_file_url"}, oldest first) and keeps each video's JSON payload
+encoded once, so a lookup is a dict read. The routes that create and delete
+ads update the index of their own worker directly. Other workers learn about
+changes from the invalidation bus. While change streams aren't live, the index
+is rebuilt from the collection every AD_INDEX_FALLBACK_TTL seconds.
+"""
+import json
+import threading
+import time
+
+from flask import current_app
+
+from app.repositories import repos
+from app.utils.invalidation import invalidation_bus
+
+PLACEMENTS = ("before", "after")
+_AD_PROJECTION = {"target_video_id": 1, "placement": 1, "ad_file_url": 1, "created_at": 1}
+_EMPTY = json.dumps({placement: [] for placement in PLACEMENTS})
+
+
+def _record(ad):
+    return {"id": str(ad["_id"]), "ad_file_url": ad.get("ad_file_url")}
+
+
+class AdPlacementIndex:
+    def __init__(self):
+        self._by_video = {}  # video_id -> {placement: tuple of records}
+        self._by_ad = {}  # ad _id -> (video_id, placement)
+        self._payloads = {}  # video_id -> encoded JSON, built on first lookup
+        self._write_lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+        self.loaded_at = None
+        invalidation_bus.subscribe(("advertisements",), self.on_invalidate)
+
+    # --- reads ---
+
+    def payload(self, video_id):
+        """JSON text {"before": [...], "after": [...]} for the video (empty lists if it has no ads)."""
+        self._refresh_if_stale()
+        body = self._payloads.get(video_id)
+        if body is not None:
+            return body
+        # encode under the write lock so a concurrent add/remove/load can't be overwritten by a stale body
+        with self._write_lock:
+            body = self._payloads.get(video_id)
+            if body is None:
+                placements = self._by_video.get(video_id)
+                if placements is None:
+                    return _EMPTY
+                body = json.dumps({placement: list(placements.get(placement, ())) for placement in PLACEMENTS})
+                self._payloads[video_id] = body
+            return body
+
+    def select(self, video_id, placement):
+        """Ad records for one placement of the video."""
+        self._refresh_if_stale()
+        return list(self._by_video.get(video_id, {}).get(placement, ()))
+
+    def stats(self):
+        return {"videos": len(self._by_video), "ads": len(self._by_ad), "loaded_at": self.loaded_at}
+
+    # --- maintenance ---
+
+    def _refresh_if_stale(self):
+        if self.loaded_at is None:
+            with self._reload_lock:  # first lookup waits for the initial load
+                if self.loaded_at is None:
+                    self.load()
+            return
+        if invalidation_bus.live:
+            return
+        if time.time() - self.loaded_at > current_app.config['AD_INDEX_FALLBACK_TTL']:
+            # one request rebuilds; the others keep reading the current index meanwhile
+            if self._reload_lock.acquire(blocking=False):
+                try:
+                    self.load()
+                finally:
+                    self._reload_lock.release()
+
+    def load(self):
+        """Rebuilds the whole index from the advertisements collection."""
+        started = time.time()
+        by_video, by_ad = {}, {}
+        for ad in repos.advertisements.list(projection=_AD_PROJECTION, sort=("created_at", 1)):
+            placement = ad.get("placement")
+            if placement not in PLACEMENTS or ad.get("target_video_id") is None:
+                continue
+            video_id = str(ad["target_video_id"])
+            by_video.setdefault(video_id, {}).setdefault(placement, []).append(_record(ad))
+            by_ad[ad["_id"]] = (video_id, placement)
+        with self._write_lock:
+            self._by_video = {v: {p: tuple(records) for p, records in placements.items()}
+                              for v, placements in by_video.items()}
+            self._by_ad = by_ad
+            self._payloads = {}
+            self.loaded_at = started
+
+    def add(self, ad):
+        """Adds (or moves) one ad; `ad` needs _id, target_video_id, placement and ad_file_url."""
+        if ad.get("placement") not in PLACEMENTS or ad.get("target_video_id") is None:
+            return
+        with self._write_lock:
+            self._remove_locked(ad["_id"])
+            video_id, placement = str(ad["target_video_id"]), ad["placement"]
+            placements = dict(self._by_video.get(video_id, {}))
+            placements[placement] = placements.get(placement, ()) + (_record(ad),)
+            self._by_video[video_id] = placements
+            self._by_ad[ad["_id"]] = (video_id, placement)
+            self._payloads.pop(video_id, None)
+
+    def remove(self, ad_id):
+        with self._write_lock:
+            self._remove_locked(ad_id)
+
+    def _remove_locked(self, ad_id):
+        location = self._by_ad.pop(ad_id, None)
+        if location is None:
+            return
+        video_id, placement = location
+        placements = dict(self._by_video.get(video_id, {}))
+        records = tuple(r for r in placements.get(placement, ()) if r["id"] != str(ad_id))
+        if records:
+            placements[placement] = records
+        else:
+            placements.pop(placement, None)
+        if placements:
+            self._by_video[video_id] = placements
+        else:
+            self._by_video.pop(video_id, None)
+        self._payloads.pop(video_id, None)
+
+    def on_invalidate(self, event):
+        """Applies an advertisements change made by any worker (or by a cascade delete)."""
+        if self.loaded_at is None:
+            return  # nothing loaded yet; the first lookup reads the current data
+        if event.document_id is None:
+            self.load()
+        elif event.operation == "delete":
+            self.remove(event.document_id)
+        else:
+            ad = repos.advertisements.get(event.document_id, _AD_PROJECTION)
+            if ad is None:
+                self.remove(event.document_id)
+            else:
+                self.add(ad)
+
+
+ad_index = AdPlacementIndex()
@@ -0,0 +1,189 @@
+# app/utils/cache.py
+"""
+Small in-process caches for the Flask workers.
+
+TTLCache is a thread-safe, size-bounded (LRU) cache whose entries can be tagged
+with the collections/documents they were built from. It subscribes to the
+invalidation bus (app/utils/invalidation.py), so an edit made by any worker
+drops the affected entries everywhere. When change streams aren't available the
+bus is not live and entries fall back to the shorter `fallback_ttl`.
+
+StaleWhileRevalidateCache is for expensive values that may be a little old
+(dashboards): stale values are served while a single background load refreshes them.
+"""
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+from flask import current_app, has_app_context
+
+_MISSING = object()
+
+
+class TTLCache:
+    def __init__(self, name, ttl=300, fallback_ttl=30, maxsize=1024, collections=()):
+        """
+        ttl: lifetime of an entry while change-stream invalidation is live
+        fallback_ttl: lifetime while it isn't, bounding staleness by time alone
+        collections: collections whose changes affect this cache
+        """
+        self.name = name
+        self.ttl = ttl
+        self.fallback_ttl = fallback_ttl
+        self.maxsize = maxsize
+        self.collections = tuple(collections)
+        self._entries = OrderedDict()  # key -> (value, stored_at, tags)
+        self._tagged = {}  # tag -> set of keys
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        from app.utils.invalidation import invalidation_bus
+        invalidation_bus.caches.append(self)
+        if self.collections:
+            invalidation_bus.subscribe(self.collections, self.on_invalidate)
+
+    def _effective_ttl(self):
+        from app.utils.invalidation import invalidation_bus
+        return self.ttl if invalidation_bus.live else self.fallback_ttl
+
+    def _drop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            for tag in entry[2]:
+                keys = self._tagged.get(tag)
+                if keys is not None:
+                    keys.discard(key)
+                    if not keys:
+                        del self._tagged[tag]
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key, _MISSING)
+            if entry is _MISSING:
+                self.misses += 1
+                return default
+            if time.monotonic() - entry[1] > self._effective_ttl():
+                self._drop(key)
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key, value, tags=()):
+        """
+        tags: (collection, document_id) pairs the value depends on. Use
+        (collection, None) for values built from a whole collection (listings).
+        """
+        tags = tuple((collection, None if doc_id is None else str(doc_id)) for collection, doc_id in tags)
+        with self._lock:
+            self._drop(key)
+            self._entries[key] = (value, time.monotonic(), tags)
+            for tag in tags:
+                self._tagged.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.maxsize:
+                self._drop(next(iter(self._entries)))
+
+    def delete(self, key):
+        with self._lock:
+            self._drop(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tagged.clear()
+
+    def on_invalidate(self, event):
+        """Drops entries affected by an InvalidationEvent."""
+        if event.document_id is None:
+            # Whole collection changed (drop/rename/lost resume point)
+            self.clear()
+            return
+        with self._lock:
+            keys = set(self._tagged.get((event.collection, str(event.document_id)), ()))
+            keys |= self._tagged.get((event.collection, None), set())
+            # Entries without tags can't be matched precisely, so they go too
+            keys |= {k for k, entry in self._entries.items() if not entry[2]}
+            for key in keys:
+                self._drop(key)
+
+    def stats(self):
+        return {"name": self.name, "size": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+class StaleWhileRevalidateCache:
+    """
+    Serves a cached value while it is fresh; once it is stale (but within
+    `stale_for`) keeps serving it and refreshes in the background. Loads are
+    single-flight: however many requests arrive together, one loader call runs
+    per key and the others wait for (or reuse) its result.
+    """
+
+    def __init__(self, name, fresh_for, stale_for):
+        self.name = name
+        self.fresh_for = fresh_for
+        self.stale_for = stale_for
+        self._entries = {}  # key -> (value, loaded_at)
+        self._inflight = {}  # key -> Future of the running load
+        self._lock = threading.Lock()
+        self.loads = 0
+
+        from app.utils.invalidation import invalidation_bus
+        invalidation_bus.caches.append(self)
+
+    def _start_load(self, key, loader):
+        """Returns (future, started_here). Must be called with the lock held."""
+        future = self._inflight.get(key)
+        if future is not None:
+            return future, False
+        future = Future()
+        self._inflight[key] = future
+        return future, True
+
+    def _load(self, key, loader, future):
+        try:
+            value = loader()
+        except Exception as e:
+            with self._lock:
+                self._inflight.pop(key, None)
+            future.set_exception(e)
+            return
+        with self._lock:
+            self._entries[key] = (value, time.monotonic())
+            self._inflight.pop(key, None)
+            self.loads += 1
+        future.set_result(value)
+
+    def get(self, key, loader):
+        """Returns (value, is_stale)."""
+        with self._lock:
+            entry = self._entries.get(key)
+            age = time.monotonic() - entry[1] if entry else None
+            if entry and age < self.fresh_for:
+                return entry[0], False
+            future, started_here = self._start_load(key, loader)
+
+        if entry and age < self.fresh_for + self.stale_for:
+            if started_here:
+                app = current_app._get_current_object() if has_app_context() else None
+
+                def refresh():
+                    if app is None:
+                        return self._load(key, loader, future)
+                    with app.app_context():
+                        self._load(key, loader, future)
+                threading.Thread(target=refresh, name=f"{self.name}-refresh", daemon=True).start()
+            return entry[0], True
+
+        if started_here:
+            self._load(key, loader, future)
+        return future.result(), False
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def stats(self):
+        return {"name": self.name, "size": len(self._entries), "loads": self.loads}
@@ -0,0 +1,83 @@
+# app/utils/cascade.py
+"""
+Cascade cleanup jobs run by the background job queue.
+
+Deleting a playlist removes only the playlist document inline; its videos, their
+advertisements, subtitle files and the thumbnail are cleaned up here, a bounded
+batch of videos per job run.
+"""
+import os
+from bson import ObjectId
+from flask import current_app
+from app.repositories import repos
+from app.utils.job_queue import job_handler, JOB_CONTINUE
+from app.utils.related import remove_related
+
+CASCADE_DELETE_PLAYLIST = "cascade_delete_playlist"
+CASCADE_DELETE_VIDEO = "cascade_delete_video"
+
+
+def _remove_file(file_path, url):
+    try:
+        if os.path.exists(file_path):
+            os.remove(file_path)
+    except Exception as e:
+        current_app.logger.warning("Error deleting file %s: %s", url, e)
+
+
+def remove_thumbnail_file(thumbnail_url):
+    if thumbnail_url:
+        filename = os.path.basename(thumbnail_url)
+        file_path = os.path.join(current_app.config['UPLOAD_FOLDER_THUMBNAILS'], "playlists", filename)
+        _remove_file(file_path, thumbnail_url)
+
+
+def remove_ad_file(ad_file_url):
+    if ad_file_url:
+        filename = os.path.basename(ad_file_url)
+        # Ads are saved under the "general_ads" subfolder by create_advertisement
+        file_path = os.path.join(current_app.config['UPLOAD_FOLDER_ADS'], "general_ads", filename)
+        _remove_file(file_path, ad_file_url)
+
+
+def remove_subtitle_file(subtitle_url):
+    if subtitle_url:
+        filename = os.path.basename(subtitle_url)
+        # Same location upload_subtitles writes to
+        file_path = os.path.join(current_app.root_path, "static", "subtitles", filename)
+        _remove_file(file_path, subtitle_url)
+
+
+def purge_video_media(video_docs):
+    """Deletes the advertisements, subtitle files and playback progress belonging to the given videos."""
+    video_ids = [v["_id"] for v in video_docs]
+    if not video_ids:
+        return
+    for ad in repos.advertisements.list_for_videos(video_ids, {"ad_file_url": 1}):
+        remove_ad_file(ad.get("ad_file_url"))
+    repos.advertisements.delete_for_videos(video_ids)
+    repos.progress.delete_for_videos(video_ids)
+    for video in video_docs:
+        remove_subtitle_file(video.get("subtitle_url"))
+
+
+@job_handler(CASCADE_DELETE_PLAYLIST)
+def cascade_delete_playlist(payload, job):
+    p_id = ObjectId(payload["playlist_id"])
+    batch_size = current_app.config['CASCADE_BATCH_SIZE']
+
+    batch = list(repos.videos.list_for_playlist(p_id, {"_id": 1, "subtitle_url": 1}, limit=batch_size))
+    if batch:
+        purge_video_media(batch)
+        repos.videos.delete_many([v["_id"] for v in batch])
+        if len(batch) == batch_size:
+            return JOB_CONTINUE
+
+    # All videos are gone; the thumbnail and related-series entries are the last things to clean up
+    remove_thumbnail_file(payload.get("thumbnail_url"))
+    remove_related(p_id)
+
+
+@job_handler(CASCADE_DELETE_VIDEO)
+def cascade_delete_video(payload, job):
+    purge_video_media([{"_id": ObjectId(payload["video_id"]), "subtitle_url": payload.get("subtitle_url")}])
@@ -0,0 +1,230 @@
+# app/utils/catalog_io.py
+"""
+Bulk NDJSON import/export of the catalog (playlists and videos).
+
+One JSON document per line, tagged with "type": "playlist" or "video". Export
+writes playlists before videos, using bson.json_util's relaxed format so ids
+and dates survive a round-trip. It streams from cursors and never holds the
+whole collection in memory.
+
+Import reads lines in chunks. Each line is validated with the *Import models.
+Playlists get their _id assigned up front, so a video can reference a playlist
+from the same file with "playlist_ref" (the playlist line's "ref"; it must come
+first). A video can also reference an existing playlist with "playlist_id".
+Each chunk is written with one write_many per collection (inserts, or
+replacing upserts), and every failing line is reported with its line number. With
+ordered=True the import stops at the first failing line. The report counts
+inserted and replaced (changed by an upsert) documents separately.
+"""
+import datetime
+
+from bson import ObjectId, json_util
+from bson.json_util import RELAXED_JSON_OPTIONS
+from pydantic import ValidationError
+
+from app.models import PlaylistImport, VideoImport
+from app.repositories import repos
+
+CATALOG_COLLECTIONS = {"playlist": "playlists", "video": "videos"}
+
+
+def _repository(doc_type):
+    return getattr(repos, CATALOG_COLLECTIONS[doc_type])
+
+
+def export_catalog(region=None, types=("playlist", "video"), batch_size=1000):
+    """Yields the catalog as NDJSON lines."""
+    for doc_type in types:
+        cursor = _repository(doc_type).list(region=region, sort=("_id", 1), batch_size=batch_size)
+        for doc in cursor:
+            yield json_util.dumps({"type": doc_type, **doc}, json_options=RELAXED_JSON_OPTIONS) + "\n"
+
+
+def _error_text(e):
+    if isinstance(e, ValidationError):
+        return "; ".join(f"{'.'.join(str(p) for p in err['loc']) or 'line'}: {err['msg']}"
+                         for err in e.errors(include_url=False))
+    return str(e)
+
+
+class CatalogImport:
+    def __init__(self, chunk_size=500, ordered=False, upsert=False, max_errors=1000):
+        self.chunk_size = chunk_size
+        self.ordered = ordered
+        self.upsert = upsert
+        self.max_errors = max_errors
+        self.refs = {}  # playlist_ref -> (_id, region), for playlists imported by this run
+        self.known_playlists = {}  # existing playlist _id -> region
+        self.lines = 0
+        self.inserted = {"playlist": 0, "video": 0}
+        self.replaced = {"playlist": 0, "video": 0}
+        self.error_count = 0
+        self.errors = []
+        self.stopped_at_line = None
+
+    def _error(self, line_no, message):
+        self.error_count += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({"line": line_no, "error": message})
+        if self.ordered:
+            self.stopped_at_line = min(line_no, self.stopped_at_line or line_no)
+
+    # --- per-line preparation ---
+
+    def _playlist_doc(self, data, now):
+        model = PlaylistImport.model_validate(data)
+        if model.ref is not None and model.ref in self.refs:
+            raise ValueError(f"duplicate playlist ref {model.ref!r}")
+        doc = model.model_dump(exclude={"id", "ref"}, exclude_none=True)
+        doc["_id"] = model.id or ObjectId()
+        doc.setdefault("created_at", now)
+        doc.setdefault("updated_at", now)
+        doc["videos"] = []
+        return model.ref, doc
+
+    def _video_model(self, data):
+        model = VideoImport.model_validate(data)
+        if model.playlist_ref is None and model.playlist_id is None:
+            raise ValueError("playlist_ref or playlist_id is required")
+        return model
+
+    def _resolve_playlists(self, video_models):
+        """Looks up the existing playlists referenced by id in this chunk, in one query."""
+        missing = {m.playlist_id for _, m in video_models
+                   if m.playlist_ref is None and m.playlist_id not in self.known_playlists}
+        if missing:
+            for p in repos.playlists.get_many(missing, {"region": 1}).values():
+                self.known_playlists[p["_id"]] = p.get("region")
+
+    def _video_doc(self, model, now):
+        if model.playlist_ref is not None:
+            if model.playlist_ref not in self.refs:
+                raise ValueError(f"unknown playlist_ref {model.playlist_ref!r} (playlists must come before their videos)")
+            playlist_id, region = self.refs[model.playlist_ref]
+        else:
+            if model.playlist_id not in self.known_playlists:
+                raise ValueError(f"playlist {model.playlist_id} not found")
+            playlist_id, region = model.playlist_id, self.known_playlists[model.playlist_id]
+        doc = model.model_dump(exclude={"id", "playlist_ref"}, exclude_none=True)
+        doc["_id"] = model.id or ObjectId()
+        doc["playlist_id"] = playlist_id
+        doc.setdefault("region", region)
+        doc.setdefault("created_at", now)
+        doc.setdefault("updated_at", now)
+        return doc
+
+    # --- writes ---
+
+    def _write(self, doc_type, entries):
+        """Writes [(line_no, doc)] in one batch; returns the line numbers that failed or were not attempted."""
+        if not entries:
+            return set()
+        docs = [doc for _, doc in entries]
+        inserted, replaced, write_errors = _repository(doc_type).write_many(
+            docs, ordered=self.ordered, replace=self.upsert)
+        failed = set()
+        for index, message in write_errors:
+            line_no = entries[index][0]
+            failed.add(line_no)
+            self._error(line_no, message)
+        if self.ordered and write_errors:
+            # an ordered batch stops at its first error; the rest was not written
+            first = min(index for index, _ in write_errors)
+            failed.update(line_no for line_no, _ in entries[first:])
+        self.inserted[doc_type] += inserted
+        self.replaced[doc_type] += replaced
+        return failed
+
+    def _flush(self, chunk):
+        if self.stopped_at_line is not None:
+            chunk = [entry for entry in chunk if entry[0] < self.stopped_at_line]
+        now = datetime.datetime.utcnow()
+        playlists, videos = [], []
+        for line_no, doc_type, data in chunk:
+            try:
+                if doc_type == "playlist":
+                    ref, doc = self._playlist_doc(data, now)
+                    playlists.append((line_no, doc))
+                    if ref is not None:
+                        self.refs[ref] = (doc["_id"], doc.get("region"))
+                else:
+                    videos.append((line_no, self._video_model(data)))
+            except (ValidationError, ValueError) as e:
+                self._error(line_no, _error_text(e))
+                if self.ordered:
+                    break
+
+        failed = self._write("playlist", playlists)
+        if failed:
+            # videos must not point at playlists that were not written
+            unwritten = {doc["_id"] for line_no, doc in playlists if line_no in failed}
+            self.refs = {ref: v for ref, v in self.refs.items() if v[0] not in unwritten}
+        if self.stopped_at_line is not None:
+            videos = [(line_no, m) for line_no, m in videos if line_no < self.stopped_at_line]
+
+        self._resolve_playlists(videos)
+        video_docs = []
+        for line_no, model in videos:
+            try:
+                video_docs.append((line_no, self._video_doc(model, now)))
+            except ValueError as e:
+                self._error(line_no, str(e))
+                if self.ordered:
+                    break
+        if self.stopped_at_line is not None:
+            video_docs = [(line_no, d) for line_no, d in video_docs if line_no < self.stopped_at_line]
+        failed = self._write("video", video_docs)
+
+        # New videos change their playlists' content, as with POST /api/videos
+        touched = {doc["playlist_id"] for line_no, doc in video_docs if line_no not in failed}
+        if touched:
+            repos.playlists.touch_many(touched)
+
+    def run(self, lines):
+        chunk = []
+        for line_no, line in enumerate(lines, start=1):
+            if self.stopped_at_line is not None:
+                break
+            self.lines = line_no
+            if isinstance(line, bytes):
+                line = line.decode("utf-8")
+            if not line.strip():
+                continue
+            try:
+                data = json_util.loads(line)
+                doc_type = data.pop("type", None) if isinstance(data, dict) else None
+                if doc_type not in CATALOG_COLLECTIONS:
+                    raise ValueError('each line must be an object with "type": "playlist" or "video"')
+            except Exception as e:  # JSON syntax, bad $oid/$date, ...
+                self._error(line_no, f"invalid line: {e}")
+                continue
+            chunk.append((line_no, doc_type, data))
+            if len(chunk) >= self.chunk_size:
+                self._flush(chunk)
+                chunk = []
+        if chunk:
+            self._flush(chunk)
+        return self.report()
+
+    def report(self):
+        errors = sorted(self.errors, key=lambda e: e["line"])
+        error_count = self.error_count
+        if self.stopped_at_line is not None:
+            # lines past the stop were looked at while validating a chunk, but never imported
+            errors = [e for e in errors if e["line"] <= self.stopped_at_line]
+            error_count = len(errors)
+        report = {
+            "lines": self.lines,
+            "inserted": {"playlists": self.inserted["playlist"], "videos": self.inserted["video"]},
+            "replaced": {"playlists": self.replaced["playlist"], "videos": self.replaced["video"]},
+            "error_count": error_count,
+            "errors": errors,
+        }
+        if self.stopped_at_line is not None:
+            report["stopped_at_line"] = self.stopped_at_line
+        return report
+
+
+def import_catalog(lines, **kwargs):
+    """Imports NDJSON lines (str or bytes, any iterable); returns the report."""
+    return CatalogImport(**kwargs).run(lines)
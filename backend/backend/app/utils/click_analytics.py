@@ -0,0 +1,105 @@
+# app/utils/click_analytics.py
+"""
+Channel-group click ingestion and per-day analytics.
+
+Every click endpoint goes through record_click(). It drops repeats from the
+same client for the same group within CLICK_DEDUP_SECONDS. The dedup is kept
+per worker process, like the in-memory rate limiter. A counted click bumps the
+group's lifetime `clicks` and $inc's one bucket document per group and UTC day
+in `click_buckets`, upserting it on the day's first click. Charts read those
+buckets with click_series(), never raw events.
+"""
+import datetime
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app
+
+from app.repositories import repos
+
+
+class ClickDeduplicator:
+    """Remembers (client, group) pairs for `window` seconds; bounded LRU."""
+
+    def __init__(self, window, max_keys=65536):
+        self.window = window
+        self.max_keys = max_keys
+        self._seen = OrderedDict()  # key -> last counted at
+        self._lock = threading.Lock()
+
+    def first_in_window(self, key, now=None):
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            last = self._seen.get(key)
+            if last is not None and now - last < self.window:
+                return False
+            self._seen[key] = now
+            self._seen.move_to_end(key)
+            while len(self._seen) > self.max_keys:
+                self._seen.popitem(last=False)
+            return True
+
+    def forget(self, key):
+        with self._lock:
+            self._seen.pop(key, None)
+
+
+_dedup = None
+_dedup_lock = threading.Lock()
+
+
+def _deduplicator():
+    global _dedup
+    if _dedup is None:
+        with _dedup_lock:
+            if _dedup is None:
+                config = current_app.config
+                _dedup = ClickDeduplicator(config['CLICK_DEDUP_SECONDS'], config['CLICK_DEDUP_MAX_KEYS'])
+    return _dedup
+
+
+def _day(moment):
+    return datetime.datetime(moment.year, moment.month, moment.day)
+
+
+def record_click(group_id, client):
+    """
+    Counts a click on a channel group. Returns (found, counted): found is False
+    for an unknown group; counted is False for a repeat within the dedup window.
+    """
+    dedup, key = _deduplicator(), f"{client}|{group_id}"
+    if not dedup.first_in_window(key):
+        return True, False  # only clicks on existing groups are remembered
+
+    group = repos.channel_groups.increment_clicks(group_id)
+    if group is None:
+        dedup.forget(key)
+        return False, False
+    day = _day(datetime.datetime.utcnow())
+    repos.click_buckets.add_click(f"{group_id}:{day:%Y%m%d}", group_id, day, group.get("region"))
+    return True, True
+
+
+def click_series(start, end, region=None, group_id=None):
+    """
+    Clicks per day (zero-filled, start..end inclusive) and per group from the
+    day buckets in range: {"total", "days": [{"day", "clicks"}], "groups": [{"group_id", "region", "clicks"}]}.
+    """
+    by_day, by_group = {}, {}
+    for bucket in repos.click_buckets.in_range(_day(start), _day(end), region, group_id):
+        by_day[bucket["day"]] = by_day.get(bucket["day"], 0) + bucket["clicks"]
+        row = by_group.setdefault(bucket["group_id"], {"group_id": str(bucket["group_id"]),
+                                                       "region": bucket.get("region"), "clicks": 0})
+        row["clicks"] += bucket["clicks"]
+
+    days = []
+    day = _day(start)
+    while day <= _day(end):
+        days.append({"day": f"{day:%Y-%m-%d}", "clicks": by_day.get(day, 0)})
+        day += datetime.timedelta(days=1)
+    return {
+        "total": sum(by_day.values()),
+        "days": days,
+        "groups": sorted(by_group.values(), key=lambda row: row["clicks"], reverse=True),
+    }
@@ -0,0 +1,112 @@
+# app/utils/fields.py
+"""
+Sparse field selection for read endpoints: ?fields=id,title,thumbnail_url
+
+The requested names are checked against a per-resource whitelist, turned into a
+Mongo projection (so unneeded fields are never decoded) and used to shape the
+response documents. "id" maps to the document's _id; names listed as computed
+aren't stored fields and are filled in by the route only when asked for.
+"""
+from bson import ObjectId
+from flask import request, jsonify, current_app
+
+PLAYLIST_FIELDS = (
+    "id", "title", "description", "keywords", "region", "genre", "thumbnail_url",
+    "videos_count", "created_at", "updated_at", "last_engaged_at",
+)
+PLAYLIST_COMPUTED = ("videos_count",)
+PLAYLIST_SUMMARY_FIELDS = (
+    "id", "title", "description", "keywords", "region", "thumbnail_url",
+    "videos_count", "created_at", "updated_at",
+)
+PUBLIC_PLAYLIST_FIELDS = ("id", "title", "description", "thumbnail_url", "region", "genre", "keywords")
+
+VIDEO_FIELDS = (
+    "id", "title", "description", "keywords", "video_link", "embed_url", "thumbnail_url",
+    "playlist_id", "region", "views", "likes", "rating", "subtitle_url", "created_at", "updated_at",
+)
+VIDEO_SUMMARY_FIELDS = (
+    "id", "title", "description", "thumbnail_url", "video_link", "embed_url", "playlist_id", "rating",
+)
+PUBLIC_VIDEO_FIELDS = tuple(f for f in VIDEO_FIELDS if f != "playlist_id")
+
+AD_FIELDS = ("id", "target_video_id", "placement", "ad_file_name", "ad_file_url", "created_at")
+
+CHANNEL_GROUP_FIELDS = ("id", "region", "type", "link", "clicks", "created_at")
+PUBLIC_CHANNEL_GROUP_FIELDS = ("id", "region", "type", "link")
+
+
+def requested_fields(allowed, default=None):
+    """
+    Parses the `fields` query parameter. Returns (fields, error_response):
+    fields is a tuple of names (or `default` when the parameter is absent),
+    error_response is a 400 response if unknown names were asked for.
+    """
+    raw = request.args.get('fields')
+    if raw is None or raw.strip() == "":
+        return default, None
+    fields = tuple(dict.fromkeys(f.strip() for f in raw.split(",") if f.strip()))
+    unknown = [f for f in fields if f not in allowed]
+    if unknown:
+        return None, (jsonify({"msg": "Unknown fields requested", "unknown": unknown, "allowed": list(allowed)}), 400)
+    return fields, None
+
+
+def mongo_projection(fields, computed=()):
+    """Projection for a find() that returns only the stored fields among `fields`."""
+    projection = {"_id": 1}
+    for name in fields:
+        if name != "id" and name not in computed:
+            projection[name] = 1
+    return projection
+
+
+def _json_value(value):
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, list):
+        return [_json_value(v) for v in value]
+    if isinstance(value, dict):
+        return {k: _json_value(v) for k, v in value.items()}
+    return value
+
+
+def shape_doc(doc, fields, extra=None):
+    """Builds the response dict for `doc` with exactly `fields`, in that order."""
+    extra = extra or {}
+    shaped = {}
+    for name in fields:
+        if name in extra:
+            shaped[name] = extra[name]
+        elif name == "id":
+            shaped[name] = str(doc["_id"])
+        else:
+            shaped[name] = _json_value(doc.get(name))
+    return shaped
+
+
+def requested_ids():
+    """
+    Parses the `ids` query parameter of batch reads (comma-separated ObjectIds,
+    at most BATCH_GET_MAX_IDS). Returns (ids, error_response); duplicates are
+    dropped, request order is kept.
+    """
+    raw = request.args.get('ids', "")
+    ids = list(dict.fromkeys(i.strip() for i in raw.split(",") if i.strip()))
+    if not ids:
+        return None, (jsonify({"msg": "ids is required, e.g. ?ids=<id>,<id>"}), 400)
+    max_ids = current_app.config['BATCH_GET_MAX_IDS']
+    if len(ids) > max_ids:
+        return None, (jsonify({"msg": f"At most {max_ids} ids per request", "count": len(ids)}), 400)
+    invalid = [i for i in ids if not ObjectId.is_valid(i)]
+    if invalid:
+        return None, (jsonify({"msg": "Invalid ids", "invalid": invalid}), 400)
+    return [ObjectId(i) for i in ids], None
+
+
+def batch_payload(ids, docs_by_id, shape):
+    """{"items": [...], "missing": [...]}: found documents in request order, shaped, and the ids not found."""
+    return {
+        "items": [shape(docs_by_id[i]) for i in ids if i in docs_by_id],
+        "missing": [str(i) for i in ids if i not in docs_by_id],
+    }
@@ -0,0 +1,32 @@
+# app/utils/http_cache.py
+import hashlib
+from flask import request, make_response, jsonify
+
+
+def make_etag(*parts):
+    """Builds a strong ETag value from the given version parts (ids, timestamps, counts)."""
+    raw = "|".join("" if p is None else str(p) for p in parts)
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+def not_modified_response(etag):
+    """
+    Returns a 304 response if the client's If-None-Match already has this ETag,
+    otherwise None. Call it before doing the expensive part of a read.
+    """
+    if request.if_none_match and request.if_none_match.contains(etag):
+        response = make_response('', 304)
+        response.set_etag(etag)
+        return response
+    return None
+
+
+def with_etag(response, etag):
+    response.set_etag(etag)
+    # Let clients keep the body but always revalidate with the ETag
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+def etag_response(payload, etag, status=200):
+    return with_etag(make_response(jsonify(payload), status), etag)
@@ -0,0 +1,176 @@
+# app/utils/invalidation.py
+"""
+Cross-worker cache invalidation driven by MongoDB change streams.
+
+Each worker process runs one background thread that tails a database-level
+change stream filtered to the catalog (and users) collections and publishes an
+InvalidationEvent to every cache subscribed to that collection. The resume
+token is saved periodically, so a restarted worker continues where it left off.
+
+Change streams need a replica set (a single-node one is enough). On a
+standalone server the bus stays "not live" and caches use their fallback TTL.
+With STORAGE_BACKEND=memory there is no stream to tail: every write happens in
+this process, so only the events published here reach the caches.
+"""
+import datetime
+import socket
+import threading
+from dataclasses import dataclass
+from typing import Any, Optional
+
+from pymongo.errors import OperationFailure, PyMongoError
+from app import mongo
+
+WATCHED_COLLECTIONS = ("playlists", "videos", "advertisements", "channel_groups", "users")
+
+# Server error codes meaning the stored resume token can no longer be used
+_RESUME_TOKEN_LOST_CODES = {260, 280, 286}
+
+
+@dataclass(frozen=True)
+class InvalidationEvent:
+    collection: str
+    operation: str  # insert / update / replace / delete, or "flush" for a whole collection
+    document_id: Optional[Any] = None  # None means "anything in the collection may have changed"
+
+
+class InvalidationBus:
+    def __init__(self):
+        self._subscribers = {}  # collection -> list of callbacks
+        self.caches = []  # every TTLCache in this process, for stats
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.live = False
+        self.app = None
+        self.consumer_id = None
+        self.events_seen = 0
+
+    def init_app(self, app):
+        self.app = app
+        self.consumer_id = app.config['INVALIDATION_CONSUMER_ID'] or socket.gethostname()
+        from app.repositories import repos
+        if app.config['INVALIDATION_BUS_ENABLED'] and repos.backend != "memory":
+            self.start()
+
+    def subscribe(self, collections, callback):
+        with self._lock:
+            for collection in collections:
+                self._subscribers.setdefault(collection, []).append(callback)
+
+    def publish(self, event):
+        with self._lock:
+            callbacks = list(self._subscribers.get(event.collection, ()))
+        for callback in callbacks:
+            try:
+                callback(event)
+            except Exception:
+                if self.app:
+                    self.app.logger.exception("Cache invalidation callback failed for %s", event)
+
+    def stats(self):
+        return {
+            "live": self.live,
+            "consumer_id": self.consumer_id,
+            "events_seen": self.events_seen,
+            "caches": [cache.stats() for cache in self.caches],
+        }
+
+    def flush_all(self):
+        for collection in WATCHED_COLLECTIONS:
+            self.publish(InvalidationEvent(collection, "flush"))
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="invalidation-bus", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(5)
+
+    # --- change stream consumer ---
+
+    def _load_token(self):
+        state = mongo.db.change_stream_tokens.find_one({"_id": self.consumer_id})
+        return state.get("token") if state else None
+
+    def _save_token(self, token):
+        if token is None:
+            return
+        mongo.db.change_stream_tokens.update_one(
+            {"_id": self.consumer_id},
+            {"$set": {"token": token, "updated_at": datetime.datetime.utcnow()}},
+            upsert=True
+        )
+
+    def _dispatch(self, change):
+        ns = change.get("ns") or {}
+        collection = ns.get("coll")
+        operation = change.get("operationType")
+        if operation in ("insert", "update", "replace", "delete"):
+            document_id = (change.get("documentKey") or {}).get("_id")
+            self.publish(InvalidationEvent(collection, operation, document_id))
+        elif collection:
+            # drop / rename: the whole collection is suspect
+            self.publish(InvalidationEvent(collection, "flush"))
+        else:
+            self.flush_all()
+        self.events_seen += 1
+
+    def _run(self):
+        config = self.app.config
+        retry_delay = 1
+        with self.app.app_context():
+            token = None
+            try:
+                token = self._load_token()
+            except PyMongoError as e:
+                self.app.logger.warning("Could not load change stream resume token: %s", e)
+
+            while not self._stop.is_set():
+                try:
+                    pipeline = [{"$match": {"ns.coll": {"$in": list(WATCHED_COLLECTIONS)}}}]
+                    with mongo.db.watch(pipeline, resume_after=token, max_await_time_ms=1000) as stream:
+                        if not self.live:
+                            self.app.logger.info("Cache invalidation bus is live (change streams)")
+                        self.live = True
+                        retry_delay = 1
+                        last_saved = datetime.datetime.utcnow()
+                        while not self._stop.is_set() and stream.alive:
+                            change = stream.try_next()
+                            if change is not None:
+                                self._dispatch(change)
+                            token = stream.resume_token
+                            now = datetime.datetime.utcnow()
+                            if (now - last_saved).total_seconds() >= config['INVALIDATION_TOKEN_SAVE_INTERVAL']:
+                                self._save_token(token)
+                                last_saved = now
+                        self._save_token(token)
+                except OperationFailure as e:
+                    self.live = False
+                    if e.code in _RESUME_TOKEN_LOST_CODES and token is not None:
+                        # Events between the token and now are gone; start over and drop everything cached
+                        self.app.logger.warning("Change stream resume token is no longer valid, flushing caches")
+                        token = None
+                        self.flush_all()
+                        continue
+                    self.app.logger.warning(
+                        "Change streams unavailable (%s); caches fall back to TTL expiry", e)
+                    self._stop.wait(config['INVALIDATION_RETRY_INTERVAL'])
+                except PyMongoError as e:
+                    # Connection trouble: events may be missed until we resume, so
+                    # don't let stale entries live longer than the fallback TTL
+                    self.live = False
+                    self.app.logger.warning("Change stream interrupted: %s", e)
+                    self._stop.wait(min(retry_delay, config['INVALIDATION_RETRY_INTERVAL']))
+                    retry_delay *= 2
+                except Exception:
+                    self.live = False
+                    self.app.logger.exception("Cache invalidation bus failed; caches fall back to TTL expiry")
+                    self._stop.wait(config['INVALIDATION_RETRY_INTERVAL'])
+
+
+invalidation_bus = InvalidationBus()
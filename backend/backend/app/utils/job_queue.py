@@ -0,0 +1,192 @@
+# app/utils/job_queue.py
+"""
+Background job queue.
+
+Jobs live in the `jobs` collection (repos.jobs; with the memory storage backend
+they are kept in process and run by the in-process workers). A worker leases a
+job by atomically flipping it to "running" with a lease expiry (the visibility
+timeout); if the worker dies the lease runs out and another worker picks the
+job up again. Failed jobs are retried
+with exponential backoff until JOB_MAX_ATTEMPTS is reached.
+
+Handlers are registered with @job_handler("type") and receive (payload, job).
+A handler may return JOB_CONTINUE to be re-queued immediately, which lets long
+jobs work through their data in bounded batches instead of one huge operation.
+"""
+import datetime
+import os
+import socket
+import threading
+import time
+
+from bson import ObjectId
+from app.repositories import repos, JOB_QUEUED, JOB_RUNNING, JOB_DONE, JOB_FAILED  # noqa: F401
+
+# Returned by a handler when it made progress but has more batches to process
+JOB_CONTINUE = "continue"
+
+_handlers = {}
+
+
+def job_handler(job_type):
+    """Decorator registering a function as the handler for a job type."""
+    def decorator(func):
+        _handlers[job_type] = func
+        return func
+    return decorator
+
+
+def ensure_job_indexes():
+    repos.jobs.ensure_indexes()
+
+
+def enqueue_job(job_type, payload, max_attempts=None, delay_seconds=0):
+    """Adds a job to the queue and returns its id."""
+    from flask import current_app
+    now = datetime.datetime.utcnow()
+    job_doc = {
+        "type": job_type,
+        "payload": payload,
+        "status": JOB_QUEUED,
+        "attempts": 0,
+        "max_attempts": max_attempts or current_app.config['JOB_MAX_ATTEMPTS'],
+        "run_at": now + datetime.timedelta(seconds=delay_seconds),
+        "lease_id": None,
+        "lease_expires_at": None,
+        "last_error": None,
+        "created_at": now,
+        "updated_at": now,
+    }
+    return repos.jobs.insert(job_doc)["_id"]
+
+
+def lease_job(worker_id, visibility_timeout):
+    """
+    Atomically claims the next runnable job: either a queued job that is due, or a
+    running job whose lease has expired (its worker crashed or stalled).
+    """
+    now = datetime.datetime.utcnow()
+    return repos.jobs.lease(_handlers.keys(), now, {
+        "status": JOB_RUNNING,
+        "worker_id": worker_id,
+        "lease_id": ObjectId(),
+        "lease_expires_at": now + datetime.timedelta(seconds=visibility_timeout),
+        "updated_at": now,
+    })
+
+
+def _finish_job(job, fields, inc_fields=None):
+    # Only the current lease holder may settle a job; a stale worker whose lease
+    # expired and was reclaimed matches nothing here.
+    fields["updated_at"] = datetime.datetime.utcnow()
+    return repos.jobs.settle(job, fields, inc_fields)
+
+
+def extend_lease(job, visibility_timeout):
+    """Pushes the lease expiry forward for handlers that need longer than one timeout."""
+    expires = datetime.datetime.utcnow() + datetime.timedelta(seconds=visibility_timeout)
+    return _finish_job(job, {"lease_expires_at": expires})
+
+
+def complete_job(job):
+    return _finish_job(job, {"status": JOB_DONE, "lease_id": None, "lease_expires_at": None})
+
+
+def requeue_job(job):
+    """Puts a job back at the end of the queue without counting it as a failed attempt."""
+    return _finish_job(job, {
+        "status": JOB_QUEUED,
+        "run_at": datetime.datetime.utcnow(),
+        "lease_id": None,
+        "lease_expires_at": None,
+    }, inc_fields={"attempts": -1})
+
+
+def fail_job(job, error):
+    """Schedules a retry with exponential backoff, or marks the job failed when out of attempts."""
+    if job["attempts"] >= job["max_attempts"]:
+        return _finish_job(job, {
+            "status": JOB_FAILED, "last_error": error, "lease_id": None, "lease_expires_at": None,
+        })
+    backoff = min(2 ** job["attempts"], 300)
+    return _finish_job(job, {
+        "status": JOB_QUEUED,
+        "last_error": error,
+        "run_at": datetime.datetime.utcnow() + datetime.timedelta(seconds=backoff),
+        "lease_id": None,
+        "lease_expires_at": None,
+    })
+
+
+def run_job(job):
+    handler = _handlers.get(job["type"])
+    if handler is None:
+        return fail_job(job, f"No handler registered for job type {job['type']}")
+    try:
+        outcome = handler(job.get("payload") or {}, job)
+    except Exception as e:
+        return fail_job(job, str(e))
+    if outcome == JOB_CONTINUE:
+        return requeue_job(job)
+    return complete_job(job)
+
+
+class JobWorker:
+    """
+    Pool of threads that lease and run jobs. Used in-process from create_app
+    (JOB_WORKER_IN_PROCESS) or standalone via worker.py.
+    """
+
+    def __init__(self, app, threads=None, poll_interval=None, visibility_timeout=None):
+        self.app = app
+        self.threads = threads or app.config['JOB_WORKER_THREADS']
+        self.poll_interval = poll_interval or app.config['JOB_POLL_INTERVAL']
+        self.visibility_timeout = visibility_timeout or app.config['JOB_VISIBILITY_TIMEOUT']
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._stop = threading.Event()
+        self._threads = []
+
+    def _loop(self, thread_name):
+        worker_id = f"{self.worker_id}:{thread_name}"
+        with self.app.app_context():
+            while not self._stop.is_set():
+                try:
+                    job = lease_job(worker_id, self.visibility_timeout)
+                except Exception as e:
+                    self.app.logger.warning("Job worker could not lease a job: %s", e)
+                    job = None
+                if job is None:
+                    self._stop.wait(self.poll_interval)
+                    continue
+                try:
+                    run_job(job)
+                except Exception:
+                    self.app.logger.exception("Job worker failed to settle job %s", job.get("_id"))
+
+    def start(self):
+        # Importing the job modules registers their handlers
+        from app.utils import cascade, related  # noqa: F401
+        try:
+            with self.app.app_context():
+                ensure_job_indexes()
+        except Exception as e:
+            self.app.logger.warning("Could not ensure job indexes: %s", e)
+
+        for i in range(self.threads):
+            t = threading.Thread(target=self._loop, args=(f"t{i}",), name=f"job-worker-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+        return self
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        for t in self._threads:
+            t.join(timeout)
+
+    def run_forever(self):
+        self.start()
+        try:
+            while not self._stop.is_set():
+                time.sleep(1)
+        except KeyboardInterrupt:
+            self.stop()
@@ -0,0 +1,169 @@
+# app/utils/migrations.py
+"""
+Small data-migration framework.
+
+A Migration walks one collection in _id order, `batch_size` documents at a time,
+and turns each document into an update (or None to leave it alone). Updates are
+sent with one bulk_write per batch. After every batch the last processed _id is
+checkpointed in the `migrations` collection, so an interrupted run resumes where
+it stopped; a finished migration is recorded as applied and skipped afterwards.
+
+Run them with migrate.py.
+"""
+import datetime
+import time
+
+from pymongo import ASCENDING, UpdateOne
+
+MIGRATION_RUNNING = "running"
+MIGRATION_APPLIED = "applied"
+
+MIGRATIONS = []
+
+
+class Migration:
+    def __init__(self, version, name, collection, transform, query=None, projection=None):
+        """
+        version: sortable string, e.g. "0001"; also the _id of the record in `migrations`
+        transform: function(doc) -> update document such as {"$set": {...}}, or None to skip
+        query/projection: narrow the scan to documents (and fields) that may need changes
+        """
+        self.version = version
+        self.name = name
+        self.collection = collection
+        self.transform = transform
+        self.query = query or {}
+        self.projection = projection
+
+    def __repr__(self):
+        return f"<Migration {self.version} {self.name}>"
+
+
+def register_migration(version, name, collection, query=None, projection=None):
+    """Decorator form: the decorated function is the migration's transform."""
+    def decorator(transform):
+        MIGRATIONS.append(Migration(version, name, collection, transform, query, projection))
+        MIGRATIONS.sort(key=lambda m: m.version)
+        return transform
+    return decorator
+
+
+def migration_status(db):
+    records = {r["_id"]: r for r in db.migrations.find()}
+    return [(m, records.get(m.version)) for m in MIGRATIONS]
+
+
+def run_migration(db, migration, batch_size=1000, dry_run=False, max_docs_per_second=None, log=print):
+    """
+    Applies one migration. Returns a summary dict with processed/modified counts,
+    elapsed seconds and throughput. In dry-run mode nothing is written, neither
+    the updates nor the checkpoint.
+    """
+    record = db.migrations.find_one({"_id": migration.version})
+    if record and record.get("status") == MIGRATION_APPLIED:
+        log(f"{migration.version} {migration.name}: already applied")
+        return {"version": migration.version, "skipped": True}
+
+    last_id = record.get("last_id") if record and not dry_run else None
+    if last_id is not None:
+        log(f"{migration.version} {migration.name}: resuming after _id {last_id}")
+    elif not dry_run:
+        db.migrations.update_one(
+            {"_id": migration.version},
+            {"$set": {
+                "name": migration.name,
+                "status": MIGRATION_RUNNING,
+                "processed": 0,
+                "modified": 0,
+                "started_at": datetime.datetime.utcnow(),
+            }},
+            upsert=True
+        )
+
+    collection = db[migration.collection]
+    processed = 0
+    modified = 0
+    started = time.monotonic()
+
+    while True:
+        query = migration.query
+        if last_id is not None:
+            query = {"$and": [migration.query, {"_id": {"$gt": last_id}}]}
+        batch = list(collection.find(query, migration.projection).sort("_id", ASCENDING).limit(batch_size))
+        if not batch:
+            break
+
+        batch_started = time.monotonic()
+        ops = []
+        for doc in batch:
+            update = migration.transform(doc)
+            if update:
+                ops.append(UpdateOne({"_id": doc["_id"]}, update))
+
+        batch_modified = len(ops)
+        if ops and not dry_run:
+            batch_modified = collection.bulk_write(ops, ordered=False).modified_count
+
+        last_id = batch[-1]["_id"]
+        processed += len(batch)
+        modified += batch_modified
+
+        if not dry_run:
+            db.migrations.update_one(
+                {"_id": migration.version},
+                {
+                    "$set": {"last_id": last_id, "updated_at": datetime.datetime.utcnow()},
+                    "$inc": {"processed": len(batch), "modified": batch_modified},
+                }
+            )
+
+        elapsed = time.monotonic() - started
+        log(f"{migration.version} {migration.name}: {processed} scanned, {modified} "
+            f"{'would change' if dry_run else 'modified'} ({processed / elapsed if elapsed else 0:.0f} docs/s)")
+
+        # Throttle to keep the load on the live cluster bounded
+        if max_docs_per_second:
+            min_duration = len(batch) / max_docs_per_second
+            spent = time.monotonic() - batch_started
+            if spent < min_duration:
+                time.sleep(min_duration - spent)
+
+    elapsed = time.monotonic() - started
+    if not dry_run:
+        db.migrations.update_one(
+            {"_id": migration.version},
+            {"$set": {"status": MIGRATION_APPLIED, "applied_at": datetime.datetime.utcnow()}}
+        )
+    return {
+        "version": migration.version,
+        "processed": processed,
+        "modified": modified,
+        "elapsed_seconds": round(elapsed, 3),
+        "docs_per_second": round(processed / elapsed, 1) if elapsed else None,
+        "dry_run": dry_run,
+    }
+
+
+def run_pending(db, target=None, **kwargs):
+    """Runs every registered migration up to and including `target` (all if None)."""
+    results = []
+    for migration in MIGRATIONS:
+        if target is not None and migration.version > target:
+            break
+        results.append(run_migration(db, migration, **kwargs))
+    return results
+
+
+# --- Registered migrations ---
+
+@register_migration(
+    "0001", "fix_thumbnail_backslashes", "playlists",
+    query={"thumbnail_url": {"$regex": r"\\"}},
+    projection={"thumbnail_url": 1}
+)
+def fix_thumbnail_backslashes(doc):
+    # Thumbnails saved on Windows before save_file normalized separators
+    old_url = doc.get("thumbnail_url")
+    if not old_url:
+        return None
+    return {"$set": {"thumbnail_url": old_url.replace("\\", "/")}}
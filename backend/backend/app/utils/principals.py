@@ -0,0 +1,77 @@
+# app/utils/principals.py
+"""
+Authenticated principals for JWT-protected routes.
+
+flask_jwt_extended calls load_principal() (registered as its user_lookup_loader
+in create_app) for every verified token; the result is available as
+`current_user`. Principals are cached per (identity, token issued-at) in a
+short-lived LRU TTLCache, so authenticated requests normally don't query the
+users collection. Changes to a user document drop its entries in every worker
+through the invalidation bus; the auth routes call invalidate_principal() after
+changing a user so this worker doesn't wait for the change stream. Changing the
+password (POST /api/auth/password) also sets password_changed_at, which revokes
+the tokens issued before it. admin_required() protects the internal admin
+endpoints (stats, jobs, profiles, catalog) with a token plus the admin role.
+"""
+import datetime
+from functools import wraps
+
+from bson import ObjectId
+from flask import jsonify
+from flask_jwt_extended import current_user, jwt_required
+
+from app.config import Config
+from app.repositories import repos
+from app.utils.cache import TTLCache
+from app.utils.invalidation import InvalidationEvent, invalidation_bus
+
+principal_cache = TTLCache(
+    "principals",
+    ttl=Config.PRINCIPAL_CACHE_TTL,
+    fallback_ttl=Config.PRINCIPAL_CACHE_FALLBACK_TTL,
+    maxsize=Config.PRINCIPAL_CACHE_SIZE,
+    collections=("users",),
+)
+
+
+def _issued_before(issued_at, changed_at):
+    if issued_at is None or changed_at is None:
+        return False
+    return issued_at < changed_at.replace(tzinfo=datetime.timezone.utc).timestamp()
+
+
+def load_principal(identity, issued_at=None):
+    """
+    Returns {"id", "username", "role"} for a token's identity, or None if the
+    user no longer exists or changed their password after the token was issued.
+    """
+    key = (identity, issued_at)
+    principal = principal_cache.get(key)
+    if principal is not None:
+        return principal
+    if not identity or not ObjectId.is_valid(identity):
+        return None
+    user = repos.users.get(ObjectId(identity), {"username": 1, "role": 1, "password_changed_at": 1})
+    if not user or _issued_before(issued_at, user.get("password_changed_at")):
+        return None
+    principal = {"id": str(user["_id"]), "username": user.get("username"), "role": user.get("role", "admin")}
+    principal_cache.set(key, principal, tags=[("users", identity)])
+    return principal
+
+
+def admin_required():
+    """jwt_required() that also rejects principals without the admin role (403)."""
+    def decorator(view):
+        @wraps(view)
+        @jwt_required()
+        def wrapper(*args, **kwargs):
+            if current_user.get("role") != "admin":
+                return jsonify({"msg": "Admin role required"}), 403
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def invalidate_principal(user_id):
+    """Drops cached principals of a user in this process (other workers follow via the change stream)."""
+    invalidation_bus.publish(InvalidationEvent("users", "update", str(user_id)))
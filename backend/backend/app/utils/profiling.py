@@ -0,0 +1,178 @@
+# app/utils/profiling.py
+"""
+Per-request sampling profiler.
+
+A request is profiled when an authenticated admin sends the X-Profile header,
+or when it falls in the PROFILE_SAMPLE_RATE fraction of all requests. While it
+runs, a helper thread samples the request thread's stack every
+PROFILE_INTERVAL_MS and counts collapsed stacks ("outer;inner;leaf"), which
+costs far less than a tracing profiler and shows whether time goes to Mongo,
+Pydantic, serialization or JSON encoding.
+
+Each profile is written as one JSON file to PROFILE_DIR; only the newest
+PROFILE_RING_SIZE files are kept. The admin API aggregates them per route into
+flamegraph input.
+"""
+import json
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+
+from flask import current_app, g, request
+
+PROFILE_HEADER = 'X-Profile'
+_MAX_DEPTH = 128
+_ring_lock = threading.Lock()
+
+
+class StackSampler:
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = {}
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    @staticmethod
+    def _collapse(frame):
+        parts = []
+        while frame is not None and len(parts) < _MAX_DEPTH:
+            code = frame.f_code
+            parts.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+            frame = frame.f_back
+        parts.reverse()
+        return ";".join(parts)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            key = self._collapse(frame)
+            self.stacks[key] = self.stacks.get(key, 0) + 1
+            self.samples += 1
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+
+def _is_admin_request():
+    from flask_jwt_extended import verify_jwt_in_request, get_current_user
+    try:
+        verify_jwt_in_request(optional=True)
+        principal = get_current_user()
+    except Exception:
+        return False
+    return bool(principal) and principal.get("role") == "admin"
+
+
+def _should_profile():
+    config = current_app.config
+    if not config['PROFILING_ENABLED']:
+        return False
+    if request.headers.get(PROFILE_HEADER):
+        return _is_admin_request()
+    rate = config['PROFILE_SAMPLE_RATE']
+    return rate > 0 and random.random() < rate
+
+
+def _store_profile(profile):
+    directory = current_app.config['PROFILE_DIR']
+    os.makedirs(directory, exist_ok=True)
+    # Millisecond timestamp first so names sort oldest -> newest
+    name = f"{int(time.time() * 1000):015d}-{uuid.uuid4().hex[:8]}.json"
+    with open(os.path.join(directory, name), "w", encoding="utf-8") as f:
+        json.dump(profile, f)
+    with _ring_lock:
+        files = sorted(n for n in os.listdir(directory) if n.endswith(".json"))
+        for old in files[:-current_app.config['PROFILE_RING_SIZE']]:
+            try:
+                os.remove(os.path.join(directory, old))
+            except OSError:
+                pass
+
+
+def load_profiles(route=None):
+    directory = current_app.config['PROFILE_DIR']
+    if not os.path.isdir(directory):
+        return []
+    profiles = []
+    for name in sorted(os.listdir(directory), reverse=True):
+        if not name.endswith(".json"):
+            continue
+        try:
+            with open(os.path.join(directory, name), encoding="utf-8") as f:
+                profile = json.load(f)
+        except (OSError, ValueError):
+            continue  # pruned or half-written meanwhile
+        if route is None or profile.get("route") == route:
+            profile["id"] = name[:-5]
+            profiles.append(profile)
+    return profiles
+
+
+def aggregate_stacks(profiles):
+    """Merges collapsed-stack counts of several profiles into one flamegraph input."""
+    merged = {}
+    for profile in profiles:
+        for stack, count in profile.get("stacks", {}).items():
+            merged[stack] = merged.get(stack, 0) + count
+    return merged
+
+
+def init_profiling(app):
+    @app.before_request
+    def _start_profiler():
+        if _should_profile():
+            interval = current_app.config['PROFILE_INTERVAL_MS'] / 1000.0
+            g.profiler = StackSampler(threading.get_ident(), interval).start()
+            g.profile_started = time.perf_counter()
+
+    @app.after_request
+    def _stop_profiler(response):
+        sampler = g.pop("profiler", None)
+        if sampler is None:
+            return response
+        profile = {
+            "route": request.endpoint,
+            "method": request.method,
+            "path": request.path,
+            "status": response.status_code,
+        }
+        started = g.pop("profile_started")
+        if response.is_streamed:
+            # A streamed list reads its cursor and encodes while the body is sent,
+            # so keep sampling until the server closes the response. The samples
+            # can't go in a header by then; they're in the stored profile.
+            app_obj = current_app._get_current_object()
+            response.call_on_close(lambda: _finish_profile(app_obj, sampler, started, profile))
+            return response
+        _finish_profile(current_app, sampler, started, profile)
+        response.headers['X-Profile-Samples'] = str(sampler.samples)
+        return response
+
+
+def _finish_profile(app, sampler, started, profile):
+    sampler.stop()
+    duration_ms = (time.perf_counter() - started) * 1000
+    try:
+        with app.app_context():
+            _store_profile({
+                **profile,
+                "started_at": time.time() - duration_ms / 1000,
+                "duration_ms": round(duration_ms, 2),
+                "interval_ms": app.config['PROFILE_INTERVAL_MS'],
+                "samples": sampler.samples,
+                "stacks": sampler.stacks,
+            })
+    except OSError as e:
+        app.logger.warning("Could not store profile: %s", e)
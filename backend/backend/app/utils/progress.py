@@ -0,0 +1,192 @@
+# app/utils/progress.py
+"""
+Per-device playback progress ("continue watching") with write coalescing.
+
+The player reports its position every few seconds (reports are rate limited
+per client). Each worker keeps only the latest report per (device, video) in
+memory and a background thread writes what changed every
+PROGRESS_FLUSH_INTERVAL seconds as one unordered bulk write. So a device
+watching for ten minutes costs a few upserts, not one per report. A report that finishes the episode (completed, or past
+PROGRESS_COMPLETE_RATIO of the duration) is written straight away. The buffer
+is also flushed early past PROGRESS_BUFFER_MAX_KEYS and at exit.
+
+`playback_progress` (repos.progress) holds one document per (device, video):
+    {_id: "<device>:<video_id>", device_id, video_id, position, duration, completed, updated_at}
+Writes only replace an older updated_at, so a slow flush from another worker
+can't move a position backwards. Continue-watching reads the index on
+(device_id, completed, updated_at) and overlays this worker's buffered reports.
+"""
+import atexit
+import datetime
+import re
+import threading
+
+from flask import current_app
+from pymongo.errors import PyMongoError
+
+from app.repositories import repos
+
+_DEVICE_ID = re.compile(r"^[A-Za-z0-9_-]{8,64}$")
+
+
+def valid_device_id(device_id):
+    return bool(_DEVICE_ID.match(device_id))
+
+
+def _progress_id(device_id, video_id):
+    return f"{device_id}:{video_id}"
+
+
+def progress_payload(record):
+    return {
+        "video_id": str(record["video_id"]),
+        "position": record["position"],
+        "duration": record.get("duration"),
+        "completed": record["completed"],
+        "updated_at": record["updated_at"].isoformat(),
+    }
+
+
+class ProgressBuffer:
+    def __init__(self):
+        self._pending = {}  # device_id -> {video_id: record}
+        self._durations = {}  # (device_id, video_id) -> last reported duration, for reports that leave it out
+        self._size = 0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+        self.app = None
+        self.reports = 0
+        self.writes = 0
+
+    def init_app(self, app):
+        self.app = app
+        atexit.register(self._flush_at_exit)
+
+    def stats(self):
+        return {"buffered": self._size, "reports": self.reports, "writes": self.writes}
+
+    # --- reports ---
+
+    def record(self, device_id, video_id, update):
+        """Buffers a ProgressUpdate; returns the record (written through if the episode is finished)."""
+        self._ensure_thread()
+        config = current_app.config
+        now = datetime.datetime.utcnow()
+        now = now.replace(microsecond=now.microsecond // 1000 * 1000)  # as stored (BSON dates are ms)
+        with self._lock:
+            if update.duration:
+                if len(self._durations) >= config['PROGRESS_BUFFER_MAX_KEYS']:
+                    self._durations.clear()
+                self._durations[device_id, video_id] = update.duration
+            duration = update.duration or self._durations.get((device_id, video_id))
+            videos = self._pending.setdefault(device_id, {})
+            previous = videos.get(video_id)
+            completed = update.completed or bool(duration and update.position >= duration * config['PROGRESS_COMPLETE_RATIO'])
+            record = {"video_id": video_id, "position": update.position, "duration": duration,
+                      "completed": completed, "updated_at": now}
+            if previous is None:
+                self._size += 1
+            videos[video_id] = record
+            self.reports += 1
+            if completed:
+                self._take_locked(device_id, video_id)
+            over_limit = self._size > config['PROGRESS_BUFFER_MAX_KEYS']
+        if completed:
+            self._write([(device_id, record)])
+        elif over_limit:
+            self.flush()
+        return record
+
+    def get(self, device_id, video_id):
+        """The latest record for (device, video), buffered or stored, or None."""
+        with self._lock:
+            record = self._pending.get(device_id, {}).get(video_id)
+        if record is not None:
+            return record
+        return repos.progress.get(_progress_id(device_id, video_id))
+
+    def continue_watching(self, device_id, limit):
+        """The device's `limit` most recently watched, unfinished videos (newest first)."""
+        with self._lock:
+            buffered = dict(self._pending.get(device_id, {}))
+        # buffered reports may finish some of the stored ones, so read that many extra
+        stored = repos.progress.in_progress(device_id, limit + len(buffered))
+        records = {r["video_id"]: r for r in stored}
+        records.update(buffered)
+        in_progress = [r for r in records.values() if not r["completed"]]
+        return sorted(in_progress, key=lambda r: r["updated_at"], reverse=True)[:limit]
+
+    # --- writing ---
+
+    def _take_locked(self, device_id, video_id):
+        videos = self._pending.get(device_id)
+        if videos and videos.pop(video_id, None) is not None:
+            self._size -= 1
+            if not videos:
+                del self._pending[device_id]
+
+    def flush(self):
+        """Writes every buffered record; returns how many."""
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending, self._size = self._pending, {}, 0
+            batch = [(device_id, record) for device_id, videos in pending.items() for record in videos.values()]
+            try:
+                self._write(batch)
+            except PyMongoError:
+                self._restore(pending)
+                raise
+            return len(batch)
+
+    def _restore(self, pending):
+        # put back what a failed flush didn't write, unless a newer report arrived meanwhile
+        with self._lock:
+            for device_id, videos in pending.items():
+                current = self._pending.setdefault(device_id, {})
+                for video_id, record in videos.items():
+                    if video_id not in current:
+                        current[video_id] = record
+                        self._size += 1
+
+    def _write(self, batch):
+        if not batch:
+            return
+        records = []
+        for device_id, record in batch:
+            fields = {"_id": _progress_id(device_id, record["video_id"]), "device_id": device_id, **record}
+            if fields["duration"] is None:
+                del fields["duration"]  # keep a duration stored earlier
+            records.append(fields)
+        repos.progress.write_many(records)
+        self.writes += len(records)
+
+    # --- background flushing ---
+
+    def _ensure_thread(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="progress-flush", daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        with self.app.app_context():
+            while not self._stop.wait(self.app.config['PROGRESS_FLUSH_INTERVAL']):
+                try:
+                    self.flush()
+                except PyMongoError as e:
+                    self.app.logger.warning("Could not write playback progress (will retry): %s", e)
+
+    def _flush_at_exit(self):
+        self._stop.set()
+        if self._size:
+            try:
+                with self.app.app_context():
+                    self.flush()
+            except Exception as e:
+                print(f"Could not write buffered playback progress at exit: {e}")
+
+
+progress_buffer = ProgressBuffer()
@@ -0,0 +1,152 @@
+# app/utils/rate_limit.py
+"""
+Token-bucket rate limiting for unauthenticated write endpoints.
+
+Each (client, route) pair gets a bucket holding up to `burst` tokens that refills
+at `per_second`. A request takes one token or is rejected with 429 before the
+route does any database work.
+
+Buckets live in fixed-size arrays (one float for tokens, one for the last refill
+time per slot) indexed through an LRU map, so memory stays bounded no matter
+how many clients show up; the least recently seen client is evicted when full.
+With RATE_LIMIT_STORAGE set to a sqlite path the buckets are shared by all
+workers on the host instead.
+"""
+import sqlite3
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from functools import wraps
+
+from flask import current_app, jsonify, request
+
+
+class TokenBucketLimiter:
+    def __init__(self, burst, per_second, max_keys=65536):
+        self.burst = float(burst)
+        self.per_second = float(per_second)
+        self.max_keys = max_keys
+        self._slots = OrderedDict()  # key -> slot index, in LRU order
+        self._tokens = array('d', bytes(8 * max_keys))
+        self._updated = array('d', bytes(8 * max_keys))
+        self._free = list(range(max_keys - 1, -1, -1))
+        self._lock = threading.Lock()
+
+    def allow(self, key, now=None):
+        """Takes a token for `key`. Returns (allowed, retry_after_seconds)."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            slot = self._slots.get(key)
+            if slot is None:
+                if self._free:
+                    slot = self._free.pop()
+                else:
+                    _, slot = self._slots.popitem(last=False)
+                self._slots[key] = slot
+                tokens = self.burst
+            else:
+                self._slots.move_to_end(key)
+                elapsed = now - self._updated[slot]
+                tokens = min(self.burst, self._tokens[slot] + elapsed * self.per_second)
+
+            self._updated[slot] = now
+            if tokens >= 1.0:
+                self._tokens[slot] = tokens - 1.0
+                return True, 0.0
+            self._tokens[slot] = tokens
+            return False, (1.0 - tokens) / self.per_second
+
+
+class SqliteTokenBucketLimiter:
+    """Same buckets kept in a local sqlite file so every worker process shares them."""
+
+    def __init__(self, path, burst, per_second, max_keys=65536):
+        self.path = path
+        self.burst = float(burst)
+        self.per_second = float(per_second)
+        self.max_keys = max_keys
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS buckets "
+                         "(key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)")
+            conn.execute("CREATE INDEX IF NOT EXISTS buckets_updated ON buckets (updated)")
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=1.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def allow(self, key, now=None):
+        # Wall clock, since monotonic clocks aren't comparable across processes
+        now = time.time() if now is None else now
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT tokens, updated FROM buckets WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                tokens = self.burst
+            else:
+                tokens = min(self.burst, row[0] + max(0.0, now - row[1]) * self.per_second)
+            allowed = tokens >= 1.0
+            if allowed:
+                tokens -= 1.0
+            conn.execute("INSERT OR REPLACE INTO buckets (key, tokens, updated) VALUES (?, ?, ?)",
+                         (key, tokens, now))
+            if row is None:
+                # Bound the table like the in-memory slots: drop the oldest buckets
+                conn.execute("DELETE FROM buckets WHERE key IN (SELECT key FROM buckets ORDER BY updated "
+                             "LIMIT max(0, (SELECT count(*) FROM buckets) - ?))", (self.max_keys,))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return (True, 0.0) if allowed else (False, (1.0 - tokens) / self.per_second)
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def _get_limiter(name):
+    with _limiters_lock:
+        limiter = _limiters.get(name)
+        if limiter is None:
+            config = current_app.config
+            burst, per_second = config['RATE_LIMITS'][name]
+            storage = config['RATE_LIMIT_STORAGE']
+            if storage:
+                limiter = SqliteTokenBucketLimiter(storage, burst, per_second, config['RATE_LIMIT_MAX_KEYS'])
+            else:
+                limiter = TokenBucketLimiter(burst, per_second, config['RATE_LIMIT_MAX_KEYS'])
+            _limiters[name] = limiter
+        return limiter
+
+
+def client_key():
+    if current_app.config['RATE_LIMIT_TRUST_PROXY'] and request.access_route:
+        return request.access_route[0]
+    return request.remote_addr or "unknown"
+
+
+def rate_limit(name):
+    """
+    Decorator applying the RATE_LIMITS[name] bucket to a route, keyed by client
+    address and endpoint. Place it directly under @<blueprint>.route.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if current_app.config['RATE_LIMIT_ENABLED']:
+                allowed, retry_after = _get_limiter(name).allow(f"{client_key()}|{request.endpoint}")
+                if not allowed:
+                    response = jsonify({"msg": "Too many requests, slow down"})
+                    response.status_code = 429
+                    response.headers['Retry-After'] = str(max(1, int(retry_after + 0.999)))
+                    return response
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
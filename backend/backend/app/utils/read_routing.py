@@ -0,0 +1,98 @@
+# app/utils/read_routing.py
+"""
+Read-preference routing.
+
+Public catalog reads (GET requests on the blueprints in PUBLIC_READ_BLUEPRINTS)
+may be served by secondaries with a max-staleness bound, so read load scales
+with replicas. Admin reads and all writes stay on the primary.
+
+Read-your-writes: after a successful mutation the client gets a short-lived
+pin cookie, and while it is present every read from that client goes to the
+primary, so an admin never sees a secondary that hasn't caught up yet.
+"""
+import threading
+from collections import Counter
+
+from flask import current_app, g, has_request_context, request
+from pymongo.read_preferences import SecondaryPreferred
+from app import mongo
+
+PRIMARY = "primary"
+SECONDARY_PREFERRED = "secondaryPreferred"
+
+_MUTATING_METHODS = {"POST", "PUT", "PATCH", "DELETE"}
+
+_stats = Counter()  # (endpoint, target) -> reads routed
+_stats_lock = threading.Lock()
+_catalog_db = None
+
+
+def _secondary_db():
+    global _catalog_db
+    if _catalog_db is None or _catalog_db.client is not mongo.cx:
+        max_staleness = current_app.config['PUBLIC_READ_MAX_STALENESS']
+        _catalog_db = mongo.db.with_options(read_preference=SecondaryPreferred(max_staleness=max_staleness))
+    return _catalog_db
+
+
+def _is_pinned():
+    return request.cookies.get(current_app.config['READ_PIN_COOKIE']) is not None
+
+
+def _route_target():
+    if not current_app.config['READ_ROUTING_ENABLED'] or not has_request_context():
+        return PRIMARY
+    if request.method != "GET" or request.blueprint not in current_app.config['PUBLIC_READ_BLUEPRINTS']:
+        return PRIMARY
+    if _is_pinned():
+        return PRIMARY
+    return SECONDARY_PREFERRED
+
+
+def read_db():
+    """
+    Database handle to use for a read in the current request (the repositories
+    read through it). Writes should keep using mongo.db directly. Reads of the
+    public blueprints are counted in read_routing_stats().
+    """
+    target = _route_target()
+    if has_request_context() and request.blueprint in current_app.config['PUBLIC_READ_BLUEPRINTS']:
+        g.read_preference = target
+        with _stats_lock:
+            _stats[(request.endpoint, target)] += 1
+    return _secondary_db() if target == SECONDARY_PREFERRED else mongo.db
+
+
+def read_routing_stats():
+    with _stats_lock:
+        items = list(_stats.items())
+    by_endpoint = {}
+    for (endpoint, target), count in items:
+        by_endpoint.setdefault(endpoint, {PRIMARY: 0, SECONDARY_PREFERRED: 0})[target] = count
+    return {
+        "enabled": current_app.config['READ_ROUTING_ENABLED'],
+        "max_staleness_seconds": current_app.config['PUBLIC_READ_MAX_STALENESS'],
+        "totals": {
+            PRIMARY: sum(c for (_, t), c in items if t == PRIMARY),
+            SECONDARY_PREFERRED: sum(c for (_, t), c in items if t == SECONDARY_PREFERRED),
+        },
+        "by_endpoint": by_endpoint,
+    }
+
+
+def init_read_routing(app):
+    @app.after_request
+    def _read_routing_headers(response):
+        target = g.get("read_preference")
+        if target:
+            response.headers['X-Read-Preference'] = target
+        # Pin this client to the primary for a while after it changes something
+        if (request.method in _MUTATING_METHODS and response.status_code < 400
+                and request.endpoint not in app.config['READ_PIN_EXEMPT_ENDPOINTS']):
+            response.set_cookie(
+                app.config['READ_PIN_COOKIE'], "1",
+                max_age=app.config['READ_PIN_SECONDS'],
+                httponly=True,
+                samesite="Lax"
+            )
+        return response
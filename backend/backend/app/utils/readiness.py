@@ -0,0 +1,151 @@
+# app/utils/readiness.py
+"""
+Liveness and readiness for the web workers.
+
+create_app no longer blocks on a MongoDB ping. A background thread runs the
+warm-up steps once (building the deferred Pydantic schemas, starting the
+password pool) and then checks MongoDB every READINESS_CHECK_INTERVAL seconds.
+It checks that the server answers a ping and that the indexes in
+REQUIRED_INDEXES exist. /readyz reports the last result, so a probe never
+waits on the database.
+
+migrate.py creates the indexes with ensure_indexes().
+"""
+import threading
+import time
+
+import pymongo
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import PyMongoError
+
+from app import mongo
+
+# collection -> index key lists (and create_index options) the app's queries rely on
+REQUIRED_INDEXES = {
+    "playlists": [
+        ([("region", ASCENDING), ("created_at", DESCENDING)], {}),
+        ([("created_at", DESCENDING)], {}),
+    ],
+    "videos": [
+        ([("playlist_id", ASCENDING), ("created_at", DESCENDING)], {}),
+        ([("created_at", DESCENDING)], {}),
+    ],
+    "advertisements": [
+        ([("target_video_id", ASCENDING)], {}),
+    ],
+    "channel_groups": [
+        ([("region", ASCENDING)], {}),
+    ],
+    "users": [
+        ([("username", ASCENDING)], {"unique": True}),
+    ],
+    "click_buckets": [
+        ([("day", ASCENDING), ("group_id", ASCENDING)], {}),
+    ],
+    "related_playlists": [
+        ([("bands", ASCENDING)], {}),
+        ([("related._id", ASCENDING)], {}),
+    ],
+    "playback_progress": [
+        ([("device_id", ASCENDING), ("completed", ASCENDING), ("updated_at", DESCENDING)], {}),
+        ([("video_id", ASCENDING)], {}),
+    ],
+}
+
+
+def ensure_indexes(db, log=print):
+    """Creates any missing REQUIRED_INDEXES (create_index is a no-op for existing ones)."""
+    for collection, indexes in REQUIRED_INDEXES.items():
+        for keys, options in indexes:
+            name = db[collection].create_index(keys, **options)
+            log(f"index {collection}.{name} ok")
+
+
+def missing_indexes(db, collections=None):
+    """["collection.field_1_other_-1", ...] for required indexes that don't exist."""
+    missing = []
+    for collection in collections or REQUIRED_INDEXES:
+        existing = {tuple(info["key"]) for info in db[collection].index_information().values()}
+        for keys, _ in REQUIRED_INDEXES[collection]:
+            if tuple(keys) not in existing:
+                missing.append(f"{collection}." + "_".join(f"{field}_{direction}" for field, direction in keys))
+    return missing
+
+
+class Readiness:
+    def __init__(self):
+        self.warmers = {}  # name -> fn, run once, in order, before the first check
+        self.state = {"ready": False, "warmed": False, "mongo": None, "missing_indexes": None, "checked_at": None}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def add_warmer(self, name, fn):
+        self.warmers[name] = fn
+
+    def init_app(self, app):
+        self.app = app
+        if app.config['READINESS_CHECK_INTERVAL'] <= 0:
+            # CLI scripts: no background thread, /readyz (if served) checks on request
+            self._update(warmed=True)
+        elif self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="readiness", daemon=True)
+            self._thread.start()
+
+    def _update(self, **fields):
+        with self._lock:
+            self.state.update(fields)
+            indexes_ok = not self.state["missing_indexes"] or not self.app.config['READINESS_REQUIRE_INDEXES']
+            self.state["ready"] = bool(self.state["warmed"] and self.state["mongo"] in ("ok", "skipped") and indexes_ok)
+
+    def warm(self):
+        timings = {}
+        for name, fn in self.warmers.items():
+            started = time.perf_counter()
+            try:
+                fn()
+            except Exception as e:  # a failed warm-up only costs the first request some latency
+                self.app.logger.warning(f"Warm-up step {name} failed: {e}")
+            timings[name] = round((time.perf_counter() - started) * 1000, 1)
+        self._update(warmed=True, warm_up_ms=timings)
+
+    def check(self):
+        """Pings MongoDB and looks for missing indexes; returns the new state."""
+        from app.repositories import repos
+
+        config = self.app.config
+        if repos.backend == "memory":  # benchmarking without a MongoDB server
+            self._update(mongo="skipped", missing_indexes=[], checked_at=time.time())
+            return self.snapshot()
+
+        was = self.state["mongo"]
+        try:
+            with pymongo.timeout(config['READINESS_TIMEOUT']):
+                mongo.db.command('ping')
+                missing = missing_indexes(mongo.db)
+        except PyMongoError as e:
+            if was != "unavailable":
+                print(f"MongoDB server not available: {e}")
+            self._update(mongo="unavailable", missing_indexes=None, checked_at=time.time())
+            return self.snapshot()
+
+        if was != "ok":
+            print("Successfully pinged MongoDB.")
+        if missing and missing != self.state["missing_indexes"]:
+            print(f"Missing indexes (run migrate.py): {', '.join(missing)}")
+        self._update(mongo="ok", missing_indexes=missing, checked_at=time.time())
+        return self.snapshot()
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.state)
+
+    def _run(self):
+        with self.app.app_context():
+            self.warm()
+            while True:
+                state = self.check()
+                # retry quickly until ready, then settle into the regular interval
+                time.sleep(self.app.config['READINESS_CHECK_INTERVAL'] if state["ready"] else 1)
+
+
+readiness = Readiness()
@@ -0,0 +1,231 @@
+# app/utils/related.py
+"""
+Precomputed "related series" per playlist: MinHash signatures + LSH.
+
+Each playlist becomes a set of features: its comma-separated keywords, genre,
+region and title words. Features hash to 31-bit ints, and the MinHash
+signature is the minimum of RELATED_BANDS * RELATED_ROWS_PER_BAND universal
+hashes of them. NumPy computes it for a whole batch of playlists at once.
+Signatures are cut into bands. Two playlists whose signatures agree on a whole
+band become candidates, and candidates are ranked by the share of equal
+signature slots (the estimated Jaccard similarity). No pairwise pass over the
+catalog is needed.
+
+Everything lives in `related_playlists` (repos.related), one document per playlist:
+    {_id, sig: <uint32 bytes>, bands: [int64, ...], related: [{_id, title, thumbnail_url, region, score}], updated_at}
+A multikey index on `bands` (see REQUIRED_INDEXES) turns the LSH bucket lookup into one query. So a
+changed playlist is re-scored on its own (update_related, run as a job), and
+GET /related is a single _id read.
+
+rebuild_related() recomputes everything; related.py runs it offline.
+"""
+import datetime
+import re
+import zlib
+
+from bson import Binary, ObjectId
+from flask import current_app
+
+from app.repositories import repos
+from app.utils.job_queue import job_handler, enqueue_job
+
+RELATED_UPDATE_PLAYLIST = "related_update_playlist"
+RELATED_REBUILD = "related_rebuild"
+
+_PRIME = (1 << 31) - 1
+_SEED = 1729  # fixed, so signatures from different runs and workers are comparable
+_PLAYLIST_PROJECTION = {"title": 1, "keywords": 1, "genre": 1, "region": 1, "thumbnail_url": 1}
+# Playlist fields that feed the signature or are copied into related entries
+RELATED_FIELDS = tuple(_PLAYLIST_PROJECTION)
+
+
+def playlist_features(doc):
+    """The playlist's feature set (the "shingles" its signature is built from)."""
+    features = set()
+    for keyword in (doc.get("keywords") or "").split(","):
+        keyword = keyword.strip().lower()
+        if keyword:
+            features.add("kw:" + keyword)
+    if doc.get("genre"):
+        features.add("genre:" + doc["genre"].strip().lower())
+    if doc.get("region"):
+        features.add("region:" + doc["region"].strip().lower())
+    features.update("title:" + w for w in re.findall(r"\w+", (doc.get("title") or "").lower()) if len(w) > 2)
+    return features
+
+
+class MinHasher:
+    def __init__(self, bands, rows):
+        import numpy as np  # only the job worker and related.py need NumPy
+
+        self.np = np
+        self.bands = bands
+        self.rows = rows
+        self.num_perm = bands * rows
+        rng = np.random.default_rng(_SEED)
+        self.a = rng.integers(1, _PRIME, self.num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, _PRIME, self.num_perm, dtype=np.uint64)
+        self.band_weights = rng.integers(1, 1 << 62, (bands, rows), dtype=np.uint64)
+
+    @classmethod
+    def from_config(cls):
+        return cls(current_app.config['RELATED_BANDS'], current_app.config['RELATED_ROWS_PER_BAND'])
+
+    def signatures(self, feature_sets):
+        """(n, num_perm) uint32 signatures; rows of empty feature sets are all _PRIME."""
+        np = self.np
+        sizes = np.array([len(f) for f in feature_sets], dtype=np.int64)
+        sigs = np.full((len(feature_sets), self.num_perm), _PRIME, dtype=np.uint64)
+        nonempty = np.flatnonzero(sizes)
+        if nonempty.size:
+            hashed = np.fromiter(
+                (zlib.crc32(f.encode("utf-8")) % _PRIME for i in nonempty for f in feature_sets[i]),
+                dtype=np.uint64, count=int(sizes.sum()),
+            )
+            # every feature through every hash function at once, then the minimum per playlist
+            values = (hashed[:, None] * self.a + self.b) % _PRIME
+            offsets = np.concatenate(([0], np.cumsum(sizes[nonempty])[:-1]))
+            sigs[nonempty] = np.minimum.reduceat(values, offsets, axis=0)
+        return sigs.astype(np.uint32)
+
+    def band_keys(self, sigs):
+        """(n, bands) LSH bucket keys as int64; the band number is in the top bits so bands never collide."""
+        np = self.np
+        banded = sigs.astype(np.uint64).reshape(len(sigs), self.bands, self.rows)
+        with np.errstate(over="ignore"):
+            mixed = (banded * self.band_weights).sum(axis=2)  # wraps mod 2**64
+        keys = (mixed >> np.uint64(9)) | (np.arange(self.bands, dtype=np.uint64) << np.uint64(55))
+        return keys.astype(np.int64)
+
+    def from_bytes(self, raw):
+        return self.np.frombuffer(raw, dtype=self.np.uint32)
+
+
+def _entry(doc, score):
+    return {
+        "_id": doc["_id"], "title": doc.get("title", ""), "thumbnail_url": doc.get("thumbnail_url", ""),
+        "region": doc.get("region", ""), "score": round(float(score), 4),
+    }
+
+
+def _top(entries, top_k):
+    return sorted(entries, key=lambda e: (-e["score"], str(e["_id"])))[:top_k]
+
+
+def rebuild_related(batch_size=1000, log=print):
+    """Recomputes every playlist's signature and related list; returns the number of playlists."""
+    config = current_app.config
+    top_k, min_score = config['RELATED_TOP_K'], config['RELATED_MIN_SCORE']
+    hasher = MinHasher.from_config()
+    np = hasher.np
+
+    docs = list(repos.playlists.list(projection=_PLAYLIST_PROJECTION, sort=("_id", 1)))
+    if not docs:
+        repos.related.clear()
+        return 0
+    sigs = np.concatenate([
+        hasher.signatures([playlist_features(d) for d in docs[i:i + batch_size]])
+        for i in range(0, len(docs), batch_size)
+    ])
+    keys = hasher.band_keys(sigs)
+    empty = (sigs == _PRIME).all(axis=1)
+
+    buckets = {}
+    for i in np.flatnonzero(~empty):
+        for key in keys[i]:
+            buckets.setdefault(int(key), []).append(i)
+
+    now = datetime.datetime.utcnow()
+    now = now.replace(microsecond=now.microsecond // 1000 * 1000)  # as stored (BSON dates are ms)
+    updates = []
+    for i, doc in enumerate(docs):
+        related = []
+        if not empty[i]:
+            candidates = np.array(sorted({j for key in keys[i] for j in buckets[int(key)] if j != i}), dtype=np.int64)
+            if candidates.size:
+                scores = (sigs[candidates] == sigs[i]).mean(axis=1)
+                best = np.argsort(-scores, kind="stable")[:top_k]
+                related = _top([_entry(docs[candidates[k]], scores[k]) for k in best if scores[k] >= min_score], top_k)
+        updates.append((doc["_id"], {
+            "sig": Binary(sigs[i].tobytes()), "bands": [] if empty[i] else keys[i].tolist(),
+            "related": related, "updated_at": now,
+        }, True))
+        if len(updates) >= batch_size:
+            repos.related.save_many(updates)
+            updates = []
+    repos.related.save_many(updates)
+    # playlists deleted since the last build
+    repos.related.delete_older_than(now)
+    log(f"related: {len(docs)} playlists, {len(buckets)} LSH buckets")
+    return len(docs)
+
+
+def remove_related(playlist_id):
+    """Drops a deleted playlist's document and its entries in other playlists' lists."""
+    repos.related.remove(playlist_id)
+
+
+def update_related(playlist_id):
+    """
+    Re-scores one playlist after it changed: its own list from the playlists
+    sharing an LSH bucket, and its entry in theirs (added, refreshed or removed).
+    """
+    playlist = repos.playlists.get(playlist_id, _PLAYLIST_PROJECTION)
+    if playlist is None:
+        remove_related(playlist_id)
+        return
+    config = current_app.config
+    top_k, min_score = config['RELATED_TOP_K'], config['RELATED_MIN_SCORE']
+    hasher = MinHasher.from_config()
+    np = hasher.np
+
+    sig = hasher.signatures([playlist_features(playlist)])[0]
+    empty = bool((sig == _PRIME).all())
+    bands = [] if empty else hasher.band_keys(sig[None, :])[0].tolist()
+
+    # candidates (one indexed query on bands) plus playlists that listed it before
+    neighbours = repos.related.neighbours(playlist_id, bands, {"sig": 1, "related": 1, "bands": 1})
+    shared = set(bands)
+    scored = []
+    for n in neighbours:
+        score = 0.0
+        if shared.intersection(n.get("bands", ())):
+            score = float((hasher.from_bytes(n["sig"]) == sig).mean())
+        scored.append((n, score))
+
+    summaries = {}
+    candidate_ids = [n["_id"] for n, score in scored if score >= min_score]
+    if candidate_ids:
+        summaries = repos.playlists.get_many(candidate_ids, _PLAYLIST_PROJECTION)
+
+    now = datetime.datetime.utcnow()
+    own = [_entry(summaries[n["_id"]], score) for n, score in scored if n["_id"] in summaries]
+    updates = [(playlist_id, {
+        "sig": Binary(sig.tobytes()), "bands": bands, "related": _top(own, top_k), "updated_at": now,
+    }, True)]
+    for n, score in scored:
+        others = [e for e in n.get("related", []) if e["_id"] != playlist_id]
+        if n["_id"] in summaries:
+            others.append(_entry(playlist, score))
+        related = _top(others, top_k)
+        if related != n.get("related", []):
+            updates.append((n["_id"], {"related": related}, False))
+    repos.related.save_many(updates)
+
+
+def enqueue_related_update(playlist_id):
+    """
+    Schedules update_related for a created or edited playlist. It is one job
+    insert through repos.jobs, so routes count it in their round-trip budget.
+    """
+    return enqueue_job(RELATED_UPDATE_PLAYLIST, {"playlist_id": str(playlist_id)})
+
+
+@job_handler(RELATED_UPDATE_PLAYLIST)
+def related_update_playlist(payload, job):
+    update_related(ObjectId(payload["playlist_id"]))
+
+
+@job_handler(RELATED_REBUILD)
+def related_rebuild(payload, job):
+    rebuild_related(log=current_app.logger.info)
@@ -0,0 +1,72 @@
+# app/utils/responses.py
+from flask import current_app, stream_with_context
+
+from app.utils.http_cache import with_etag
+
+
+def json_body_response(body, status=200):
+    """Response for an already-encoded JSON body (str or bytes)."""
+    return current_app.response_class(body, status=status, mimetype='application/json')
+
+
+def model_response(model, status=200, exclude=None):
+    """Serializes a Pydantic model with its own serializer, skipping the dict + jsonify round."""
+    return json_body_response(model.model_dump_json(by_alias=True, exclude=exclude), status)
+
+
+def models_response(adapter, models, status=200, exclude=None):
+    """Serializes a list of models with a module-level TypeAdapter (see app/models.py) to bytes."""
+    if exclude is not None:
+        exclude = {'__all__': exclude}
+    return json_body_response(adapter.dump_json(models, by_alias=True, exclude=exclude), status)
+
+
+def _json_array_chunks(items, encode, chunk_bytes):
+    buffered, size = ["["], 1
+    separator = ""
+    count = 0
+    try:
+        for item in items:
+            piece = separator + encode(item)
+            separator = ","
+            buffered.append(piece)
+            size += len(piece)
+            count += 1
+            if size >= chunk_bytes:
+                yield "".join(buffered)
+                buffered, size = [], 0
+    except Exception:
+        # The status line is gone already. Re-raising makes the server drop the
+        # connection without the closing chunk, so the client sees an incomplete
+        # transfer instead of a 200 with a short (or unterminated) array.
+        current_app.logger.exception("Streamed list response failed after %d items, aborting it", count)
+        raise
+    buffered.append("]")
+    yield "".join(buffered)
+
+
+def json_array_response(items, encode=None, etag=None, status=200):
+    """
+    JSON array response for an iterable of documents, usually a cursor.
+
+    With STREAM_LIST_RESPONSES on, items are encoded one by one as the cursor
+    yields them and written in STREAM_CHUNK_BYTES chunks, so memory stays flat
+    and the first bytes go out before the last document is read. `encode` turns
+    one item into JSON text (default: the app's JSON provider, as jsonify uses).
+    A streamed response is profiled and round-trip budgeted until it is closed
+    (see app/utils/profiling.py and app/utils/round_trips.py). If the cursor
+    fails midway the error is logged and the chunked response is aborted.
+    """
+    encode = encode or current_app.json.dumps
+    if current_app.config['STREAM_LIST_RESPONSES']:
+        body = stream_with_context(_json_array_chunks(items, encode, current_app.config['STREAM_CHUNK_BYTES']))
+    else:
+        body = "[" + ",".join(encode(item) for item in items) + "]"
+    response = current_app.response_class(body, status=status, mimetype='application/json')
+    if etag:
+        with_etag(response, etag)
+    return response
+
+
+def encode_model(model):
+    return model.model_dump_json(by_alias=True)
@@ -0,0 +1,116 @@
+# app/utils/round_trips.py
+"""
+Per-request database round-trip accounting.
+
+Every Mongo command issued while handling a request is counted (a PyMongo
+CommandListener on the shared client; the in-memory storage backend counts its
+operations the same way). Routes declare how many round-trips they may use with
+@round_trip_budget(n). Going over budget is logged, and raises
+RoundTripBudgetExceeded when ROUND_TRIP_BUDGET_STRICT is on (the default in
+debug and testing), so a regression shows up as soon as the route is exercised.
+
+Streamed list responses (json_array_response) read their cursor while the body
+is sent. Their round-trips are counted until the response is closed and checked
+against the budget then, and they carry no X-DB-Round-Trips header. A long
+listing needs a getMore per further cursor batch; the budget allows those, plus
+`per_batch` more for routes that query once per batch (e.g. grouped counts).
+"""
+from functools import wraps
+
+from flask import current_app, g, has_request_context
+from pymongo import monitoring
+
+
+class RoundTripBudgetExceeded(Exception):
+    pass
+
+
+def record_round_trip():
+    if has_request_context():
+        g.mongo_round_trips = g.get("mongo_round_trips", 0) + 1
+
+
+def record_get_more():
+    """Counts a round-trip that fetches a further batch of an open cursor."""
+    record_round_trip()
+    if has_request_context():
+        g.mongo_get_mores = g.get("mongo_get_mores", 0) + 1
+
+
+def round_trips_so_far():
+    return g.get("mongo_round_trips", 0)
+
+
+class RoundTripCounter(monitoring.CommandListener):
+    def started(self, event):
+        if event.command_name == "getMore":
+            record_get_more()
+        else:
+            record_round_trip()
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+round_trip_counter = RoundTripCounter()
+
+
+def _strict():
+    strict = current_app.config.get('ROUND_TRIP_BUDGET_STRICT')
+    if strict is None:
+        return current_app.debug or current_app.testing
+    return strict
+
+
+def round_trip_budget(limit, per_batch=0):
+    """
+    Declares the maximum number of database round-trips a route may make.
+    A streamed listing may also use a getMore plus `per_batch` round-trips for
+    each cursor batch after the first.
+    """
+    def decorator(view):
+        view.round_trip_budget = limit
+
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            before = round_trips_so_far()
+            get_mores_before = g.get("mongo_get_mores", 0)
+            response = view(*args, **kwargs)
+            g.round_trip_budget = limit
+            request_g, app, strict = g._get_current_object(), current_app._get_current_object(), _strict()
+
+            def check():
+                batches = request_g.get("mongo_get_mores", 0) - get_mores_before
+                used = request_g.get("mongo_round_trips", 0) - before
+                _check_budget(app, view, limit + batches * (1 + per_batch), used, strict)
+            if getattr(response, "is_streamed", False):
+                # The cursor is read while the body streams; check once it's sent
+                response.call_on_close(check)
+            else:
+                check()
+            return response
+        return wrapper
+    return decorator
+
+
+def _check_budget(app, view, limit, used, strict):
+    if used > limit:
+        message = f"{view.__name__} used {used} database round-trips, budget is {limit}"
+        if strict:
+            raise RoundTripBudgetExceeded(message)
+        app.logger.warning(message)
+
+
+def init_round_trips(app):
+    @app.after_request
+    def _round_trip_header(response):
+        # A streamed response does most of its reads after the headers are sent,
+        # so it gets no header; its budget is still checked when it finishes.
+        if response.is_streamed:
+            return response
+        if "mongo_round_trips" in g or "round_trip_budget" in g:
+            response.headers['X-DB-Round-Trips'] = str(round_trips_so_far())
+        return response
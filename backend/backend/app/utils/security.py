@@ -1,12 +1,118 @@
 # app/utils/security.py
+"""
+Password hashing with bcrypt, off the request threads.
+
+bcrypt is deliberately CPU-heavy, so hashing and verification run in a small
+process pool (PASSWORD_POOL_PROCESSES) instead of on the web worker's threads;
+a login burst then queues for those processes while catalog requests keep
+their CPU. At most PASSWORD_POOL_MAX_PENDING operations may be running or
+queued; beyond that, and when a result takes longer than
+PASSWORD_POOL_TIMEOUT, PasswordPoolBusy is raised so the route can fail fast
+with 503 instead of piling up requests.
+
+New hashes use BCRYPT_ROUNDS; needs_rehash() tells whether a stored hash was
+made with a different cost so login can upgrade it.
+"""
+import atexit
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
 import bcrypt
+from flask import current_app
+
+
+class PasswordPoolBusy(Exception):
+    """Too many password operations in flight; retry later."""
+
+
+def _hash(password: bytes, rounds: int) -> bytes:
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds))
+
+
+def _verify(password: bytes, hashed: bytes) -> bool:
+    return bcrypt.checkpw(password, hashed)
+
+
+class PasswordPool:
+    def __init__(self):
+        self._executor = None
+        self._slots = None
+        self._lock = threading.Lock()
+
+    def _ensure_started(self, config):
+        with self._lock:
+            if self._executor is None:
+                # Never fork: the web process already runs threads (invalidation bus, job
+                # worker, PyMongo monitors) whose locks a forked child could inherit held.
+                # Workers start from a clean interpreter and import only this module's
+                # dependencies; run.py skips building the app when imported as __mp_main__.
+                method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+                self._executor = ProcessPoolExecutor(
+                    max_workers=config['PASSWORD_POOL_PROCESSES'],
+                    mp_context=multiprocessing.get_context(method),
+                )
+            if self._slots is None:
+                self._slots = threading.BoundedSemaphore(config['PASSWORD_POOL_MAX_PENDING'])
+                atexit.register(self.shutdown)
+
+    def run(self, fn, *args):
+        config = current_app.config
+        if config['PASSWORD_POOL_PROCESSES'] <= 0:
+            return fn(*args)
+        self._ensure_started(config)
+        if not self._slots.acquire(blocking=False):
+            raise PasswordPoolBusy()
+        try:
+            future = self._executor.submit(fn, *args)
+        except BrokenProcessPool:
+            self._slots.release()
+            self._reset()
+            raise PasswordPoolBusy()
+        # The slot stays taken until the process is done, even if we stop waiting
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=config['PASSWORD_POOL_TIMEOUT'])
+        except FutureTimeoutError:
+            raise PasswordPoolBusy()
+        except BrokenProcessPool:
+            self._reset()
+            raise PasswordPoolBusy()
+
+    def warm(self):
+        """Starts the worker processes now rather than on the first login."""
+        self.run(_hash, b"warm-up", 4)
+
+    def _reset(self):
+        """Drops a broken executor (a worker process died) so the next call starts a new one."""
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+    def shutdown(self):
+        self._reset()
+
+
+password_pool = PasswordPool()
+
 
 def hash_password(password: str) -> str:
-    """Hashes a password using bcrypt."""
-    salt = bcrypt.gensalt()
-    hashed_password = bcrypt.hashpw(password.encode('utf-8'), salt)
+    """Hashes a password using bcrypt with BCRYPT_ROUNDS."""
+    hashed_password = password_pool.run(_hash, password.encode('utf-8'), current_app.config['BCRYPT_ROUNDS'])
     return hashed_password.decode('utf-8')
 
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verifies a plain password against a hashed password."""
-    return bcrypt.checkpw(plain_password.encode('utf-8'), hashed_password.encode('utf-8'))
\ No newline at end of file
+    return password_pool.run(_verify, plain_password.encode('utf-8'), hashed_password.encode('utf-8'))
+
+
+def needs_rehash(hashed_password: str) -> bool:
+    """True if the hash was made with a different work factor than BCRYPT_ROUNDS."""
+    try:
+        rounds = int(hashed_password.split('$')[2])  # $2b$<rounds>$<salt+hash>
+    except (IndexError, ValueError):
+        return True
+    return rounds != current_app.config['BCRYPT_ROUNDS']
@@ -0,0 +1,201 @@
+# app/utils/slow_queries.py
+"""
+Slow-query log.
+
+A PyMongo CommandListener times every command. Commands slower than
+SLOW_QUERY_THRESHOLD_MS are recorded with the route that issued them and the
+shape of their filter/pipeline (literal values replaced by "?", so records
+group by query shape and carry no user data). A sampled fraction also gets an
+`explain` (queryPlanner) captured. Recording and explaining happen on a
+background thread, off the request path, and records go to the capped
+`slow_queries` collection browsable from the admin API.
+"""
+import datetime
+import hashlib
+import json
+import queue
+import random
+import threading
+
+from flask import has_request_context, request
+from pymongo import monitoring
+from pymongo.errors import CollectionInvalid, PyMongoError
+
+SLOW_QUERY_COLLECTION = "slow_queries"
+
+# Where each command keeps the part that determines its query shape
+_SHAPE_FIELDS = {
+    "find": ("filter", "sort", "projection"),
+    "aggregate": ("pipeline",),
+    "count": ("query",),
+    "distinct": ("key", "query"),
+    "findAndModify": ("query", "sort"),
+    "update": ("updates",),
+    "delete": ("deletes",),
+}
+_EXPLAINABLE = {"find", "aggregate", "count", "distinct", "findAndModify", "update", "delete"}
+# Driver/session fields that must not be passed back into explain
+_COMMAND_META = {"$db", "lsid", "$clusterTime", "txnNumber", "$readPreference", "readConcern", "writeConcern"}
+_IGNORED_COMMANDS = {"explain", "hello", "isMaster", "ismaster", "ping", "endSessions", "saslStart", "saslContinue"}
+
+
+def redact(value):
+    """Replaces literal values with "?" while keeping keys, operators and $field references."""
+    if isinstance(value, dict):
+        return {k: redact(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        shapes = []
+        for v in value:
+            shape = redact(v)
+            if shape not in shapes:
+                shapes.append(shape)
+        return shapes
+    if isinstance(value, str) and value.startswith("$"):
+        return value
+    return "?"
+
+
+# Stage arguments that name collections or fields rather than carry values
+_NAME_KEYS = {"from", "localField", "foreignField", "as", "connectFromField", "connectToField",
+              "coll", "into", "includeArrayIndex"}
+
+
+def _pipeline_shape(pipeline):
+    """The stages in order, with every literal replaced by "?" (sub-pipelines and expressions included)."""
+    return [_stage_shape(stage) for stage in pipeline]
+
+
+def _stage_shape(stage):
+    shape = {}
+    for name, spec in stage.items():
+        if name == "$sort":
+            shape[name] = spec  # only field names and directions
+        elif name == "$facet":
+            shape[name] = {facet: _pipeline_shape(sub) for facet, sub in spec.items()}
+        elif isinstance(spec, dict):
+            shape[name] = {
+                k: _pipeline_shape(v) if k == "pipeline" else v if k in _NAME_KEYS else redact(v)
+                for k, v in spec.items()
+            }
+        else:
+            shape[name] = redact(spec)  # $limit / $skip counts, $unwind paths, ...
+    return shape
+
+
+def command_collection(command_name, command):
+    """The collection a command runs on (a getMore's own value is its cursor id)."""
+    if command_name == "getMore":
+        return command.get("collection")
+    return command.get(command_name)
+
+
+def command_shape(command_name, command):
+    shape = {}
+    for field in _SHAPE_FIELDS.get(command_name, ()):
+        if field not in command:
+            continue
+        if command_name in ("update", "delete"):
+            # keep only the filters of each statement, not the new values
+            shape[field] = redact([{"q": stmt.get("q")} for stmt in command[field]])
+        elif field == "pipeline":
+            shape[field] = _pipeline_shape(command[field])
+        elif field in ("sort", "projection", "key"):
+            shape[field] = command[field]
+        else:
+            shape[field] = redact(command[field])
+    return shape
+
+
+class SlowQueryListener(monitoring.CommandListener):
+    def __init__(self):
+        self.app = None
+        self._pending = {}
+        self._queue = queue.Queue(maxsize=1000)
+        self._thread = None
+
+    def init_app(self, app):
+        self.app = app
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="slow-query-log", daemon=True)
+            self._thread.start()
+
+    def _enabled(self):
+        return self.app is not None and self.app.config['SLOW_QUERY_LOG_ENABLED']
+
+    def started(self, event):
+        if not self._enabled() or event.command_name in _IGNORED_COMMANDS:
+            return
+        if command_collection(event.command_name, event.command) == SLOW_QUERY_COLLECTION:
+            return  # our own writes
+        route = request.endpoint if has_request_context() else None
+        self._pending[(event.connection_id, event.request_id)] = (event.command, route)
+
+    def _finished(self, event, failure=None):
+        pending = self._pending.pop((event.connection_id, event.request_id), None)
+        if pending is None:
+            return
+        duration_ms = event.duration_micros / 1000.0
+        if duration_ms < self.app.config['SLOW_QUERY_THRESHOLD_MS']:
+            return
+        command, route = pending
+        try:
+            self._queue.put_nowait((event.command_name, event.database_name, command, route, duration_ms, failure))
+        except queue.Full:
+            pass  # never slow down requests for the sake of the log
+
+    def succeeded(self, event):
+        self._finished(event)
+
+    def failed(self, event):
+        self._finished(event, failure=str(event.failure))
+
+    # --- background recording ---
+
+    def _ensure_collection(self, db):
+        try:
+            db.create_collection(SLOW_QUERY_COLLECTION, capped=True, size=self.app.config['SLOW_QUERY_LOG_BYTES'])
+        except CollectionInvalid:
+            pass  # already exists
+
+    def _explain(self, db, command_name, command):
+        explain_cmd = {k: v for k, v in command.items() if k not in _COMMAND_META}
+        result = db.command("explain", explain_cmd, verbosity="queryPlanner")
+        planner = result.get("queryPlanner") or {}
+        # The winning plan is what tells us about missing indexes (COLLSCAN vs IXSCAN)
+        return {"winningPlan": planner.get("winningPlan"), "namespace": planner.get("namespace")}
+
+    def _run(self):
+        from app import mongo
+        collection_ready = False
+        while True:
+            command_name, db_name, command, route, duration_ms, failure = self._queue.get()
+            try:
+                db = mongo.cx[db_name]
+                if not collection_ready:
+                    self._ensure_collection(mongo.db)
+                    collection_ready = True
+                collection = command_collection(command_name, command)
+                shape = command_shape(command_name, command)
+                shape_key = json.dumps([command_name, collection, shape], sort_keys=True, default=str)
+                record = {
+                    "at": datetime.datetime.utcnow(),
+                    "route": route,
+                    "command": command_name,
+                    "collection": collection,
+                    "shape": shape,
+                    "shape_hash": hashlib.sha1(shape_key.encode("utf-8")).hexdigest()[:16],
+                    "duration_ms": round(duration_ms, 2),
+                    "error": failure,
+                }
+                if (command_name in _EXPLAINABLE and failure is None
+                        and random.random() < self.app.config['SLOW_QUERY_EXPLAIN_SAMPLE_RATE']):
+                    try:
+                        record["explain"] = self._explain(db, command_name, command)
+                    except PyMongoError as e:
+                        record["explain_error"] = str(e)
+                mongo.db[SLOW_QUERY_COLLECTION].insert_one(record)
+            except Exception as e:
+                self.app.logger.warning("Could not record slow query: %s", e)
+
+
+slow_query_listener = SlowQueryListener()
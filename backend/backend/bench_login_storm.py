@@ -0,0 +1,89 @@
+"""
+Measures public catalog latency while a login storm is running.
+
+Against a running backend, the script first samples GET
+/api/public_data/playlists on its own (baseline). It then samples it again
+while --login-threads threads keep posting logins, and reports latency
+percentiles for both phases together with the login status codes. 503/429
+responses show the password pool's queue limit and the login rate limit
+shedding load. Compare runs with PASSWORD_POOL_PROCESSES=0 (bcrypt on the
+request threads) and with the pool enabled. Use RATE_LIMIT_ENABLED=false to
+measure the pool alone.
+
+Usage:
+    python bench_login_storm.py --base-url http://127.0.0.1:5001 --username admin --password secret
+"""
+import argparse
+import json
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+
+
+def _request(url, body=None):
+    data = None if body is None else json.dumps(body).encode("utf-8")
+    req = urllib.request.Request(url, data=data, headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(req, timeout=60) as resp:
+            resp.read()
+            return resp.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+def sample_catalog(base_url, seconds):
+    latencies = []
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        started = time.perf_counter()
+        _request(f"{base_url}/api/public_data/playlists")
+        latencies.append((time.perf_counter() - started) * 1000)
+    return latencies
+
+
+def summarize(name, latencies):
+    latencies = sorted(latencies)
+    pct = lambda p: latencies[min(len(latencies) - 1, int(len(latencies) * p))]
+    print(f"{name:<14} n={len(latencies):<5} p50={statistics.median(latencies):8.1f}ms "
+          f"p95={pct(0.95):8.1f}ms p99={pct(0.99):8.1f}ms max={latencies[-1]:8.1f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Catalog latency during a login storm")
+    parser.add_argument("--base-url", default="http://127.0.0.1:5001")
+    parser.add_argument("--username", required=True)
+    parser.add_argument("--password", required=True)
+    parser.add_argument("--login-threads", type=int, default=32)
+    parser.add_argument("--seconds", type=float, default=10.0, help="duration of each phase")
+    args = parser.parse_args()
+
+    summarize("baseline", sample_catalog(args.base_url, args.seconds))
+
+    stop = threading.Event()
+    statuses = Counter()
+    lock = threading.Lock()
+
+    def storm():
+        while not stop.is_set():
+            status = _request(f"{args.base_url}/api/auth/login",
+                              {"username": args.username, "password": args.password})
+            with lock:
+                statuses[status] += 1
+
+    threads = [threading.Thread(target=storm, daemon=True) for _ in range(args.login_threads)]
+    for t in threads:
+        t.start()
+    try:
+        summarize("login storm", sample_catalog(args.base_url, args.seconds))
+    finally:
+        stop.set()
+        for t in threads:
+            t.join()
+    print("login responses:", dict(sorted(statuses.items())))
+
+
+if __name__ == "__main__":
+    main()
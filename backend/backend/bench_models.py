@@ -0,0 +1,75 @@
+"""
+Benchmarks the Pydantic request/response paths.
+
+Compares the v1-compat calls the routes used to make (parse_obj / parse_raw /
+.dict() followed by jsonify's bson.json_util encoding) with the v2-native path
+(model_validate / model_validate_json, model_dump_json and the module-level
+TypeAdapters) on create, update and read payloads. Needs no database.
+
+Usage:
+    python bench_models.py               # default 20000 iterations per case
+    python bench_models.py --number 5000
+"""
+import argparse
+import datetime
+import json
+import timeit
+import warnings
+
+from bson import ObjectId, json_util
+
+from app.models import (
+    AdCreate, ChannelGroupCreate, ChannelGroupUpdate, VideoInDB, VideoUpdate, VideoListAdapter,
+)
+
+warnings.simplefilter("ignore")  # the v1-compat calls emit deprecation warnings
+
+NOW = datetime.datetime.utcnow()
+VIDEO_DOC = {
+    "_id": ObjectId(), "playlist_id": ObjectId(), "title": "Episode 1",
+    "description": "The first episode", "keywords": "drama,series",
+    "video_link": "https://www.youtube.com/embed/abc123", "views": 1200, "likes": 34,
+    "region": "English", "created_at": NOW, "updated_at": NOW,
+}
+VIDEO_DOCS = [dict(VIDEO_DOC, _id=ObjectId()) for _ in range(50)]
+AD_JSON = json.dumps({"target_video_id": str(ObjectId()), "placement": "before"})
+GROUP_BODY = {"region": "English", "type": "Telegram", "link": "https://t.me/example"}
+VIDEO_UPDATE_BODY = {"title": "Episode 1 (edited)", "video_link": "https://www.youtube.com/embed/xyz"}
+
+CASES = [
+    ("create: ad (raw JSON)",
+     lambda: AdCreate.parse_raw(AD_JSON).dict(),
+     lambda: AdCreate.model_validate_json(AD_JSON).model_dump()),
+    ("create: channel group",
+     lambda: ChannelGroupCreate(**GROUP_BODY).dict(),
+     lambda: ChannelGroupCreate.model_validate(GROUP_BODY).model_dump(mode='json')),
+    ("update: video",
+     lambda: VideoUpdate(**VIDEO_UPDATE_BODY).dict(exclude_unset=True),
+     lambda: VideoUpdate.model_validate(VIDEO_UPDATE_BODY).model_dump(mode='json', exclude_unset=True)),
+    ("update: channel group",
+     lambda: ChannelGroupUpdate(**{"type": "WhatsApp"}).dict(exclude_unset=True),
+     lambda: ChannelGroupUpdate.model_validate({"type": "WhatsApp"}).model_dump(mode='json', exclude_unset=True)),
+    ("read: one video",
+     lambda: json_util.dumps(VideoInDB.parse_obj(VIDEO_DOC).dict(by_alias=True)),
+     lambda: VideoInDB.model_validate(VIDEO_DOC).model_dump_json(by_alias=True)),
+    ("read: 50 videos",
+     lambda: json_util.dumps([VideoInDB.parse_obj(d).dict(by_alias=True) for d in VIDEO_DOCS]),
+     lambda: VideoListAdapter.dump_json(VideoListAdapter.validate_python(VIDEO_DOCS), by_alias=True)),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark v1-compat vs v2-native Pydantic paths")
+    parser.add_argument("--number", type=int, default=20000, help="iterations per case")
+    args = parser.parse_args()
+
+    print(f"{'case':<24}{'v1-compat us':>14}{'v2-native us':>14}{'speedup':>10}")
+    for name, before, after in CASES:
+        number = args.number if "50" not in name else max(1, args.number // 50)
+        t_before = min(timeit.repeat(before, number=number, repeat=3)) / number * 1e6
+        t_after = min(timeit.repeat(after, number=number, repeat=3)) / number * 1e6
+        print(f"{name:<24}{t_before:>14.2f}{t_after:>14.2f}{t_before / t_after:>9.1f}x")
+
+
+if __name__ == '__main__':
+    main()
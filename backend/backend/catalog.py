@@ -0,0 +1,67 @@
+# catalog.py
+# Bulk NDJSON import/export of playlists and videos (see app/utils/catalog_io.py):
+#   python catalog.py export catalog.ndjson [--region English]
+#   python catalog.py import catalog.ndjson [--ordered] [--upsert] [--chunk-size 500]
+# Use "-" as the file to read stdin / write stdout.
+import argparse
+import json
+import os
+import sys
+
+os.environ['JOB_WORKER_IN_PROCESS'] = 'false'
+os.environ['READINESS_CHECK_INTERVAL'] = '0'
+
+from app import create_app
+from app.utils.catalog_io import export_catalog, import_catalog
+from app.utils.job_queue import enqueue_job
+from app.utils.related import RELATED_REBUILD
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import or export the catalog as NDJSON")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = sub.add_parser("export", help="write playlists and videos as NDJSON")
+    export_parser.add_argument("file")
+    export_parser.add_argument("--region")
+    export_parser.add_argument("--batch-size", type=int, default=1000)
+
+    import_parser = sub.add_parser("import", help="read playlists and videos from NDJSON")
+    import_parser.add_argument("file")
+    import_parser.add_argument("--ordered", action="store_true", help="stop at the first failing line")
+    import_parser.add_argument("--upsert", action="store_true", help="replace documents with the same _id")
+    import_parser.add_argument("--chunk-size", type=int, default=500)
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        if args.command == "export":
+            out = sys.stdout if args.file == "-" else open(args.file, "w", encoding="utf-8")
+            count = 0
+            try:
+                for line in export_catalog(region=args.region, batch_size=args.batch_size):
+                    out.write(line)
+                    count += 1
+            finally:
+                if out is not sys.stdout:
+                    out.close()
+            print(f"✅ Exported {count} documents", file=sys.stderr)
+            return
+
+        source = sys.stdin if args.file == "-" else open(args.file, encoding="utf-8")
+        with source:
+            report = import_catalog(source, chunk_size=args.chunk_size,
+                                    ordered=args.ordered, upsert=args.upsert, max_errors=sys.maxsize)
+        if report["inserted"]["playlists"] or report["replaced"]["playlists"]:
+            # run by the job worker, as after an import through the admin API
+            enqueue_job(RELATED_REBUILD, {})
+        for error in report["errors"]:
+            print(f"line {error['line']}: {error['error']}", file=sys.stderr)
+        summary = {k: v for k, v in report.items() if k != "errors"}
+        print(json.dumps(summary), file=sys.stderr)
+        if report["error_count"]:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
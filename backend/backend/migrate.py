@@ -0,0 +1,53 @@
+# migrate.py
+# Runs data migrations from app/utils/migrations.py:
+#   python migrate.py                 apply all pending migrations
+#   python migrate.py --list          show applied/pending migrations
+#   python migrate.py --dry-run       scan and report what would change, without writing
+# Applying also creates the indexes /readyz checks for (app/utils/readiness.py).
+import argparse
+import os
+
+os.environ['JOB_WORKER_IN_PROCESS'] = 'false'
+os.environ['READINESS_CHECK_INTERVAL'] = '0'
+
+from app import create_app, mongo
+from app.utils.migrations import migration_status, run_pending
+from app.utils.readiness import ensure_indexes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply data migrations")
+    parser.add_argument("--list", action="store_true", help="list migrations and their status")
+    parser.add_argument("--dry-run", action="store_true", help="report changes without writing")
+    parser.add_argument("--target", help="stop after this migration version")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--max-docs-per-second", type=float, default=None,
+                        help="throttle to limit load on the live cluster")
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        if args.list:
+            for migration, record in migration_status(mongo.db):
+                status = record.get("status") if record else "pending"
+                print(f"{migration.version}  {migration.name:<40} {status}")
+            return
+
+        results = run_pending(
+            mongo.db,
+            target=args.target,
+            batch_size=args.batch_size,
+            dry_run=args.dry_run,
+            max_docs_per_second=args.max_docs_per_second,
+        )
+        for result in results:
+            if not result.get("skipped"):
+                print(f"✅ {result['version']}: {result['processed']} scanned, {result['modified']} "
+                      f"{'would change' if args.dry_run else 'modified'} in {result['elapsed_seconds']}s "
+                      f"({result['docs_per_second']} docs/s)")
+        if not args.dry_run:
+            ensure_indexes(mongo.db)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,34 @@
+# related.py
+# Rebuilds the precomputed "related series" lists (see app/utils/related.py):
+#   python related.py              recompute every playlist now
+#   python related.py --enqueue    leave it to the job workers
+# Edits keep the lists current on their own; run this after bulk imports or
+# when the RELATED_* settings change.
+import argparse
+import os
+
+os.environ['JOB_WORKER_IN_PROCESS'] = 'false'
+os.environ['READINESS_CHECK_INTERVAL'] = '0'
+
+from app import create_app
+from app.utils.job_queue import enqueue_job
+from app.utils.related import rebuild_related, RELATED_REBUILD
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild related-series recommendations")
+    parser.add_argument("--enqueue", action="store_true", help="queue a rebuild job instead of running it here")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        if args.enqueue:
+            print(f"✅ Queued job {enqueue_job(RELATED_REBUILD, {})}")
+            return
+        count = rebuild_related(batch_size=args.batch_size)
+        print(f"✅ Related series rebuilt for {count} playlists")
+
+
+if __name__ == "__main__":
+    main()
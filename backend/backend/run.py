@@ -2,11 +2,19 @@ from app import create_app
 from flask import send_from_directory
 import os
 
-app = create_app()
 
-@app.route('/uploads/subtitles/<path:filename>')
-def serve_subtitles(filename):
-    return send_from_directory(os.path.join(os.getcwd(), "uploads", "subtitles"), filename)
+def build_app():
+    app = create_app()
+
+    @app.route('/uploads/subtitles/<path:filename>')
+    def serve_subtitles(filename):
+        return send_from_directory(os.path.join(os.getcwd(), "uploads", "subtitles"), filename)
+
+    return app
+
+# The password pool's worker processes import this module as __mp_main__; they only run bcrypt
+if __name__ != '__mp_main__':
+    app = build_app()
 
 if __name__ == '__main__':
     app.run(host="127.0.0.1", port=5001, debug=True)  # debug=True for development
@@ -1,40 +1,22 @@
 # scriptfix.py
+# Kept for existing habits: fixing thumbnail URLs is now migration 0001, see migrate.py.
 import os
-from flask import Flask
-from flask_pymongo import PyMongo
-from app import create_app
 
-def fix_thumbnails():
-    # Create app with your configs
-    app = create_app()
-    
-    with app.app_context():
-        mongo = app.extensions.get("pymongo")  # safer way to access
-        if not mongo:
-            print("❌ Could not connect to MongoDB. Check your MONGO_URI in config.")
-            return
-
-        db = mongo.cx.get_database()  # get the DB instance
-        playlists = db.playlists.find({"thumbnail_url": {"$regex": r"\\\\"}})
+os.environ['JOB_WORKER_IN_PROCESS'] = 'false'
 
-        fixed_count = 0
-        for p in playlists:
-            old_url = p.get("thumbnail_url")
-            if not old_url:
-                continue
+from app import create_app, mongo
+from app.utils.migrations import MIGRATIONS, run_migration
 
-            new_url = old_url.replace("\\", "/")
-            db.playlists.update_one(
-                {"_id": p["_id"]},
-                {"$set": {"thumbnail_url": new_url}}
-            )
-            print(f"✅ Fixed: {old_url} -> {new_url}")
-            fixed_count += 1
+def fix_thumbnails():
+    app = create_app()
 
-        if fixed_count == 0:
+    with app.app_context():
+        migration = next(m for m in MIGRATIONS if m.name == "fix_thumbnail_backslashes")
+        result = run_migration(mongo.db, migration)
+        if result.get("skipped") or result["modified"] == 0:
             print("🎉 No broken thumbnails found.")
         else:
-            print(f"🔧 {fixed_count} thumbnail(s) fixed.")
+            print(f"🔧 {result['modified']} thumbnail(s) fixed.")
 
 if __name__ == "__main__":
     fix_thumbnails()
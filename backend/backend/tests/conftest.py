@@ -0,0 +1,31 @@
+import os
+import sys
+
+import pytest
+
+# The app reads its config from the environment when it is imported
+os.environ.setdefault('STORAGE_BACKEND', 'memory')
+os.environ.setdefault('JOB_WORKER_IN_PROCESS', 'false')
+os.environ.setdefault('READINESS_CHECK_INTERVAL', '0')
+os.environ.setdefault('JWT_SECRET_KEY', 'test-secret-key-that-is-long-enough-for-hs256')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app  # noqa: E402
+from app.repositories import repos  # noqa: E402
+
+
+@pytest.fixture(scope='session')
+def app():
+    return create_app()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def video():
+    playlist = repos.playlists.insert({"title": "Series", "region": "EN", "videos": []})
+    return repos.videos.insert({"playlist_id": playlist["_id"], "title": "Episode 1",
+                                "video_link": "https://example.com/e/1", "region": "EN"})
@@ -0,0 +1,18 @@
+def _sets_pin_cookie(app, response):
+    return any(header.startswith(app.config['READ_PIN_COOKIE'] + '=')
+               for header in response.headers.getlist('Set-Cookie'))
+
+
+def test_progress_report_does_not_pin_reads_to_primary(app, client, video):
+    response = client.put(f'/api/public_data/progress/device-0001/videos/{video["_id"]}',
+                          json={"position": 12.5, "duration": 600})
+
+    assert response.status_code == 200
+    assert not _sets_pin_cookie(app, response)
+
+
+def test_catalog_write_pins_reads_to_primary(app, client, video):
+    response = client.put(f'/api/videos/{video["_id"]}', json={"title": "Episode 1 (remastered)"})
+
+    assert response.status_code == 200
+    assert _sets_pin_cookie(app, response)
@@ -0,0 +1,18 @@
+# worker.py
+# Runs the background job workers as a standalone process: python worker.py
+# Set JOB_WORKER_IN_PROCESS=false for the web app when using this.
+import os
+
+# Must be set before the config is imported so create_app doesn't start a second pool
+os.environ['JOB_WORKER_IN_PROCESS'] = 'false'
+os.environ['READINESS_CHECK_INTERVAL'] = '0'
+
+from app import create_app
+from app.utils.job_queue import JobWorker
+
+app = create_app()
+
+if __name__ == '__main__':
+    worker = JobWorker(app)
+    print(f"Starting job worker {worker.worker_id} with {worker.threads} thread(s)...")
+    worker.run_forever()
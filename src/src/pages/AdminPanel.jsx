@@ -124,11 +124,10 @@ const DashboardContent = () => {
             try {
                 setLoading(true);
                 console.log("Fetching dashboard data...");
-                const [statsData, videosData, seriesData] = await Promise.all([
-                    api.getDashboardStats(),
-                    api.getRecentVideos(),
-                    api.getWatchedSeriesInfo()
-                ]);
+                const dashboard = await api.getDashboard();
+                const statsData = dashboard.stats;
+                const videosData = dashboard.recent_videos;
+                const seriesData = dashboard.watched_series;
                 console.log("Stats:", statsData);
         console.log("Videos:", videosData);
         console.log("Series:", seriesData);
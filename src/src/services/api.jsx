@@ -118,6 +118,11 @@ export const getPlaylistDetails = async (id) => {
 };
 
 // --- Admin API ---
+// All dashboard panels in one request (stats, recent videos, watched series, regional, top videos)
+export const getDashboard = async () => {
+  return request("/admin/dashboard", "GET");
+};
+
 export const getDashboardStats = async () => {
   return request("/admin/dashboard-stats", "GET");
 };